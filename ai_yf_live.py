@@ -1,56 +1,56 @@
 # ai_yf_live.py  （定期再学習 & モデル保存/読み込み & warm-start）
 # 7日分で学習 → 毎分予測（BUY/SELL/HOLD） → CSV記録
-import time, math, warnings
+import os, time, math, atexit, warnings
 import numpy as np
 import pandas as pd
 import yfinance as yf
-import joblib  # ★追加：モデル保存/読み込み
+from features import make_features, StreamingFeatures, FEATURE_COLS
+from linmodel import LinearModel, export_npz, MODEL_NPZ, HORIZON, ROUND_TRIP_COST_PIPS, decide  # ★推論は .npz の内積だけ
+from retrainer import Retrainer
+from online import OnlineLogit
+from feature_store import FeatureStore, dataset_multi as store_dataset
+from predlog import PredLog, PRED_LOG
+from live_metrics import PredictionTracker
+from statelog import atomic_write_json
 warnings.filterwarnings("ignore")
 
 PAIR = "USDJPY=X"
 INTERVAL = "1m"
 HIST_PERIOD = "7d"      # 学習用
 LIVE_PERIOD = "1d"      # 推論用ポーリング
-HORIZON = 5             # 何分先で上がったか判定
+# HORIZON（主ヘッド）/ BUY_TH / 往復コストは linmodel.py に（main.py・採点・検証と共通）
+HORIZONS = (1, 5, 15)   # ★同じ特徴量で同時に学習・予測するホライズン（proba_up_h1 など）
 OUT_CSV = "live_pred.csv"
-BUY_TH = 0.58
-SELL_TH = 1 - BUY_TH
+WRITE_CSV = False       # ★予測は PRED_LOG（列ごとのバイナリ・日別）へ。True で従来の CSV にも書く
 RETRAIN_SEC = 6 * 3600  # ★追加：6時間ごとに再学習（お好みで）
-
-# ---------- 指標・特徴量 ----------
-def _rsi(close, n=14):
-    diff = close.diff()
-    up = diff.clip(lower=0).rolling(n).mean()
-    dn = (-diff.clip(upper=0)).rolling(n).mean()
-    rs = up / (dn + 1e-12)
-    return 100 - 100 / (1 + rs)
-
-def make_features(df: pd.DataFrame) -> pd.DataFrame:
-    c = df["Close"]
-    s = pd.DataFrame(index=df.index)
-    s["ret1"]  = c.pct_change(1)
-    s["ret5"]  = c.pct_change(5)
-    ma20 = c.rolling(20).mean()
-    std20 = c.rolling(20).std()
-    s["z20"]   = (c - ma20) / (std20 + 1e-12)
-    s["bb_w"]  = 4.0 * std20          # ≒ Upper2-Lower2
-    s["rsi14"] = _rsi(c, 14)
-    s["hour"]  = (pd.to_datetime(df.index.tz_convert("Asia/Tokyo"))
-                  .strftime("%H").astype(int))
-    return s
+META_PKL = "ai_meta.pkl"  # 学習用（warm-start 引き継ぎ）。推論は MODEL_NPZ
+FEATURE_STORE = "feature_store"  # ★特徴量ストア（学習・推論で共有）
+STORE_DAYS = 30         # ストアから学習に使う日数（7日制限を超えて伸ばせる）
+MIN_STORE_ROWS = 2000   # ストアにこれ未満しか無ければ yfinance から取得
+ONLINE = False          # ★True: ラベル確定ごとのオンライン学習（定期再学習はしない）
+ONLINE_SAVE_EVERY = 60  # オンライン学習で何回更新したら .npz に保存するか
+LIVE_METRICS = "live_metrics.json"  # ★直近の成績（答えが出た予測から O(1) 更新）を毎分書き出す
+PROF_PORT = 8767        # ★実行中の計測の受け付け（python profhooks.py profile 30 --port 8767）。None でソケットなし
 
 # ---------- 学習（sklearn→無ければ自作ロジ回帰） ----------
-def train_model(pair=PAIR, prev=None):  # ★prevを受け取ってwarm-start可能に
+def fetch_history(pair=PAIR):
     df = yf.Ticker(pair).history(period=HIST_PERIOD, interval=INTERVAL, auto_adjust=False)
     if df.empty:
         raise RuntimeError("学習データが空でした。period/interval を見直してね。")
-    df = df.tz_convert("UTC").dropna(subset=["Close"])
+    return df.tz_convert("UTC").dropna(subset=["Close"])
 
+def build_dataset(df, horizons=HORIZONS):
+    """足の DataFrame → (特徴量 Xdf, ラベル Y)。Y の列はホライズン（分）、全ホライズンそろった行だけ"""
     Xdf = make_features(df).dropna()
-    future = df["Close"].shift(-HORIZON).reindex(Xdf.index)
-    y = (future > df["Close"].reindex(Xdf.index)).astype(int).dropna()
-    Xdf = Xdf.loc[y.index]
+    close = df["Close"].reindex(Xdf.index)
+    Y = {}
+    for h in horizons:
+        future = df["Close"].shift(-h).reindex(Xdf.index)
+        Y[h] = (future > close).astype(int).where(future.notna())
+    Y = pd.DataFrame(Y, index=Xdf.index).dropna().astype(int)
+    return Xdf.loc[Y.index], Y
 
+def fit_model(Xdf, y, prev=None):
     # 標準化
     mu = Xdf.mean(); sd = Xdf.std().replace(0, 1)
     Xn = ((Xdf - mu) / sd).values.astype("float64")
@@ -81,30 +81,105 @@ def train_model(pair=PAIR, prev=None):  # ★prevを受け取ってwarm-start可
             w -= lr * grad
         model["type"] = "np"; model["w"] = w
         print(f"[train] 自作ロジ回帰で学習完了：samples={len(Xn)}")
+    return model
 
-    # CSVヘッダ（初回のみ）
+def fit_heads(Xdf, Y, prev=None):
+    """
+    ホライズンごとに1本ずつ学習（特徴量は共通）
+    主ヘッド（HORIZON）が本体の dict、残りは model["heads"][h] に入れる（warm-start もヘッドごと）
+    """
+    prev_heads = (prev or {}).get("heads") or {}
+    model = fit_model(Xdf, Y[HORIZON], prev)
+    model["horizon"] = HORIZON
+    model["train_end"] = Xdf.index[-1]  # 学習に使った最後の足（再学習の検証はこれより後の行だけで）
+    model["heads"] = {h: fit_model(Xdf, Y[h], prev_heads.get(h)) for h in Y.columns if h != HORIZON}
+    return model
+
+CSV_HEADER = "datetime,close,proba_up,signal," + ",".join(f"proba_up_h{h}" for h in HORIZONS)
+
+def ensure_csv(path=OUT_CSV):
+    """CSVヘッダを書く。列が違う古いファイルは <名前>.<日時>.csv に退避して作り直す"""
     try:
-        with open(OUT_CSV, "x", encoding="utf-8") as f:
-            f.write("datetime,close,proba_up,signal\n")
-    except FileExistsError:
+        with open(path, encoding="utf-8") as f:
+            head = f.readline().strip()
+        if head == CSV_HEADER:
+            return
+        root, ext = os.path.splitext(path)
+        os.replace(path, f"{root}.{time.strftime('%Y%m%d%H%M%S')}{ext}")
+        print(f"[csv] 列が変わったので旧ファイルを退避しました: {head}")
+    except FileNotFoundError:
         pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(CSV_HEADER + "\n")
 
+def save_model(model, pkl_path=META_PKL, npz_path=MODEL_NPZ):
     # ★学習済みを保存（再起動で引き継ぎ）
     try:
-        joblib.dump(model, "ai_meta.pkl")
+        import joblib
+        joblib.dump(model, pkl_path)
     except Exception as e:
         print("[train] save skipped:", e)
+    # ★推論用の軽量版（標準化を重みに畳み込んだ .npz）
+    try:
+        export_npz(model, npz_path)
+    except Exception as e:
+        print("[train] npz export skipped:", e)
+
+def load_dataset(pair=PAIR, days=STORE_DAYS):
+    """
+    ★特徴量ストアに十分あればそこから（ネット・再計算なし）、無ければ yfinance から取ってストアを埋める
+    戻り値は (Xdf, Y)。Y の列は HORIZONS
+    """
+    store = FeatureStore(FEATURE_STORE, pair)
+    arr = store.window(days=days)
+    # ストアは後ろに足すだけ（古い側は埋め戻せない）。yfinance で取れる期間より長くたまってから使う
+    if len(arr) >= MIN_STORE_ROWS and store.span_days(arr) > pd.Timedelta(HIST_PERIOD) / pd.Timedelta(days=1):
+        X, Y = store_dataset(arr, HORIZONS)
+        index = pd.to_datetime(arr["ts"][:len(Y)], utc=True)
+        return (pd.DataFrame(X, index=index, columns=FEATURE_COLS),
+                pd.DataFrame(Y.astype(int), index=index, columns=list(HORIZONS)))
+    df = fetch_history(pair).iloc[:-1]  # 最後の1本は形成中（終値が確定していない）。保存も学習もしない
+    try:
+        store.append_frame(make_features(df).dropna(), df["Close"])
+    except Exception as e:
+        print("[store] backfill skipped:", e)
+    return build_dataset(df)
 
+def train_model(pair=PAIR, prev=None):  # ★prevを受け取ってwarm-start可能に
+    Xdf, Y = load_dataset(pair)
+    model = fit_heads(Xdf, Y, prev)
+    save_model(model)
     return model
 
+def load_meta():
+    """ai_meta.pkl（学習用の完全版）を読む。無ければ None"""
+    try:
+        import joblib
+        return joblib.load(META_PKL)
+    except Exception:
+        return None
+
 def load_or_train(pair=PAIR):
     """★保存済みモデルがあれば読み込み、無ければ学習"""
+    m = load_meta()
+    if m is not None:
+        print(f"[load] {META_PKL} を読み込みました")
+        return m
+    return train_model(pair)
+
+def load_fast(pair=PAIR) -> LinearModel:
+    """★推論用モデル：.npz があれば即ロード（sklearn 不要）、無ければ pkl から作る/学習"""
     try:
-        m = joblib.load("ai_meta.pkl")
-        print("[load] ai_meta.pkl を読み込みました")
+        m = LinearModel.load(MODEL_NPZ, cols=FEATURE_COLS)
+        print(f"[load] {MODEL_NPZ} を読み込みました")
         return m
     except Exception:
-        return train_model(pair)
+        meta = load_or_train(pair)
+        try:
+            export_npz(meta, MODEL_NPZ)
+        except Exception as e:
+            print("[load] npz export skipped:", e)
+        return LinearModel.from_meta(meta, cols=FEATURE_COLS)
 
 def predict_proba(model, x_row: pd.Series) -> float:
     x = (x_row[model["cols"]] - model["mu"]) / model["sd"]
@@ -117,20 +192,34 @@ def predict_proba(model, x_row: pd.Series) -> float:
     return p
 
 # ---------- ライブ推論 ----------
-def live_loop(model, pair=PAIR, sleep_sec=1, retrain_sec=None, use_warmstart=True):
+def head_probs(fast: LinearModel, x):
+    """全ヘッドを行列1回で → {horizon: p}。行0は主ヘッド（古い .npz でも HORIZON 扱い）"""
+    p = fast.predict_all(x)
+    out = {h: float(p[i]) for i, h in enumerate(fast.horizons) if h}
+    out[HORIZON] = float(p[0])
+    return out
+
+def live_loop(model, pair=PAIR, sleep_sec=1, retrain_sec=None, use_warmstart=True, online=False):
+    # model は LinearModel（推論用）でも学習用 dict でもよい
+    fast = model if isinstance(model, LinearModel) else LinearModel.from_meta(model, cols=FEATURE_COLS)
     last_min = None
-    last_train = time.time()
+    # ★再学習は別プロセス。検証に通ったモデルだけ差し替える（オンライン学習時は使わない）
+    retrainer = Retrainer(pair, retrain_sec, use_warmstart, META_PKL, MODEL_NPZ) if retrain_sec and not online else None
+    learner = OnlineLogit(FEATURE_COLS, horizon=HORIZON) if online else None
+    store = FeatureStore(FEATURE_STORE, pair)
+    sf = StreamingFeatures()  # ★確定足だけを1本ずつ取り込む（毎回の全件 make_features をやめる）
+    plog = PredLog(PRED_LOG, HORIZONS)  # ★まとめ書き。終了時に残りを書き切る
+    tracker = PredictionTracker(HORIZON, ROUND_TRIP_COST_PIPS)  # ★HORIZON 分たった予測から成績を更新
+    atexit.register(plog.close)
+    if WRITE_CSV:
+        ensure_csv(OUT_CSV)
 
     while True:
-        # ★一定間隔で再学習（warm-start=前回重み引き継ぎ）
-        if retrain_sec and (time.time() - last_train >= retrain_sec):
-            try:
-                print("[retrain] start…")
-                model = train_model(pair, prev=model if use_warmstart else None)
-                last_train = time.time()
-                print("[retrain] done")
-            except Exception as e:
-                print("[retrain] failed:", e)
+        # ★一定間隔で再学習（warm-start=前回重み引き継ぎ）。ライブ側は待たない
+        if retrainer is not None:
+            new = retrainer.poll()
+            if new is not None:
+                fast = new
 
         # 1d×1m を取得、空なら7d×1mへフォールバック
         df = pd.DataFrame()
@@ -141,28 +230,83 @@ def live_loop(model, pair=PAIR, sleep_sec=1, retrain_sec=None, use_warmstart=Tru
         if df.empty:
             print("No data…retry"); time.sleep(2); continue
 
-        df = df.tz_convert("UTC")
-        feats = make_features(df).dropna()
-        if feats.empty:
+        df = df.tz_convert("UTC").dropna(subset=["Close"])
+        idx = df.index
+        closes = df["Close"].to_numpy(dtype="float64")
+        if len(idx) == 0:
+            time.sleep(1); continue
+
+        # 最後の1本は形成中。それより前で未取り込みの足だけ確定させる
+        if sf.last_ts is None:
+            # 初回：履歴を全部流して特徴量ストアの穴を埋める（オンライン学習なら標準化の初期値にも使う）
+            hist = []
+            for i in range(len(idx) - 1):
+                row = sf.update(idx[i], closes[i])
+                if row is not None:
+                    hist.append(row)
+                    store.append(idx[i], closes[i], row)
+            if learner is not None:
+                learner.seed(hist)
+                learner.load_linear(fast)
+        else:
+            start = int(idx.searchsorted(sf.last_ts, side="right"))
+            for i in range(start, len(idx) - 1):
+                row = sf.update(idx[i], closes[i])
+                if row is not None:
+                    store.append(idx[i], closes[i], row)  # ★確定足の特徴量は1回だけ計算して保存
+                tracker.bar(idx[i].value, closes[i])
+                if learner is not None and row is not None:
+                    # ★HORIZON 本前の行のラベルが確定していれば1ステップ学習
+                    if learner.push(row, closes[i]) is not None and learner.updates % ONLINE_SAVE_EVERY == 0:
+                        try:
+                            fast = fast.with_primary(learner.to_linear())  # 他のホライズンのヘッドは残す
+                            fast.save(MODEL_NPZ)
+                        except Exception as e:
+                            print("[online] save skipped:", e)
+
+        ts = idx[-1]  # UTC
+        x = sf.peek(ts, closes[-1])
+        if x is None:
             time.sleep(1); continue
 
-        ts = feats.index[-1]  # UTC
         cur_min = ts.strftime("%Y-%m-%d %H:%M")
         # 同じ分を重複して出さない
         if cur_min != last_min:
-            p_up = predict_proba(model, feats.iloc[-1])
+            probs = head_probs(fast, x)  # ★全ホライズンを1回の行列積で
+            if learner is not None:
+                probs[HORIZON] = learner.predict_proba(x)
+            p_up = probs[HORIZON]
             jst = ts.tz_convert("Asia/Tokyo")
-            close = float(df["Close"].iloc[-1])
-            sig = "BUY" if p_up >= BUY_TH else ("SELL" if p_up <= SELL_TH else "HOLD")
-            print(f"{jst}  close={close:.6f}  p_up={p_up:.3f}  -> {sig}")
+            close = float(closes[-1])
+            sig = decide(p_up)
+            heads = "  ".join(f"h{h}={probs[h]:.3f}" for h in HORIZONS if h in probs)
+            print(f"{jst}  close={close:.6f}  p_up={p_up:.3f}  -> {sig}  [{heads}]")
 
-            with open(OUT_CSV, "a", encoding="utf-8") as f:
-                f.write(f"{jst.isoformat()},{close:.6f},{p_up:.6f},{sig}\n")
+            plog.write(ts, close, p_up, sig, probs)
+            tracker.predict(ts.value, close, p_up, sig)
+            snap = tracker.snapshot()
+            t = snap["trades"]
+            if t["n"]:
+                print(f"  [metrics] last{t['n']} hit={t['hit_rate']:.3f} avg={t['mean']:+.6f} "
+                      f"dd={t['drawdown']:.6f} logloss={snap['calibration']['logloss'] or float('nan'):.4f}")
+            try:
+                atomic_write_json(LIVE_METRICS, snap)
+            except Exception as e:
+                print("[metrics] save skipped:", e)
+            if WRITE_CSV:
+                extra = ",".join(f"{probs[h]:.6f}" if h in probs else "" for h in HORIZONS)
+                with open(OUT_CSV, "a", encoding="utf-8") as f:
+                    f.write(f"{jst.isoformat()},{close:.6f},{p_up:.6f},{sig},{extra}\n")
 
             last_min = cur_min
 
         time.sleep(sleep_sec)
 
 if __name__ == "__main__":
-    model = load_or_train(PAIR)                                   # ★保存があれば継承
-    live_loop(model, PAIR, sleep_sec=1, retrain_sec=RETRAIN_SEC)  # ★定期再学習ON
+    import profhooks
+    try:
+        profhooks.install(PROF_PORT)  # SIGUSR1=スタック / SIGUSR2=プロファイル（出力は prof/）
+    except OSError as e:
+        print(f"[INFO] 計測ソケットなし（ポート {PROF_PORT} が使えない）: {e}")
+    model = load_fast(PAIR)                                       # ★.npz があれば即起動
+    live_loop(model, PAIR, sleep_sec=1, retrain_sec=RETRAIN_SEC, online=ONLINE)  # ★定期再学習ON（ONLINE時はオンライン学習）
@@ -1,34 +1,49 @@
 # analyze_live_pred.py
-# live_pred.csv（datetime, close, proba_up, signal）を採点＆可視化
-import json, math
+# live_pred.csv（datetime, close, proba_up, signal, proba_up_h*）を採点＆可視化
+# trades_journal.bin（ルール戦略の約定ジャーナル）があれば戦略別の成績も集計
+import json, os
+from collections import deque
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from fill import FillSimulator, ConstantSpread
+from fill import ts_ns
+from linmodel import HORIZON, BUY_TH, ROUND_TRIP_COST_PIPS
+from scoring import score, matured, head_columns, ScoreAggregate, NS_PER_MIN, TOLERANCE_SEC
+from statelog import atomic_write_json
 
 CSV = "live_pred.csv"
-HORIZON_MIN = 5          # ai_yf_live.py の HORIZON に合わせる
-BUY_TH = 0.58            # 同じく合わせる
-ROUND_TRIP_COST_PIPS = 0.6  # 往復コスト（ざっくり）。JPYペアの1pip=0.01
-
-def load_data(path=CSV):
-    df = pd.read_csv(path)
-    df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
-    df = df.sort_values("datetime").drop_duplicates("datetime")
+PRED_LOG = "pred_log"    # ai_yf_live.py が書く予測ログ（あればこちらを優先）
+HORIZON_MIN = HORIZON    # 主ヘッドのホライズン（閾値・コストと一緒に linmodel.py で持つ）
+FILL = FillSimulator(ConstantSpread(ROUND_TRIP_COST_PIPS))  # 往復でスプレッド1回分
+JOURNAL = "trades_journal.bin"  # main.py が書く約定ジャーナル
+EVAL_STATE = "eval_state.json"  # --incremental 用の途中経過（ScoreAggregate）
+JOURNAL_CHUNK = 1_000_000       # ジャーナルを一度に読む件数（36MB）
+EQUITY_POINTS = 500             # --chunked でチャンク（1日）ごとに残すエクイティ曲線の点数
+
+def load_data(path=CSV, start=None, end=None):
+    # ディレクトリなら予測ログ（型付きの列をそのまま、時刻順・重複なしで書かれている）
+    if os.path.isdir(path):
+        import predlog
+        df = predlog.load_frame(path, start, end)
+    else:
+        df = pd.read_csv(path)
+        df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+        df = df.sort_values("datetime").drop_duplicates("datetime")
+        if start is not None:
+            df = df[df["datetime"] >= start]
+        if end is not None:
+            df = df[df["datetime"] < end]
     # JST列（見やすさ用）
     df["jst"] = df["datetime"].dt.tz_convert("Asia/Tokyo")
     return df
 
-def realized_future_close(df):
-    # タイムスタンプ+HORIZON分後のcloseを結合（等間隔前提）
-    target_time = df["datetime"] + pd.to_timedelta(HORIZON_MIN, "min")
-    future = df.set_index("datetime")["close"].reindex(target_time).to_numpy()
-    return pd.Series(future, index=df.index, name="close_future")
-
-def label_up(close_now, close_future):
-    # 5分後に上がっていれば1、下がっていれば0（同値は0.5で除外）
-    y = np.where(close_future > close_now, 1.0,
-        np.where(close_future < close_now, 0.0, np.nan))
-    return pd.Series(y, index=close_now.index, name="y_up")
+def parse_time(s):
+    # タイムゾーン無しは JST とみなす
+    if s is None:
+        return None
+    t = pd.Timestamp(s)
+    return t.tz_localize("Asia/Tokyo") if t.tzinfo is None else t
 
 def decide_signal(proba_up, buy_th=BUY_TH):
     # BUY / SELL / HOLD の再計算（csvのsignalと一致するはず）
@@ -37,94 +52,79 @@ def decide_signal(proba_up, buy_th=BUY_TH):
         np.where(proba_up <= sell_th, "SELL", "HOLD"))
     return pd.Series(s, index=proba_up.index, name="signal_calc")
 
-def trade_return(row):
-    # 売買方向にHORIZON分保持して手仕舞い（単純化）。
-    # リターンは close_future/close_now -1（BUY）、反転（SELL）。
-    if row["signal"] == "BUY":
-        r = row["close_future"]/row["close"] - 1.0
-    elif row["signal"] == "SELL":
-        r = row["close"]/row["close_future"] - 1.0
-    else:
-        return np.nan
-    # 簡易コスト（往復スプレッド）を差し引き
-    # USDJPY想定：1pip=0.01 → 価格で割ってreturn化（近似）
-    cost = (ROUND_TRIP_COST_PIPS * 0.01) / row["close"]
-    return r - cost
-
-def main():
-    df = load_data(CSV)
-    if df.empty or len(df) < HORIZON_MIN + 2:
-        raise SystemExit("データが少ないよ。もう少し走らせてから来てね！")
-
-    df["close_future"] = realized_future_close(df)
-    df["y_up"] = label_up(df["close"], df["close_future"])
+def prepare(df):
+    # 念のためCSVのsignalを優先（手動調整してる可能性）。無い/壊れている行だけ再計算
     df["signal_calc"] = decide_signal(df["proba_up"])
-    # 念のためCSVのsignalを優先（手動調整してる可能性）
     df["signal"] = np.where(df["signal"].isin(["BUY","SELL","HOLD"]),
                             df["signal"], df["signal_calc"])
+    # 未来値は as-of 結合（等間隔でなくてもよい）、リターンは FillSimulator で全行まとめて
+    return score(df, HORIZON_MIN, FILL)
 
-    # 採点対象：HOLD以外 & 未来値があるところ
-    eval_df = df[(df["signal"]!="HOLD") & df["close_future"].notna()].copy()
-    if eval_df.empty:
-        raise SystemExit("HOLD以外のシグナルが無い/未来データが足りないよ。")
-
-    # 命中判定（方向が合ったか）
-    eval_df["hit"] = np.where(
-        (eval_df["signal"]=="BUY") & (eval_df["y_up"]==1.0), 1,
-        np.where((eval_df["signal"]=="SELL") & (eval_df["y_up"]==0.0), 1, 0)
-    )
-
-    # シンプル損益（HORIZONでクローズ）
-    eval_df["ret"] = eval_df.apply(trade_return, axis=1)
-    eval_df["eq"]  = eval_df["ret"].cumsum()  # 累積リターン（近似）
-
-    # 概況
-    total = len(eval_df)
-    wins  = int(eval_df["hit"].sum())
-    acc   = wins/total
-    buy_df  = eval_df[eval_df["signal"]=="BUY"]
-    sell_df = eval_df[eval_df["signal"]=="SELL"]
-    buy_acc  = float(buy_df["hit"].mean()) if len(buy_df) else float("nan")
-    sell_acc = float(sell_df["hit"].mean()) if len(sell_df) else float("nan")
-    avg_ret  = float(eval_df["ret"].mean())
-    std_ret  = float(eval_df["ret"].std())
-    sharpe   = (avg_ret/std_ret*np.sqrt(60)) if std_ret>0 else float("nan") # 60 trades≈時間基準の近似
-
-    # 確率の当たり具合（校正）：p_upを10分位に分けて実際の上昇率を計測
-    bins = np.linspace(0,1,11)
-    df["bin"] = pd.cut(df["proba_up"], bins, include_lowest=True)
-    cal = df.dropna(subset=["y_up"]).groupby("bin").agg(
-        mean_p=("proba_up","mean"),
-        rate_up=("y_up","mean"),
-        n=("y_up","count")
-    ).reset_index()
-
-    # 出力：テキスト要約
-    summary = {
-        "trades": total,
-        "win_rate_overall": round(acc,4),
-        "win_rate_buy": round(buy_acc,4) if not math.isnan(buy_acc) else None,
-        "win_rate_sell": round(sell_acc,4) if not math.isnan(sell_acc) else None,
-        "avg_return_per_trade": round(avg_ret,6),
-        "std_return": round(std_ret,6) if not math.isnan(std_ret) else None,
-        "sharpe_like": round(sharpe,3) if not math.isnan(sharpe) else None,
-        "cumulative_return": round(float(eval_df["eq"].iloc[-1]),6),
+def write_summary(agg: ScoreAggregate) -> dict:
+    summary = agg.summary()
+    summary.update({
         "horizon_min": HORIZON_MIN,
         "buy_threshold": BUY_TH,
-        "round_trip_cost_pips": ROUND_TRIP_COST_PIPS
-    }
+        "round_trip_cost_pips": ROUND_TRIP_COST_PIPS,
+        "horizons": agg.head_summary(),  # ホライズン別ヘッドの命中率（列があれば）
+    })
     with open("eval_summary.json","w",encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
-    eval_df.to_csv("trades_detail.csv", index=False)
-    cal.to_csv("calibration.csv", index=False)
+    agg.calibration().to_csv("calibration.csv", index=False)
+    return summary
 
-    print("=== SUMMARY ===")
-    for k,v in summary.items():
-        print(f"{k}: {v}")
+def max_horizon(df):
+    return max([HORIZON_MIN] + [h for h, _ in head_columns(df)])
+
+def journal_summary(path=JOURNAL, chunk=JOURNAL_CHUNK):
+    # ルール戦略（ret1〜ret6）の決済ごとの成績を戦略IDごとに集計
+    # memmap を chunk 件ずつ bincount で足していくので、何か月分でもメモリは一定
+    from journal import read_journal, ENTRY, SCALE, EXIT
+    j = read_journal(path, mmap=True)
+    if len(j) == 0:
+        return pd.DataFrame()
+    K = 256  # sid は uint8
+    seen = np.zeros(K, bool); entries = np.zeros(K); scales = np.zeros(K)
+    exits = np.zeros(K); wins = np.zeros(K); pnl = np.zeros(K)
+    for i in range(0, len(j), chunk):
+        c = j[i:i + chunk]
+        sid = c["sid"].astype("int64"); kind = c["kind"]
+        seen[sid] = True
+        entries += np.bincount(sid[kind == ENTRY], minlength=K)
+        scales += np.bincount(sid[kind == SCALE], minlength=K)
+        x = kind == EXIT
+        p = c["pnl"][x]
+        exits += np.bincount(sid[x], minlength=K)
+        wins += np.bincount(sid[x][p > 0], minlength=K)
+        pnl += np.bincount(sid[x], weights=p, minlength=K)
+    sids = np.flatnonzero(seen)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pd.DataFrame({
+            "sid": sids,
+            "entries": entries[sids].astype("int64"),
+            "scale_ins": scales[sids].astype("int64"),
+            "exits": exits[sids].astype("int64"),
+            "win_rate": np.where(exits[sids] > 0, wins[sids] / exits[sids], np.nan),
+            "total_pnl": np.where(exits[sids] > 0, pnl[sids], np.nan),
+            "avg_pnl": np.where(exits[sids] > 0, pnl[sids] / exits[sids], np.nan),
+        })
 
+def default_path():
+    import predlog
+    return PRED_LOG if predlog.exists(PRED_LOG) else CSV
+
+def report_journal():
+    if os.path.exists(JOURNAL):
+        js = journal_summary(JOURNAL)
+        if not js.empty:
+            js.to_csv("journal_summary.csv", index=False)
+            print("=== STRATEGY JOURNAL ===")
+            print(js.to_string(index=False))
+
+def plot(eq_x, eq_y, cal):
     # 図1: エクイティカーブ
     plt.figure()
-    plt.plot(eval_df["jst"], eval_df["eq"])
+    plt.plot(eq_x, eq_y)
     plt.title("Equity Curve (HORIZON hold)")
     plt.xlabel("Time (JST)"); plt.ylabel("Cumulative Return")
     plt.tight_layout(); plt.savefig("equity_curve.png", dpi=150)
@@ -137,7 +137,165 @@ def main():
     plt.xlabel("Predicted probability"); plt.ylabel("Realized up-rate")
     plt.tight_layout(); plt.savefig("calibration.png", dpi=150)
 
+def main(path=None, start=None, end=None):
+    if path is None:
+        path = default_path()
+    report_journal()
+
+    df = load_data(path, start, end)
+    if df.empty or len(df) < HORIZON_MIN + 2:
+        raise SystemExit("データが少ないよ。もう少し走らせてから来てね！")
+    df = prepare(df)
+
+    # 採点対象：HOLD以外 & 未来値があるところ（score() で hit / ret が付いた行）
+    eval_df = df[df["hit"].notna()].copy()
+    if eval_df.empty:
+        raise SystemExit("HOLD以外のシグナルが無い/未来データが足りないよ。")
+    eval_df["eq"]  = eval_df["ret"].cumsum()  # 累積リターン（近似）
+
+    # 集計（命中・リターン・校正）は ScoreAggregate で。--incremental と同じ計算
+    agg = ScoreAggregate().add(df, BUY_TH)
+    summary = write_summary(agg)
+    cal = agg.calibration()
+    eval_df.to_csv("trades_detail.csv", index=False)
+    # 熟した分までを途中経過として保存（この後は --incremental で足していける）
+    atomic_write_json(EVAL_STATE, ScoreAggregate().add(df[matured(df, max_horizon(df))], BUY_TH).to_json())
+
+    print("=== SUMMARY ===")
+    for k,v in summary.items():
+        print(f"{k}: {v}")
+    plot(eval_df["jst"], eval_df["eq"], cal)
+    print("Saved: eval_summary.json, trades_detail.csv, calibration.csv, equity_curve.png, calibration.png")
+
+# ---------- 何か月分でも：日ごとのチャンクに分けて採点 → 集計だけマージ ----------
+def day_chunks(root, start=None, end=None):
+    """予測ログの index から [日の最初, 次の日の最初) の ns 範囲を作る（start/end で切る）"""
+    import predlog
+    days = predlog.read_index(root).get("days", {})
+    keys = [d for d in sorted(days) if days[d]["rows"] > 0]
+    if not keys:
+        return []
+    bounds = [days[d]["start"] for d in keys] + [days[keys[-1]]["end"] + 1]
+    s = -2**63 if start is None else ts_ns(pd.Series([start]))[0]
+    e = 2**63 - 1 if end is None else ts_ns(pd.Series([end]))[0]
+    return [(max(a, s), min(b, e)) for a, b in zip(bounds[:-1], bounds[1:]) if max(a, s) < min(b, e)]
+
+def _chunk_job(args):
+    """
+    1チャンク [s, e) を採点。答え合わせ用に e の後ろ lookahead だけ余分に読み、集計は [s, e) の行だけ
+    戻り値：(ScoreAggregate の JSON, 間引いたエクイティ点 (ts, 累積), トレード明細)
+    """
+    root, s, e, lookahead = args
+    df = load_data(root, pd.Timestamp(s, unit="ns", tz="UTC"), pd.Timestamp(e + lookahead, unit="ns", tz="UTC"))
+    if df.empty:
+        return None
+    df = prepare(df)
+    own = df[ts_ns(df["datetime"]) < e]
+    tr = own[own["hit"].notna()]
+    eq = tr["ret"].cumsum().to_numpy()
+    keep = np.unique(np.linspace(0, len(eq) - 1, min(len(eq), EQUITY_POINTS)).astype("int64"))
+    return ScoreAggregate().add(own, BUY_TH).to_json(), (ts_ns(tr["datetime"])[keep], eq[keep]), tr
+
+def _ordered(ex, fn, jobs, ahead):
+    # ex.map と同じ順で返すが、先に投げておくのは ahead 件まで（結果がメモリにたまらない）
+    q = deque()
+    for j in jobs:
+        q.append(ex.submit(fn, j))
+        if len(q) >= ahead:
+            yield q.popleft().result()
+    while q:
+        yield q.popleft().result()
+
+def main_chunked(path=None, start=None, end=None, workers=None):
+    """
+    main() と同じ出力を、予測ログを1日ずつ読んで作る（メモリは1日分＋チャンク数×EQUITY_POINTS）
+    日ごとの採点は ProcessPoolExecutor で並列、ScoreAggregate.merge で合体
+    trades_detail.csv はチャンクの順に追記、図のエクイティ曲線は間引いた点で描く
+    """
+    import predlog
+    from concurrent.futures import ProcessPoolExecutor
+    path = path or PRED_LOG
+    if not predlog.exists(path):
+        raise SystemExit(f"--chunked は予測ログ（ディレクトリ）専用だよ。CSV は python predlog.py import {CSV} で取り込んでね")
+    report_journal()
+
+    sch = predlog.read_index(path).get("schema", {})
+    hmax = max([HORIZON_MIN] + [int(c[10:]) for c in sch if c.startswith("proba_up_h")])
+    lookahead = hmax * NS_PER_MIN + TOLERANCE_SEC * 1_000_000_000 + 1
+    jobs = [(path, s, e, lookahead) for s, e in day_chunks(path, start, end)]
+    if not jobs:
+        raise SystemExit("データが少ないよ。もう少し走らせてから来てね！")
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+
+    agg = ScoreAggregate()
+    offset = 0.0
+    xs, ys = [], []
+    first = True
+    with open("trades_detail.csv", "w", newline="", encoding="utf-8") as f, \
+         ProcessPoolExecutor(max_workers=workers) as ex:
+        for res in _ordered(ex, _chunk_job, jobs, ahead=2 * workers):
+            if res is None:
+                continue
+            a, (t, eq), tr = res
+            agg.merge(ScoreAggregate.from_json(a))
+            if len(tr) == 0:
+                continue
+            tr = tr.assign(eq=tr["ret"].cumsum() + offset)
+            tr.to_csv(f, header=first, index=False)
+            first = False
+            xs.append(t); ys.append(eq + offset)
+            offset = float(tr["eq"].iloc[-1])
+    if agg.trades == 0:
+        raise SystemExit("HOLD以外のシグナルが無い/未来データが足りないよ。")
+
+    summary = write_summary(agg)
+    print("=== SUMMARY ===")
+    for k,v in summary.items():
+        print(f"{k}: {v}")
+    x = pd.to_datetime(np.concatenate(xs), utc=True).tz_convert("Asia/Tokyo")
+    plot(x, np.concatenate(ys), agg.calibration())
     print("Saved: eval_summary.json, trades_detail.csv, calibration.csv, equity_curve.png, calibration.png")
 
+def incremental(path=None, state_path=EVAL_STATE) -> int:
+    """
+    前回の途中経過（eval_state.json）に、新しく答えが出た予測だけを足して eval_summary.json を更新
+    読むのは「前回採点した時刻より後」だけ。戻り値は今回足した行数
+    """
+    if path is None:
+        path = default_path()
+    agg = ScoreAggregate.load(state_path)
+    start = None if agg.scored_until is None else pd.Timestamp(agg.scored_until + 1, unit="ns", tz="UTC")
+    df = load_data(path, start, None)
+    if df.empty:
+        return 0
+    df = prepare(df)
+    new = df[matured(df, max_horizon(df))]  # 最大ホライズン＋許容秒を過ぎた行だけ（先頭から連続）
+    if len(new) == 0:
+        return 0
+    agg.add(new, BUY_TH)
+    write_summary(agg)
+    atomic_write_json(state_path, agg.to_json())
+    return len(new)
+
 if __name__ == "__main__":
-    main()
+    import argparse, time
+    ap = argparse.ArgumentParser(description="予測ログ / live_pred.csv を採点")
+    ap.add_argument("path", nargs="?", default=None, help="予測ログのディレクトリか CSV（省略時は pred_log → live_pred.csv）")
+    ap.add_argument("--start", default=None, help="この時刻以降（例: 2025-09-01T09:00+09:00）")
+    ap.add_argument("--end", default=None, help="この時刻より前")
+    ap.add_argument("--incremental", action="store_true", help=f"{EVAL_STATE} に新しく熟した予測だけ足す（図は出さない）")
+    ap.add_argument("--every", type=float, default=None, help="--incremental をこの秒数ごとに繰り返す")
+    ap.add_argument("--chunked", action="store_true", help="予測ログを1日ずつ並列に採点（何か月分でもメモリ一定）")
+    ap.add_argument("--workers", type=int, default=None, help="--chunked のプロセス数（省略時は CPU 数）")
+    a = ap.parse_args()
+    if a.incremental:
+        while True:
+            n = incremental(a.path)
+            print(f"[incremental] +{n} rows -> eval_summary.json")
+            if not a.every:
+                break
+            time.sleep(a.every)
+    elif a.chunked:
+        main_chunked(a.path, parse_time(a.start), parse_time(a.end), a.workers)
+    else:
+        main(a.path, parse_time(a.start), parse_time(a.end))  # 例: batch_predict.py の出力を採点
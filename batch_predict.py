@@ -0,0 +1,84 @@
+# batch_predict.py
+# 保存済みの足データ × モデル(.npz) → 全足の proba_up / BUY・SELL・HOLD を一括計算
+# 出力は live_pred.csv と同じ列（datetime, close, proba_up, signal, proba_up_h*）なので
+#   python analyze_live_pred.py live_pred_batch.csv
+# でそのまま採点できる
+# ※ライブは形成中の足の途中値で予測するが、こちらは確定した終値で予測する
+import argparse, os
+import numpy as np
+import pandas as pd
+from features import make_features, FEATURE_COLS
+from linmodel import LinearModel, MODEL_NPZ, BUY_TH
+
+META_PKL = "ai_meta.pkl"  # .npz が無い時はここから畳み込む（ai_yf_live.load_fast と同じ）
+
+def load_bars(path: str) -> pd.DataFrame:
+    """sample.py が書く形式（datetime, Open, High, Low, Close, ...）の CSV"""
+    df = pd.read_csv(path, index_col=0)
+    df.index = pd.to_datetime(df.index, utc=True)
+    return df.sort_index().dropna(subset=["Close"])
+
+def predict_frame(model: LinearModel, X, close, index, buy_th=BUY_TH) -> pd.DataFrame:
+    P = model.predict_all_batch(X)  # (n, H) 全ヘッドを行列1回で。列0が主ヘッド
+    p = P[:, 0]
+    sig = np.where(p >= buy_th, "BUY", np.where(p <= 1 - buy_th, "SELL", "HOLD"))
+    jst = index.tz_convert("Asia/Tokyo")
+    out = pd.DataFrame({
+        "datetime": jst.strftime("%Y-%m-%dT%H:%M:%S") + "+09:00",  # isoformat と同じ表記
+        "close": np.asarray(close, dtype="float64"),
+        "proba_up": p,
+        "signal": sig,
+    })
+    # ホライズンごとの列（live_pred.csv の proba_up_h1 などと同じ）。ホライズン不明（古い .npz）は出さない
+    for j in np.argsort(model.horizons, kind="stable"):
+        if model.horizons[j]:
+            out[f"proba_up_h{model.horizons[j]}"] = P[:, j]
+    return out
+
+def from_bars(path: str, model: LinearModel, buy_th=BUY_TH) -> pd.DataFrame:
+    df = load_bars(path)
+    feats = make_features(df).dropna()
+    return predict_frame(model, feats[FEATURE_COLS].to_numpy(dtype="float64"),
+                         df["Close"].reindex(feats.index), feats.index, buy_th)
+
+def from_store(root: str, pair: str, model: LinearModel, days=None, buy_th=BUY_TH) -> pd.DataFrame:
+    from feature_store import FeatureStore
+    arr = FeatureStore(root, pair).window(days=days)
+    return predict_frame(model, arr["x"], arr["close"], pd.to_datetime(arr["ts"], utc=True), buy_th)
+
+def load_model(path: str = MODEL_NPZ, meta_pkl: str = META_PKL) -> LinearModel:
+    """.npz を読む。無ければ学習用の pkl からその場で作る（ファイルは書かない）"""
+    if os.path.exists(path):
+        return LinearModel.load(path, cols=FEATURE_COLS)
+    hint = "--model で .npz を指定するか、ai_yf_live.py で学習してください"
+    if path == MODEL_NPZ and os.path.exists(meta_pkl):
+        print(f"[INFO] {path} が無いので {meta_pkl} から作ります")
+        try:
+            import joblib
+            return LinearModel.from_meta(joblib.load(meta_pkl), cols=FEATURE_COLS)
+        except Exception as e:  # sklearn の版違いなどで読めない pkl
+            raise SystemExit(f"{meta_pkl} を読めません: {e!r}（{hint}）")
+    raise SystemExit(f"モデルがありません: {path}（{hint}）")
+
+def main():
+    ap = argparse.ArgumentParser(description="過去の足でモデルを一括推論し live_pred.csv 形式で書き出す")
+    ap.add_argument("--bars", default="USDJPY_1m_7d.csv", help="足データCSV")
+    ap.add_argument("--store", default=None, help="特徴量ストアのディレクトリ（指定時は --bars より優先）")
+    ap.add_argument("--pair", default="USDJPY=X")
+    ap.add_argument("--days", type=float, default=None, help="ストアから読む日数（省略で全部）")
+    ap.add_argument("--model", default=MODEL_NPZ)
+    ap.add_argument("--buy-th", type=float, default=BUY_TH)
+    ap.add_argument("--out", default="live_pred_batch.csv")
+    a = ap.parse_args()
+
+    model = load_model(a.model)
+    if a.store:
+        out = from_store(a.store, a.pair, model, a.days, a.buy_th)
+    else:
+        out = from_bars(a.bars, model, a.buy_th)
+    out.to_csv(a.out, index=False, float_format="%.6f")
+    n = out["signal"].value_counts()
+    print(f"Saved: {a.out} rows={len(out)} BUY={n.get('BUY', 0)} SELL={n.get('SELL', 0)} HOLD={n.get('HOLD', 0)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+# benchmark.py
+# 同梱の USDJPY_1m_7d.csv を流して、部品ごと（micro）と通し（e2e）の速さを測る
+#   python benchmark.py                         … 全部測って bench_results.json へ
+#   python benchmark.py --only ma bb            … 名前の一部で絞る
+#   python benchmark.py --compare bench_baseline.json  … 基準と比べて遅くなったものを出す（あれば終了コード1）
+#   python benchmark.py --save-baseline         … 今回の結果を bench_baseline.json として保存
+# 1つのベンチは1つの子プロセス（spawn）で走らせる：ピーク RSS がベンチごとに分かれ、前のベンチのキャッシュも残らない
+# 1件ごとの所要時間から p50 / p99、全体から ops/s（repeat 回の中央値）
+import argparse, contextlib, hashlib, io, json, os, platform, subprocess, sys, time
+import multiprocessing as mp
+import numpy as np
+
+DATA = "USDJPY_1m_7d.csv"
+OUT = "bench_results.json"
+BASELINE = "bench_baseline.json"
+WARM = 300             # インジケータの初期化に使う本数（残りを1本ずつ流す）
+REPEAT = 5             # 各ベンチの繰り返し回数
+OPS_TOL = 0.10         # ops/s がこれ以上落ちたら回帰
+P99_TOL = 0.25         # p99 がこれ以上伸びたら回帰（ばらつきが大きいので緩め）
+
+# ---------- 準備（子プロセスの中で） ----------
+def _bars():
+    from batch_predict import load_bars
+    df = load_bars(DATA)
+    close = df["Close"].astype(float).to_numpy()
+    return df, close
+
+def _model(df):
+    # ai_yf_live と同じ手順で学習（学習そのものは測らない）
+    from ai_yf_live import build_dataset, fit_heads
+    from features import FEATURE_COLS
+    from linmodel import LinearModel
+    Xdf, Y = build_dataset(df)
+    with contextlib.redirect_stdout(io.StringIO()):
+        meta = fit_heads(Xdf[FEATURE_COLS], Y)
+    return meta, LinearModel.from_meta(meta, cols=FEATURE_COLS), Xdf
+
+def _timed(fn, items):
+    """items を1件ずつ fn に渡し、1件ごとの ns を返す"""
+    lat = np.empty(len(items), dtype="int64")
+    clock = time.perf_counter_ns
+    for i, x in enumerate(items):
+        t0 = clock()
+        fn(x)
+        lat[i] = clock() - t0
+    return lat
+
+# ---------- ベンチ本体：setup() → run() を返す。run() は (件数, 1件ごとの ns or None) ----------
+def bench_ma():
+    from average import MovingAverage
+    _, close = _bars()
+    def run():
+        mas = [MovingAverage(w) for w in (25, 75, 200)]
+        for m in mas:
+            m.init_prices(close[:WARM].tolist())
+        xs = close[WARM:].tolist()
+        return len(xs) * 3, _timed(lambda p: [m.update(p) for m in mas], xs) // 3
+    return run
+
+def bench_bb():
+    from bb import BollingerBands
+    _, close = _bars()
+    def run():
+        bb = BollingerBands(20, 2.0)
+        bb.init_prices(close[:WARM].tolist())
+        xs = close[WARM:].tolist()
+        return len(xs), _timed(bb.update, xs)
+    return run
+
+def bench_rsi():
+    from rsi import RSI
+    _, close = _bars()
+    def run():
+        r = RSI(14)
+        r.init_prices(close[:WARM].tolist())
+        xs = close[WARM:].tolist()
+        return len(xs), _timed(r.update, xs)
+    return run
+
+def _indicator_inputs(df, close):
+    # Strategy.generate に渡す (price, time, ma, bb, rsi) を先に全部作っておく
+    from average import MovingAverage
+    from bb import BollingerBands
+    from rsi import RSI
+    mas = {w: MovingAverage(w) for w in (25, 75, 200)}
+    bb, r = BollingerBands(20, 2.0), RSI(14)
+    for x in (*mas.values(), bb, r):
+        x.init_prices(close[:WARM].tolist())
+    times = df.index.tz_convert("Asia/Tokyo").strftime("%Y-%m-%d %H:%M:%S")
+    out = []
+    for i in range(WARM, len(close)):
+        p = float(close[i])
+        out.append((p, times[i], {w: m.update(p) for w, m in mas.items()}, bb.update(p), r.update(p)))
+    return out
+
+def bench_strategy():
+    df, close = _bars()
+    inputs = _indicator_inputs(df, close)
+    def run():
+        import importlib, strategy
+        importlib.reload(strategy)  # ret1..ret6 はモジュール変数なので毎回まっさらに
+        st = strategy.Strategy()
+        return len(inputs), _timed(lambda a: st.generate(*a, None), inputs)
+    return run
+
+def bench_features():
+    # make_features（全足まとめて）。1回 = 全足
+    from features import make_features
+    df, _ = _bars()
+    def run():
+        t0 = time.perf_counter_ns()
+        make_features(df)
+        return len(df), None, time.perf_counter_ns() - t0
+    return run
+
+def bench_predict_proba():
+    # ai_yf_live.predict_proba（pandas の行 → 1件）。NumPy の行 → 全ヘッドは bench_predict_all
+    df, _ = _bars()
+    meta, _, Xdf = _model(df)
+    rows = [Xdf.iloc[i] for i in range(min(len(Xdf), 2000))]
+    def run():
+        from ai_yf_live import predict_proba
+        return len(rows), _timed(lambda r: predict_proba(meta, r), rows)
+    return run
+
+def bench_predict_all():
+    from features import FEATURE_COLS
+    df, _ = _bars()
+    _, fast, Xdf = _model(df)
+    X = Xdf[FEATURE_COLS].to_numpy(dtype="float64")
+    rows = list(X)
+    def run():
+        return len(rows), _timed(fast.predict_all, rows)
+    return run
+
+def bench_scoring():
+    # batch_predict と同じ形の予測 → analyze_live_pred の採点＋集計（1回 = 全行）
+    from features import make_features, FEATURE_COLS
+    from batch_predict import predict_frame
+    import pandas as pd
+    df, _ = _bars()
+    _, fast, _ = _model(df)
+    feats = make_features(df).dropna()
+    pred = predict_frame(fast, feats[FEATURE_COLS].to_numpy(dtype="float64"),
+                         df["Close"].reindex(feats.index), feats.index)
+    pred["datetime"] = pd.to_datetime(pred["datetime"], utc=True)
+    def run():
+        from analyze_live_pred import prepare, BUY_TH
+        from scoring import ScoreAggregate
+        t0 = time.perf_counter_ns()
+        ScoreAggregate().add(prepare(pred.copy()), BUY_TH)
+        return len(pred), None, time.perf_counter_ns() - t0
+    return run
+
+def bench_e2e():
+    # main.py の1分ぶんの処理を通しで：MA/BB/RSI → 特徴量 → 全ヘッド推論 → Strategy.generate
+    from average import MovingAverage
+    from bb import BollingerBands
+    from rsi import RSI
+    from features import IndicatorFeatures
+    from linmodel import HORIZON, decide
+    df, close = _bars()
+    _, fast, _ = _model(df)
+    ts = df.index.tz_convert("Asia/Tokyo")
+    times = ts.strftime("%Y-%m-%d %H:%M:%S")
+    def run():
+        import importlib, strategy
+        importlib.reload(strategy)
+        st = strategy.Strategy()
+        mas = {w: MovingAverage(w) for w in (25, 75, 200)}
+        bb, r, feats = BollingerBands(20, 2.0), RSI(14), IndicatorFeatures(20)
+        for x in (*mas.values(), bb, r, feats):
+            x.init_prices(close[:WARM].tolist())
+        def step(i):
+            p = float(close[i])
+            ma = {w: m.update(p) for w, m in mas.items()}
+            bv = bb.update(p)
+            rv = r.update(p)
+            row = feats.update(ts[i], p)
+            ml = None
+            if row is not None:
+                pu = float(fast.predict_all(row)[0])
+                ml = {"minute": times[i][:16], "p_up": pu, "hold_min": HORIZON, "signal": decide(pu)}
+            st.generate(p, times[i], ma, bv, rv, ml)
+        idx = range(WARM, len(close))
+        return len(idx), _timed(step, idx)
+    return run
+
+BENCHES = {
+    "ma_update": bench_ma,
+    "bb_update": bench_bb,
+    "rsi_update": bench_rsi,
+    "strategy_generate": bench_strategy,
+    "make_features": bench_features,
+    "predict_proba": bench_predict_proba,
+    "predict_all": bench_predict_all,
+    "scoring": bench_scoring,
+    "e2e_pipeline": bench_e2e,
+}
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 2**20
+        except Exception:
+            return None
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / 2**20 if sys.platform == "darwin" else r / 2**10  # mac は bytes、Linux は KB
+
+def _child(name, repeat):
+    """子プロセスで1ベンチ。結果の dict を返す"""
+    np.random.seed(0)
+    run = BENCHES[name]()
+    rates, lat, wall = [], None, 0
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        res = run()
+        total = res[2] if len(res) > 2 else time.perf_counter_ns() - t0
+        n, lat = res[0], (res[1] if res[1] is not None else lat)
+        rates.append(n / (total / 1e9))
+        wall += total
+    out = {"ops": n, "repeat": repeat, "ops_per_sec": float(np.median(rates)),
+           "ops_per_sec_min": float(min(rates)), "ops_per_sec_max": float(max(rates)),
+           "wall_sec": wall / 1e9, "p50_us": None, "p99_us": None}
+    if lat is not None:
+        out["p50_us"] = float(np.percentile(lat, 50) / 1e3)
+        out["p99_us"] = float(np.percentile(lat, 99) / 1e3)
+    out["peak_rss_mb"] = _peak_rss_mb()
+    return out
+
+def _meta():
+    import pandas as pd
+    with open(DATA, "rb") as f:
+        sha = hashlib.sha1(f.read()).hexdigest()
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = None
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "git": rev or None, "data": DATA, "data_sha1": sha,
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count(), "repeat": REPEAT, "warm": WARM}
+
+def run_all(names, repeat=REPEAT) -> dict:
+    ctx = mp.get_context("spawn")
+    results = {}
+    for name in names:
+        with ctx.Pool(1) as pool:
+            results[name] = r = pool.apply(_child, (name, repeat))
+        lat = f"p50={r['p50_us']:.1f}us p99={r['p99_us']:.1f}us" if r["p50_us"] is not None else ""
+        rss = f"rss={r['peak_rss_mb']:.0f}MB" if r["peak_rss_mb"] is not None else ""
+        print(f"{name:<18} {r['ops_per_sec']:>14,.0f} ops/s  {lat:<32} {rss}")
+    return {"meta": _meta() | {"repeat": repeat}, "results": results}
+
+def compare(cur: dict, base: dict, ops_tol=OPS_TOL, p99_tol=P99_TOL) -> list:
+    """遅くなったベンチの一覧 [(名前, 何が, 基準, 今回)]"""
+    bad = []
+    print(f"\n{'bench':<18} {'base ops/s':>14} {'now ops/s':>14} {'ratio':>7}  {'p99 base→now (us)':>22}")
+    for name, r in cur["results"].items():
+        b = base.get("results", {}).get(name)
+        if b is None:
+            print(f"{name:<18} {'(new)':>14}")
+            continue
+        ratio = r["ops_per_sec"] / b["ops_per_sec"]
+        flag = ""
+        if ratio < 1 - ops_tol:
+            bad.append((name, "ops_per_sec", b["ops_per_sec"], r["ops_per_sec"])); flag = " << SLOWER"
+        p99 = ""
+        if r.get("p99_us") is not None and b.get("p99_us"):
+            p99 = f"{b['p99_us']:.1f}→{r['p99_us']:.1f}"
+            if r["p99_us"] > b["p99_us"] * (1 + p99_tol):
+                bad.append((name, "p99_us", b["p99_us"], r["p99_us"])); flag += " << p99"
+        print(f"{name:<18} {b['ops_per_sec']:>14,.0f} {r['ops_per_sec']:>14,.0f} {ratio:>7.2f}  {p99:>22}{flag}")
+    if base.get("meta", {}).get("data_sha1") != cur["meta"]["data_sha1"]:
+        print("[WARN] 基準とデータファイルが違います（比較の意味が薄い）")
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser(description=f"{DATA} を流してベンチマーク")
+    ap.add_argument("--only", nargs="*", default=None, help="名前の一部で絞る（例: ma strategy e2e）")
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--out", default=OUT)
+    ap.add_argument("--compare", nargs="?", const=BASELINE, default=None, help="基準の JSON（省略時は bench_baseline.json）")
+    ap.add_argument("--save-baseline", action="store_true", help=f"結果を {BASELINE} にも保存")
+    ap.add_argument("--list", action="store_true", help="ベンチの名前を出して終わる")
+    a = ap.parse_args()
+    if a.list:
+        print("\n".join(BENCHES)); return
+    names = [n for n in BENCHES if not a.only or any(k in n for k in a.only)]
+    if not names:
+        raise SystemExit(f"該当するベンチがありません: {a.only}")
+    res = run_all(names, a.repeat)
+    with open(a.out, "w", encoding="utf-8") as f:
+        json.dump(res, f, ensure_ascii=False, indent=2)
+    print(f"Saved: {a.out}")
+    if a.save_baseline:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+        print(f"Saved: {BASELINE}")
+    if a.compare:
+        with open(a.compare, encoding="utf-8") as f:
+            base = json.load(f)
+        bad = compare(res, base)
+        if bad:
+            print(f"\n回帰 {len(bad)} 件: " + ", ".join(f"{n}.{k}" for n, k, _, _ in bad))
+            sys.exit(1)
+        print("\n回帰なし")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bus.py
+# プロセス内の配信バス（価格・確定足・約定をスレッド間で配る）
+#   - publish(topic, msg)       … 登録されている購読者全員のキューへ積むだけ（待たない）
+#   - subscribe(topic, maxlen)  … Subscription を返す。遅い購読者は古いものから捨てる（dropped で数える）
+#   送る側は購読者がいなくてもコストほぼゼロ。受ける側は drain() でまとめて取り出す
+import threading
+from collections import deque
+
+PRICE = "price"   # (ts, price)                            … 毎秒
+BAR = "bar"       # (ts, price, {w: ma}, bb, rsi)          … 分が切り替わった時だけ
+TRADE = "trade"   # {"time", "sid", "kind", "side", "price", "pnl"}  … エントリー/買い増し/決済
+
+class Subscription:
+    def __init__(self, bus: "Bus", topic: str, maxlen: int):
+        self.bus = bus
+        self.topic = topic
+        self.q: deque = deque(maxlen=maxlen)
+        self.dropped = 0
+        self._ev = threading.Event()
+
+    def put(self, msg) -> None:
+        if len(self.q) == self.q.maxlen:
+            self.dropped += 1
+        self.q.append(msg)
+        self._ev.set()
+
+    def drain(self) -> list:
+        """たまっている分を全部（古い順）。無ければ []"""
+        self._ev.clear()
+        out = []
+        while self.q:
+            out.append(self.q.popleft())
+        return out
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._ev.wait(timeout)
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+class Bus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs: dict = {}
+
+    def subscribe(self, topic: str, maxlen: int = 1024) -> Subscription:
+        s = Subscription(self, topic, maxlen)
+        with self._lock:
+            # 配信中に書き換えないよう、リストは差し替え（publish 側はロック無しで回せる）
+            self._subs[topic] = self._subs.get(topic, ()) + (s,)
+        return s
+
+    def unsubscribe(self, s: Subscription) -> None:
+        with self._lock:
+            self._subs[s.topic] = tuple(x for x in self._subs.get(s.topic, ()) if x is not s)
+
+    def publish(self, topic: str, msg) -> None:
+        for s in self._subs.get(topic, ()):
+            s.put(msg)
@@ -0,0 +1,177 @@
+# dashboard.py
+# ターミナル表示（ANSI エスケープで差分だけ描き直す）
+#   - Screen    … 前回描いた行を覚えておき、変わった行の「変わったところから右」だけ書き直す
+#                 書き出しは1フレーム1回の write + flush（print を何十回も呼ばない）
+#   - panel()   … 1ペアぶんのスナップショット → 行のリスト [(色, 文字列)]
+#   - Dashboard … 複数ペアのパネルを縦に並べて、最大 fps 回/秒だけ描く（変化が無ければ何もしない）
+import math, os, shutil, sys, threading, time
+
+RESET = "\033[0m"
+RED, GREEN, YELLOW, BLUE, MAGENTA, CYAN = (f"\033[{c}m" for c in (31, 32, 33, 34, 35, 36))
+RULE = "-" * 59
+MA200_BAND = 0.0005   # spl ma 200 ± の幅（strategy.py の利確ラインと同じ）
+POS = {0: "-", 1: "BUY", 2: "SELL"}
+
+def enable_vt():
+    # Windows の古いコンソールでも ANSI を通す（空の system 呼び出しで VT モードが有効になる）
+    if os.name == "nt":
+        os.system("")
+
+def f3(x) -> str:
+    # 小数3桁で切り捨て（前の Decimal(ROUND_DOWN) と同じ見え方）。None / NaN は "nan"
+    if x is None or (isinstance(x, float) and math.isnan(x)):
+        return "nan"
+    return f"{math.floor(x * 1000 + 1e-6) / 1000:.3f}"
+
+class Screen:
+    """
+    draw(lines) … lines は [(色, 文字列)]。前回と同じ行は送らない
+    端末の幅で切るので折り返しで行がずれない。サイズが変わった時だけ全消しして描き直す
+    close() … カーソルを戻して表示の下へ。以後の draw は何もしない（別スレッドから呼んでよい）
+    """
+    def __init__(self, out=None):
+        self.out = out or sys.stdout
+        self.prev: list = []
+        self.size = None
+        self.closed = False
+        self._lock = threading.Lock()  # draw の途中で close が割り込まないように
+
+    def draw(self, lines) -> int:
+        with self._lock:
+            return 0 if self.closed else self._draw(lines)
+
+    def _draw(self, lines) -> int:
+        size = shutil.get_terminal_size((80, 24))
+        buf = []
+        if size != self.size:
+            buf.append("\033[?25l\033[2J")  # カーソル非表示＋全消し
+            self.prev = []
+            self.size = size
+        w = size.columns - 1
+        lines = [(c, t[:w]) for c, t in lines[:size.lines - 1]]
+        for row, (color, text) in enumerate(lines, start=1):
+            old = self.prev[row - 1] if row <= len(self.prev) else None
+            if old == (color, text):
+                continue
+            col = 0
+            if old is not None and old[0] == color:
+                # 同じ色なら共通の先頭は飛ばす（時刻や価格の末尾だけ変わることが多い）
+                o = old[1]
+                while col < len(o) and col < len(text) and o[col] == text[col]:
+                    col += 1
+            buf.append(f"\033[{row};{col + 1}H{color}{text[col:]}{RESET if color else ''}\033[K")
+        for row in range(len(lines) + 1, len(self.prev) + 1):
+            buf.append(f"\033[{row};1H\033[K")  # 前回より短くなった分を消す
+        self.prev = lines
+        if buf:
+            self.out.write("".join(buf))
+            self.out.flush()
+        return len(buf)
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.size is not None:  # 一度も描いていなければ端末はそのまま
+                self.out.write(f"\033[{len(self.prev) + 1};1H\033[?25h{RESET}\n")
+                self.out.flush()
+
+def slot_line(i: int, r: dict) -> str:
+    # SignalResult（asdict）を1行に
+    return (f"ret{i} win={r['win']:<4} los={r['los']:<4} cnt={r['cnt']:<4} sum={r['sum']:>12,.0f} "
+            f"hold={r['hold']:<7} pos={POS.get(r['holdjudge'], '?'):<4} end={r['end_time_stamp']}")
+
+def metrics_line(sid, m: dict) -> str:
+    sh = f"{m['sharpe_like']:.2f}" if m["sharpe_like"] is not None else "-"
+    wr = f"{m['win_rate']:.2f}" if m["win_rate"] is not None else "-"
+    return f"ret{sid} last{m['n']:<4}: win={wr} sharpe={sh} dd={m['drawdown']:.0f} maxdd={m['max_drawdown']:.0f}"
+
+def panel(pair: str, px, ma_snap, signal) -> list:
+    """
+    px = Tick(ts, price, fetched_at, seq), ma_snap = (ts, price, {w: ma}, bb, rsi, ml, tick)
+    signal = Strategy.generate() の戻り値（"trace" があれば、どの価格から出たシグナルかも出す）
+    どれかがまだ無ければ待ち表示だけ
+    """
+    lines = [("", RULE)]
+    if not px or not ma_snap:
+        return lines + [("", f"{pair}: waiting for data...")]
+    ts_px, price = px[0], px[1]
+    ma, bb, rsi, ml = ma_snap[2:6]
+    ma200 = ma.get(200)
+    lines += [
+        ("", f"{pair}  date: {ts_px:%Y-%m-%d} time: {ts_px:%H:%M:%S}"),
+        (RED, f"now price   : {f3(price)}"),
+        (YELLOW, f"ma 25       : {f3(ma.get(25))}"),
+        (YELLOW, f"ma 75       : {f3(ma.get(75))}"),
+        (YELLOW, f"ma 200      : {f3(ma200)}"),
+        (YELLOW, f"spl ma 200 +: {f3(ma200 * (1 + MA200_BAND) if ma200 is not None else None)}"),
+        (YELLOW, f"spl ma 200  : {f3(ma200)}"),
+        (YELLOW, f"spl ma 200 -: {f3(ma200 * (1 - MA200_BAND) if ma200 is not None else None)}"),
+        (GREEN, f"bb +2σ      : {f3(bb['upper_2'])}"),
+        (GREEN, f"bb +1σ      : {f3(bb['upper_1'])}"),
+        (GREEN, f"bb mid      : {f3(bb['mid'])}"),
+        (GREEN, f"bb -1σ      : {f3(bb['lower_1'])}"),
+        (GREEN, f"bb -2σ      : {f3(bb['lower_2'])}"),
+        (BLUE, f"rsi         : {f3(rsi)}"),
+        (MAGENTA, f"ml p_up     : {ml['p_up']:.3f} {ml['signal']}" if ml is not None else "ml p_up     : -"),
+        ("", RULE),
+    ]
+    if signal and "trace" in signal:
+        tr = signal["trace"]
+        lines.append(("", f"signal seq={tr['seq']} bar_seq={tr['bar_seq']} "
+                          f"bar→signal={tr['signal_at'] - tr['bar_ts'].timestamp():.1f}s "
+                          f"fetch→signal={(tr['signal_at'] - tr['fetched_at']) * 1000:.1f}ms"))
+    if signal:
+        lines += [(GREEN, slot_line(i, r)) for i, r in enumerate(signal["ret"], start=1)]
+        lines += [(CYAN, metrics_line(sid, m)) for sid, m in sorted(signal.get("metrics", {}).items())]
+    return lines
+
+class Dashboard:
+    """
+    source() が (version, [(pair, px, ma_snap, signal), ...]) を返す関数
+    version が前回と同じならフレームを作らない。描くのは最大 fps 回/秒
+    """
+    def __init__(self, source, fps: float = 2.0, out=None):
+        self.source = source
+        self.interval = 1.0 / fps
+        self.screen = Screen(out)
+        self.version = None
+        self.frames = 0
+        self.panels = []   # 最後に描いたパネル（描いた内容の元データを呼ぶ側から見られるように）
+        self.stopped = threading.Event()
+
+    def stop(self, thread: threading.Thread = None, timeout: float = 2.0) -> None:
+        """
+        run() を止めて端末を元に戻す。thread（run を回しているスレッド）を渡すと join してから
+        daemon スレッドの finally は終了時に走らないので、止める側（メインスレッド）から必ず呼ぶこと
+        """
+        self.stopped.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.screen.close()
+
+    def tick(self) -> bool:
+        version, panels = self.source()
+        if version == self.version:
+            return False
+        self.version = version
+        self.panels = panels
+        lines = []
+        for pair, px, ma_snap, signal in panels:
+            lines += panel(pair, px, ma_snap, signal)
+        self.screen.draw(lines)
+        self.frames += 1
+        return True
+
+    def run(self, on_frame=None):
+        """on_frame(dashboard, 描くのにかかった秒) … 描いたフレームごとに呼ぶ（計測用）"""
+        enable_vt()
+        try:
+            while not self.stopped.is_set():
+                t0 = time.perf_counter()
+                if self.tick() and on_frame is not None:
+                    on_frame(self, time.perf_counter() - t0)
+                self.stopped.wait(max(self.interval - (time.perf_counter() - t0), 0.0))
+        finally:
+            self.screen.close()
@@ -0,0 +1,173 @@
+# feature_store.py
+# 特徴量ストア（通貨ペアごと・足の時刻キー・追記専用）
+#   - 1本ごとに1回だけ特徴量を計算して追記（ライブ側）
+#   - 学習側は np.memmap で直近N日の窓をゼロコピーで読む（ネット/再計算不要）
+#   - 書き手はライブ側と再学習ワーカーの2プロセスありうるので、追記はファイルロックの中で末尾の時刻を読み直してから
+import os, json
+from typing import Optional
+import numpy as np
+from features import FEATURE_COLS
+
+MAGIC = b"FSTORE1\n"
+HEADER = 256  # MAGIC + JSON（列名）をこのバイト数に詰める
+NS_PER_DAY = 86_400_000_000_000
+
+try:
+    import fcntl
+    def _lock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    def _unlock(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows：先頭1バイトをロック（ヘッダなので追記とぶつからない）
+    import msvcrt
+    def _lock(f):
+        f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+    def _unlock(f):
+        f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def store_dtype(cols=FEATURE_COLS):
+    # x は (len(cols),) の部分配列 → arr["x"] がそのまま (n, F) の行列ビューになる
+    return np.dtype([("ts", "<i8"), ("close", "<f8"), ("x", "<f8", (len(cols),))])
+
+def _ts_ns(ts) -> int:
+    # pandas.Timestamp / datetime（tz付き）→ int64(ns, UTC)
+    if hasattr(ts, "value"):
+        return int(ts.value)
+    return int(round(ts.timestamp() * 1e9))
+
+class FeatureStore:
+    """
+    path/<pair>.bin に固定長レコード（ts, close, x[F]）を時刻順に追記
+      - append(ts, close, row) … 1本追記（ファイル末尾の時刻以前は無視）
+      - append_frame(df)       … make_features 済みの DataFrame をまとめて追記（確定足だけ渡すこと）
+      - window(days/start/end) … 範囲の memmap ビュー（コピーしない）
+    """
+    def __init__(self, root: str = "feature_store", pair: str = "USDJPY=X", cols=FEATURE_COLS):
+        self.root = root
+        self.pair = pair
+        self.cols = list(cols)
+        self.dtype = store_dtype(self.cols)
+        self.path = os.path.join(root, f"{pair}.bin")
+        os.makedirs(root, exist_ok=True)
+        self._init_file()
+        self.last_ts: Optional[int] = self._read_last_ts()
+
+    # ---- ファイル ---------------------------------------------------------------
+    def _init_file(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER:
+            with open(self.path, "rb") as f:
+                head = f.read(HEADER)
+            if not head.startswith(MAGIC):
+                raise ValueError(f"特徴量ストアの形式が違います: {self.path}")
+            meta = json.loads(head[len(MAGIC):].decode("utf-8").strip())
+            if meta.get("cols") != self.cols:
+                raise ValueError(f"特徴量の列が違います: {meta.get('cols')} != {self.cols}")
+            return
+        body = json.dumps({"cols": self.cols}).encode("utf-8")
+        if len(MAGIC) + len(body) + 1 > HEADER:
+            raise ValueError("列名が長すぎます")
+        with open(self.path, "wb") as f:
+            f.write(MAGIC + body + b" " * (HEADER - len(MAGIC) - len(body) - 1) + b"\n")
+
+    def __len__(self) -> int:
+        return max(0, (os.path.getsize(self.path) - HEADER) // self.dtype.itemsize)
+
+    def _last_ts(self, f, n: int) -> Optional[int]:
+        if n == 0:
+            return None
+        f.seek(HEADER + (n - 1) * self.dtype.itemsize)
+        return int(np.frombuffer(f.read(8), dtype="<i8")[0])
+
+    def _read_last_ts(self) -> Optional[int]:
+        with open(self.path, "rb") as f:
+            return self._last_ts(f, len(self))
+
+    # ---- 書き込み ---------------------------------------------------------------
+    def _write(self, rec) -> int:
+        """
+        rec のうちファイル末尾より新しい行だけ追記 → 書いた行数
+        self.last_ts は自分が最後に見た値なので当てにしない（別プロセスが書いているかも）。ロックの中で読み直す
+        """
+        with open(self.path, "r+b") as f:
+            _lock(f)
+            try:
+                n = len(self)
+                last = self._last_ts(f, n)
+                if last is not None:
+                    rec = rec[rec["ts"] > last]
+                if len(rec):
+                    # 書きかけの端数レコードがあれば上書きする位置から
+                    f.seek(HEADER + n * self.dtype.itemsize)
+                    f.write(rec.tobytes())
+                    f.truncate()
+                    f.flush()
+                    last = int(rec["ts"][-1])
+            finally:
+                _unlock(f)
+        self.last_ts = last
+        return len(rec)
+
+    def append(self, ts, close: float, row) -> bool:
+        t = _ts_ns(ts)
+        if self.last_ts is not None and t <= self.last_ts:
+            return False  # 末尾は増える一方なので、ここで弾けるものはロック不要
+        rec = np.zeros(1, dtype=self.dtype)
+        rec["ts"] = t
+        rec["close"] = close
+        rec["x"] = np.asarray(row, dtype="float64")
+        return self._write(rec) > 0
+
+    def append_frame(self, feats, close) -> int:
+        """feats: make_features(df).dropna()、close: 同じ index の終値 Series"""
+        feats = feats[self.cols].dropna()
+        idx = feats.index.tz_convert("UTC").tz_localize(None) if feats.index.tz is not None else feats.index
+        t = idx.to_numpy().astype("datetime64[ns]").view("int64")
+        keep = t > self.last_ts if self.last_ts is not None else np.ones(len(t), dtype=bool)
+        if not keep.any():
+            return 0
+        rec = np.zeros(int(keep.sum()), dtype=self.dtype)
+        rec["ts"] = t[keep]
+        rec["close"] = close.reindex(feats.index).to_numpy(dtype="float64")[keep]
+        rec["x"] = feats.to_numpy(dtype="float64")[keep]
+        rec = rec[np.concatenate(([True], np.diff(rec["ts"]) > 0))]  # 時刻が増えていない行は入れない
+        return self._write(rec)
+
+    def span_days(self, arr=None) -> float:
+        """arr（既定は全件）の最初の足から最後の足までの日数"""
+        arr = self.all() if arr is None else arr
+        return 0.0 if len(arr) == 0 else (int(arr["ts"][-1]) - int(arr["ts"][0])) / NS_PER_DAY
+
+    # ---- 読み出し ---------------------------------------------------------------
+    def all(self):
+        n = len(self)
+        if n == 0:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER, shape=(n,))
+
+    def window(self, days: Optional[float] = None, start: Optional[int] = None, end: Optional[int] = None):
+        """
+        時刻範囲 [start, end)（int64 ns, UTC）の memmap ビュー
+        days を渡すと「最後の足から days 日前」以降
+        """
+        arr = self.all()
+        if len(arr) == 0:
+            return arr
+        ts = arr["ts"]
+        if days is not None:
+            start = int(ts[-1]) - int(days * NS_PER_DAY)
+        i0 = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        i1 = len(arr) if end is None else int(np.searchsorted(ts, end, side="left"))
+        return arr[i0:i1]
+
+def dataset_multi(arr, horizons):
+    """
+    ストアの窓 → (X, Y)。Y は (n, H)、列 j は horizons[j] 本後の終値が高ければ1
+    末尾 max(horizons) 本は全ホライズンぶんそろわないので除外。X は arr["x"] のビュー（コピーしない）
+    """
+    hmax = max(horizons)
+    n = len(arr) - hmax
+    if n <= 0:
+        return arr["x"][:0], np.empty((0, len(horizons)))
+    close = arr["close"]
+    Y = np.stack([close[h:h + n] > close[:n] for h in horizons], axis=1).astype("float64")
+    return arr["x"][:n], Y
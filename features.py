@@ -0,0 +1,121 @@
+# features.py
+# 特徴量（学習・推論で共通）
+#   - make_features()     … DataFrame まるごと（学習/バッチ用、pandas）
+#   - StreamingFeatures   … 1本ずつ O(1) 更新（ライブ用、pandas 不要）
+import math
+from collections import deque
+from datetime import timezone, timedelta
+from typing import Optional, List
+
+FEATURE_COLS = ["ret1", "ret5", "z20", "bb_w", "rsi14", "hour"]
+JST = timezone(timedelta(hours=9))  # Asia/Tokyo（サマータイム無し）
+
+# ---------- 指標・特徴量 ----------
+def _rsi(close, n=14):
+    diff = close.diff()
+    up = diff.clip(lower=0).rolling(n).mean()
+    dn = (-diff.clip(upper=0)).rolling(n).mean()
+    rs = up / (dn + 1e-12)
+    return 100 - 100 / (1 + rs)
+
+def make_features(df):
+    import pandas as pd
+    c = df["Close"]
+    s = pd.DataFrame(index=df.index)
+    s["ret1"]  = c.pct_change(1)
+    s["ret5"]  = c.pct_change(5)
+    ma20 = c.rolling(20).mean()
+    std20 = c.rolling(20).std()
+    s["z20"]   = (c - ma20) / (std20 + 1e-12)
+    s["bb_w"]  = 4.0 * std20          # ≒ Upper2-Lower2
+    s["rsi14"] = _rsi(c, 14)
+    s["hour"]  = (pd.to_datetime(df.index.tz_convert("Asia/Tokyo"))
+                  .strftime("%H").astype(int))
+    return s
+
+class StreamingFeatures:
+    """
+    make_features() の最終行と同じ値を、1本ごとに O(1) で出す
+      - update(ts, close) … 確定した足を1本取り込み、その足の特徴量を返す
+      - peek(ts, close)   … 形成中の足で計算だけする（状態は変えない）
+    どちらも準備中（本数不足）は None。戻り値は FEATURE_COLS の順のリスト
+    直近20本の終値だけで全特徴量が決まるので、保持するのはそれだけ
+    （平均/分散は窓内で正確に合計し直すので、pandas の rolling とは丸め誤差程度の差）
+    """
+    WINDOW = 20
+    RSI_N = 14
+
+    def __init__(self):
+        self.buf: deque = deque(maxlen=self.WINDOW)
+        self.last_ts = None
+
+    def ready(self) -> bool:
+        return len(self.buf) == self.WINDOW
+
+    def update(self, ts, close: float) -> Optional[List[float]]:
+        self.buf.append(float(close))
+        self.last_ts = ts
+        return self._row(self.buf, ts)
+
+    def peek(self, ts, close: float) -> Optional[List[float]]:
+        if len(self.buf) < self.WINDOW - 1:
+            return None
+        win = list(self.buf)[-(self.WINDOW - 1):]
+        win.append(float(close))
+        return self._row(win, ts)
+
+    def _row(self, win, ts) -> Optional[List[float]]:
+        n = self.WINDOW
+        if len(win) < n:
+            return None
+        c = win[-1]
+        ret1 = c / win[-2] - 1.0
+        ret5 = c / win[-6] - 1.0
+        mean = math.fsum(win) / n
+        std = math.sqrt(math.fsum((x - mean) ** 2 for x in win) / (n - 1))
+        z20 = (c - mean) / (std + 1e-12)
+        bb_w = 4.0 * std
+        k = self.RSI_N
+        diffs = [win[i] - win[i - 1] for i in range(n - k, n)]
+        up = math.fsum(d for d in diffs if d > 0) / k
+        dn = math.fsum(-d for d in diffs if d < 0) / k
+        rsi14 = 100 - 100 / (1 + up / (dn + 1e-12))
+        hour = ts.astimezone(JST).hour
+        return [ret1, ret5, z20, bb_w, rsi14, hour]
+
+class IndicatorFeatures:
+    """
+    main.py のインジケータと同じ足で回す特徴量（戻り値は FEATURE_COLS の順）
+      - z20 / bb_w は自前の直近 window 本から（学習側と同じ標本標準偏差、fsum で）
+        bb.py を流用すると、init_prices() が最後の1本を二重に数えるので起動後 window 本の間ずれるうえ、
+        sumsq の引き算で 1e-7 程度の誤差も乗る
+      - rsi14 は学習側と同じ単純平均版。rsi.py は Wilder 平滑で値が違うので流用しない
+    どちらも直近 window 本だけで決まるので、init_prices の直後から学習側と同じ値になる
+    """
+    def __init__(self, window: int = StreamingFeatures.WINDOW, rsi_n: int = StreamingFeatures.RSI_N):
+        self.window = window
+        self.rsi_n = rsi_n
+        self.closes: deque = deque(maxlen=max(window, rsi_n + 1, 6))
+
+    def init_prices(self, prices) -> None:
+        for p in prices[-self.closes.maxlen:]:
+            self.closes.append(float(p))
+
+    def update(self, ts, close: float) -> Optional[List[float]]:
+        self.closes.append(float(close))
+        if len(self.closes) < self.closes.maxlen:
+            return None
+        c = self.closes
+        n = self.window
+        win = list(c)[-n:]
+        mean = math.fsum(win) / n
+        std = math.sqrt(math.fsum((x - mean) ** 2 for x in win) / (n - 1))
+        z20 = (c[-1] - mean) / (std + 1e-12)
+        k = self.rsi_n
+        up = dn = 0.0
+        for i in range(len(c) - k, len(c)):
+            d = c[i] - c[i - 1]
+            if d > 0: up += d
+            else:     dn -= d
+        rsi14 = 100 - 100 / (1 + (up / k) / (dn / k + 1e-12))
+        return [c[-1] / c[-2] - 1.0, c[-1] / c[-6] - 1.0, z20, 4.0 * std, rsi14, ts.astimezone(JST).hour]
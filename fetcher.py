@@ -1,9 +1,21 @@
 # fetcher.py
 import time
-from typing import List, Tuple, Optional
+from typing import List, Tuple, Optional, NamedTuple
 import pandas as pd
 import yfinance as yf
 
+class Tick(NamedTuple):
+    """
+    価格1回ぶんの記録（main.py のタスク間でそのまま受け渡す）
+      ts         … 元の足の時刻（yfinance の1分足の時刻）
+      fetched_at … 取得が終わった時刻（time.time()）
+      seq        … 取得ごとの通し番号
+    """
+    ts: pd.Timestamp
+    price: float
+    fetched_at: float
+    seq: int
+
 class PriceFetcher:
     """
     価格取得専任クラス（yfinance）
@@ -0,0 +1,179 @@
+# fill.py
+# 約定シミュレータ（スプレッド/スリッページ込みの約定価格をベクトルでまとめて計算）
+#   - バックテスト：トレード一覧（配列）をまるごと渡す
+#   - ライブ（ペーパー）：fill_one() で1件ずつ、または約定ジャーナルを reprice_journal() で再評価
+import numpy as np
+
+PIP = 0.01  # JPYペアの1pip
+BUY, SELL = 1, 2  # SignalResult.holdjudge と同じ
+
+def ts_ns(s):
+    """tz付き datetime の Series → int64(ns, UTC) の配列"""
+    if s.dt.tz is not None:
+        s = s.dt.tz_convert("UTC").dt.tz_localize(None)
+    return s.to_numpy().astype("datetime64[ns]").view("int64")
+
+def _hour_jst(t):
+    # int64(ns, UTC) → JSTの時(0-23)
+    return ((np.asarray(t, dtype="int64") // 3_600_000_000_000) + 9) % 24
+
+# ---------- スプレッドモデル（戻り値は価格単位のスプレッド幅） ----------
+class ConstantSpread:
+    """常に一定（pips）"""
+    def __init__(self, pips: float = 0.6):
+        self.pips = pips
+
+    def __call__(self, ts_ns, high, low, close):
+        return np.full(np.shape(close), self.pips * PIP)
+
+class TimeOfDaySpread:
+    """時間帯（JST）ごとのスプレッド。hourly は24個の pips"""
+    def __init__(self, hourly=None, default_pips: float = 0.6):
+        if hourly is None:
+            # 早朝（NYクローズ〜東京オープン前）だけ広げるざっくり設定
+            hourly = [default_pips] * 24
+            for h in (5, 6, 7):
+                hourly[h] = default_pips * 3
+        if len(hourly) != 24:
+            raise ValueError("hourly must have 24 values")
+        self.table = np.asarray(hourly, dtype="float64") * PIP
+
+    def __call__(self, ts_ns, high, low, close):
+        return self.table[_hour_jst(ts_ns)]
+
+class VolatilitySpread:
+    """足の値幅に比例して広がる：base + k*(high-low)（上限 cap_pips）"""
+    def __init__(self, base_pips: float = 0.4, k: float = 0.1, cap_pips: float = 5.0):
+        self.base = base_pips * PIP
+        self.k = k
+        self.cap = cap_pips * PIP
+
+    def __call__(self, ts_ns, high, low, close):
+        rng = np.asarray(high, dtype="float64") - np.asarray(low, dtype="float64")
+        return np.minimum(self.base + self.k * rng, self.cap)
+
+# ---------- スリッページモデル（不利な方向への価格ずれ、価格単位） ----------
+class FixedSlippage:
+    def __init__(self, pips: float = 0.0):
+        self.pips = pips
+
+    def __call__(self, ts_ns, high, low, close):
+        return np.full(np.shape(close), self.pips * PIP)
+
+class RangeSlippage:
+    """足の値幅の frac 倍だけ滑る"""
+    def __init__(self, frac: float = 0.1):
+        self.frac = frac
+
+    def __call__(self, ts_ns, high, low, close):
+        return self.frac * (np.asarray(high, dtype="float64") - np.asarray(low, dtype="float64"))
+
+# ---------- 本体 ----------
+class FillSimulator:
+    """
+    約定価格 = 基準価格 ± (スプレッド/2 + スリッページ)
+      買い(BUY)は高く、売り(SELL)は安く約定する
+    """
+    def __init__(self, spread=None, slippage=None):
+        self.spread = spread if spread is not None else ConstantSpread()
+        self.slippage = slippage if slippage is not None else FixedSlippage()
+
+    def cost(self, ts_ns, high, low, close):
+        """片道の不利幅（価格単位）"""
+        return self.spread(ts_ns, high, low, close) / 2.0 + self.slippage(ts_ns, high, low, close)
+
+    def fill_prices(self, side, ts_ns, high, low, close, ref=None):
+        """
+        side: BUY/SELL の配列（約定する向き）
+        ref : 基準価格（省略時は close）
+        """
+        side = np.asarray(side)
+        ref = np.asarray(close if ref is None else ref, dtype="float64")
+        sign = np.where(side == BUY, 1.0, -1.0)
+        return ref + sign * self.cost(ts_ns, high, low, close)
+
+    def fill_one(self, side: int, ts_ns: int, high: float, low: float, close: float, ref: float = None) -> float:
+        """ライブ用：1件だけ"""
+        return float(self.fill_prices(np.array([side]), np.array([ts_ns]), np.array([high]),
+                                      np.array([low]), np.array([close]),
+                                      None if ref is None else np.array([ref]))[0])
+
+    def round_trip_returns(self, side, entry, exit):
+        """
+        往復リターン（BUY: 出口/入口-1、SELL: 入口/出口-1）
+        entry / exit は (ts_ns, high, low, close) のタプル（各要素は配列）
+        """
+        side = np.asarray(side)
+        opp = np.where(side == BUY, SELL, BUY)
+        px_in = self.fill_prices(side, *entry)
+        px_out = self.fill_prices(opp, *exit)
+        return np.where(side == BUY, px_out / px_in - 1.0, px_in / px_out - 1.0)
+
+# ---------- コスト感度（パラメータ集合 × トレード一覧を一発で） ----------
+def cost_sensitivity(side, close_in, close_out, spread_pips, slip_pips=0.0):
+    """
+    spread_pips / slip_pips: 形状 (P,) のパラメータ集合（スカラーも可）
+    戻り値: 形状 (P, N) の往復リターン
+    """
+    side = np.asarray(side)[None, :]
+    c0 = np.asarray(close_in, dtype="float64")[None, :]
+    c1 = np.asarray(close_out, dtype="float64")[None, :]
+    half = (np.atleast_1d(np.asarray(spread_pips, dtype="float64")) / 2.0
+            + np.atleast_1d(np.asarray(slip_pips, dtype="float64")))[:, None] * PIP
+    buy = side == BUY
+    r_buy = (c1 - half) / (c0 + half) - 1.0
+    r_sell = (c0 - half) / (c1 + half) - 1.0
+    return np.where(buy, r_buy, r_sell)
+
+# ---------- バー参照 ----------
+def bars_at(bars, ts_ns):
+    """
+    bars: DatetimeIndex付きの OHLC DataFrame
+    ts_ns の各時刻を含む足（時刻以前で最後の足）の (ts_ns, high, low, close) を返す
+    """
+    bar_ts = bars.index.asi8 if bars.index.tz is None else bars.index.tz_convert("UTC").asi8
+    i = np.clip(np.searchsorted(bar_ts, np.asarray(ts_ns, dtype="int64"), side="right") - 1, 0, len(bar_ts) - 1)
+    return (np.asarray(ts_ns, dtype="int64"),
+            bars["High"].to_numpy(dtype="float64")[i],
+            bars["Low"].to_numpy(dtype="float64")[i],
+            bars["Close"].to_numpy(dtype="float64")[i])
+
+def reprice_journal(journal_df, bars, sim: FillSimulator):
+    """
+    約定ジャーナル（journal.load_journal の戻り）をスプレッド/スリッページ込みで再評価
+    戻り値: 決済1回ごとの DataFrame（sid, datetime, side, qty, avg_in, px_out, pnl, pnl_fill）
+    """
+    import pandas as pd
+    from journal import EXIT
+    j = journal_df.sort_values(["sid", "datetime"], kind="stable").reset_index(drop=True)
+    if j.empty:
+        return pd.DataFrame()
+    ts = ts_ns(j["datetime"])
+    _, hi, lo, _ = bars_at(bars, ts)
+    side = j["side"].to_numpy()
+    is_exit = j["kind"].to_numpy() == EXIT
+    # 入口は保有方向、出口は反対方向で約定
+    fill_side = np.where(is_exit, np.where(side == BUY, SELL, BUY), side)
+    px = sim.fill_prices(fill_side, ts, hi, lo, j["price"].to_numpy(dtype="float64"))
+    # 往復ごとの番号（決済の次の行から新しい往復）
+    exit_before = np.r_[0, np.cumsum(is_exit)[:-1]]
+    trip = pd.Series(exit_before).groupby(j["sid"].to_numpy()).transform(lambda s: s - s.iloc[0]).to_numpy()
+    qty = j["qty"].to_numpy(dtype="float64")
+    w = pd.DataFrame({"sid": j["sid"], "trip": trip,
+                      "q_in": np.where(is_exit, 0.0, qty),
+                      "v_in": np.where(is_exit, 0.0, qty * px)})
+    agg = w.groupby(["sid", "trip"]).sum()
+    ex = j[is_exit].assign(trip=trip[is_exit], px_out=px[is_exit]).set_index(["sid", "trip"])
+    ex = ex.join(agg, how="left")
+    avg_in = ex["v_in"] / ex["q_in"]
+    sign = np.where(ex["side"].to_numpy() == BUY, 1.0, -1.0)
+    out = pd.DataFrame({
+        "datetime": ex["datetime"].to_numpy(),
+        "side": ex["side"].to_numpy(),
+        "qty": ex["q_in"].to_numpy(),
+        "avg_in": avg_in.to_numpy(),
+        "px_out": ex["px_out"].to_numpy(),
+        "pnl": ex["pnl"].to_numpy(),
+        "pnl_fill": sign * (ex["px_out"].to_numpy() - avg_in.to_numpy()) * ex["q_in"].to_numpy(),
+    }, index=ex.index).reset_index()
+    return out
@@ -1,34 +1,184 @@
-# live_plot_yf.py
-import time, datetime as dt
-import yfinance as yf
+# gui.py
+# ライブチャート（main.py のバスを購読して、変わった線だけ blit で描き直す）
+#   - 確定足（bus.BAR）で 終値 / MA25・75・200 / ボリンジャー(±2σ・mid) を1本ずつ追加
+#   - 毎秒の価格（bus.PRICE）は今の値の点だけ動かす
+#   - Strategy の約定（bus.TRADE）をエントリー▲▼ / 決済× で重ねる
+#   線のバッファは WINDOW 本ぶん最初に確保。軸の範囲は余白つきで固定し、はみ出した時だけ全体を描き直す
+#   （背景を取り直す）。それ以外のフレームは背景を戻して線だけ描いて blit
+#   matplotlib はメインスレッドで動かすこと（main.py の main(chart=True) / python gui.py）
+import time
+from datetime import datetime
+import numpy as np
 import matplotlib.pyplot as plt
-from collections import deque
+import matplotlib.dates as mdates
+import bus as busmod
+from journal import ENTRY, EXIT
 
 PAIR   = "USDJPY=X"
-WINDOW = 180  # 表示する最新データ点数（180分）
-
-times, closes = deque(maxlen=WINDOW), deque(maxlen=WINDOW)
-plt.ion()
-fig, ax = plt.subplots()
-(line,) = ax.plot([], [])
-ax.set_title(f"{PAIR} last price (1m)")
-ax.set_xlabel("Time (JST)")
-ax.set_ylabel("Close")
-
-last_ts = None
-while True:
-    df   = yf.Ticker(PAIR).history(period="1d", interval="1m", auto_adjust=False)
-    last = df.tail(1)
-    ts   = last.index[-1].tz_convert("Asia/Tokyo").to_pydatetime()
-    px   = float(last["Close"].iloc[-1])
-
-    if ts != last_ts:
-        times.append(ts)
-        closes.append(px)
-        line.set_data(times, closes)
-        ax.relim(); ax.autoscale_view()
-        fig.autofmt_xdate()
-        plt.pause(0.01)  # 再描画
-        last_ts = ts
-
-    time.sleep(1)
+WINDOW = 180     # 表示する最新データ点数（180分）
+FPS    = 2       # 描き直しの最大回数/秒
+X_PAD  = 0.2     # 右側の余白（WINDOW の割合）。ここを使い切ったら軸をずらして全体を描き直す
+Y_PAD  = 0.1     # 上下の余白（表示中の値幅の割合）
+LINES = [        # (キー, ラベル, 書式)
+    ("close", "close", dict(lw=1.2, color="black")),
+    ("ma25", "MA25", dict(lw=1, color="tab:orange")),
+    ("ma75", "MA75", dict(lw=1, color="tab:blue")),
+    ("ma200", "MA200", dict(lw=1, color="tab:purple")),
+    ("upper_2", "BB+2σ", dict(lw=0.8, color="tab:green", ls="--")),
+    ("mid", "BB mid", dict(lw=0.8, color="tab:green", ls=":")),
+    ("lower_2", "BB-2σ", dict(lw=0.8, color="tab:green", ls="--")),
+]
+MARKS = [        # (キー, 書式)
+    ("buy", dict(marker="^", color="tab:red", ms=8, ls="none")),
+    ("sell", dict(marker="v", color="tab:blue", ms=8, ls="none")),
+    ("exit", dict(marker="x", color="black", ms=7, ls="none")),
+]
+
+def _x(t) -> float:
+    # 時刻（tz付き Timestamp / datetime / "YYYY-mm-dd HH:MM:SS"）→ matplotlib の日付数値（JST の見た目のまま）
+    if isinstance(t, str):
+        t = datetime.strptime(t, "%Y-%m-%d %H:%M:%S")
+    if getattr(t, "tzinfo", None) is not None:
+        t = t.replace(tzinfo=None)
+    return mdates.date2num(t)
+
+class LiveChart:
+    def __init__(self, bus: busmod.Bus, pair: str = PAIR, window: int = WINDOW, fps: float = FPS):
+        self.window = window
+        self.interval = 1.0 / fps
+        self.sub_bar = bus.subscribe(busmod.BAR, maxlen=window)
+        self.sub_px = bus.subscribe(busmod.PRICE, maxlen=8)
+        self.sub_tr = bus.subscribe(busmod.TRADE, maxlen=window)
+        # 先に確保しておくバッファ（n 本目まで有効）
+        self.n = 0
+        self.x = np.full(window, np.nan)
+        self.y = {k: np.full(window, np.nan) for k, _, _ in LINES}
+        self.marks = {k: ([], []) for k, _ in MARKS}
+        self.full_redraws = 0
+        self.blits = 0
+
+        self.fig, self.ax = plt.subplots()
+        self.ax.set_title(f"{pair} (1m)")
+        self.ax.set_xlabel("Time (JST)")
+        self.ax.set_ylabel("Close")
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+        # animated=True の線は背景に焼き込まれない（blit で毎回自分で描く）
+        self.lines = {k: self.ax.plot([], [], label=lab, animated=True, **kw)[0] for k, lab, kw in LINES}
+        self.mark_art = {k: self.ax.plot([], [], animated=True, **kw)[0] for k, kw in MARKS}
+        self.now = self.ax.plot([], [], "o", color="tab:red", ms=4, animated=True)[0]
+        self.ax.legend(loc="upper left", fontsize="small")
+        self.bg = None
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # ---- データ ----------------------------------------------------------------
+    def _push_bar(self, ts, price, ma, bb, rsi) -> None:
+        if self.n == self.window:
+            # 1本ずらす（window 本ぶんの memmove だけ。配列は作り直さない）
+            self.x[:-1] = self.x[1:]
+            for v in self.y.values():
+                v[:-1] = v[1:]
+            self.n -= 1
+        i = self.n
+        self.x[i] = _x(ts)
+        vals = {"close": price, "ma25": ma.get(25), "ma75": ma.get(75), "ma200": ma.get(200),
+                "upper_2": bb.get("upper_2"), "mid": bb.get("mid"), "lower_2": bb.get("lower_2")}
+        for k, v in self.y.items():
+            v[i] = np.nan if vals[k] is None else vals[k]
+        self.n += 1
+
+    def _push_trade(self, t: dict) -> None:
+        if t["kind"] == EXIT:
+            key = "exit"
+        elif t["kind"] == ENTRY:
+            key = "buy" if t["side"] == 1 else "sell"
+        else:
+            return  # 買い増しは出さない
+        xs, ys = self.marks[key]
+        xs.append(_x(t["time"])); ys.append(t["price"])
+
+    def poll(self) -> bool:
+        """バスから取り出して線に反映。何か変わったら True"""
+        bars, pxs, trades = self.sub_bar.drain(), self.sub_px.drain(), self.sub_tr.drain()
+        for b in bars:
+            self._push_bar(*b)
+        for t in trades:
+            self._push_trade(t)
+        if bars:
+            n = self.n
+            for k, line in self.lines.items():
+                line.set_data(self.x[:n], self.y[k][:n])
+        if trades or bars:
+            x0 = self.x[0] if self.n else -np.inf
+            for k, art in self.mark_art.items():
+                xs, ys = self.marks[k]
+                # 表示範囲から外れた印は捨てる
+                keep = [i for i, v in enumerate(xs) if v >= x0]
+                self.marks[k] = ([xs[i] for i in keep], [ys[i] for i in keep])
+                art.set_data(*self.marks[k])
+        if pxs:
+            ts, price = pxs[-1]
+            self.now.set_data([_x(ts)], [price])
+        return bool(bars or pxs or trades)
+
+    # ---- 描画 ------------------------------------------------------------------
+    def _on_draw(self, event) -> None:
+        # 全体を描いた直後に背景（軸・目盛り・凡例）を取っておく
+        self.bg = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self) -> None:
+        for a in (*self.lines.values(), *self.mark_art.values(), self.now):
+            self.ax.draw_artist(a)
+
+    def _limits_ok(self) -> bool:
+        """
+        今の軸の範囲に全部収まっていれば True。はみ出したら範囲を付け直して False
+        左端は古い足が落ちるだけなので見ない（右端か上下を越えた時だけ描き直し）
+        """
+        if self.n == 0:
+            return True
+        n = self.n
+        x0, x1 = self.x[0], self.x[n - 1]
+        nx, ny = self.now.get_data()
+        if len(nx):
+            x1 = max(x1, nx[0])
+        vals = np.concatenate([v[:n] for v in self.y.values()] + [np.asarray(ny, dtype=float)])
+        lo, hi = np.nanmin(vals), np.nanmax(vals)
+        (ax0, ax1), (ay0, ay1) = self.ax.get_xlim(), self.ax.get_ylim()
+        if ax0 <= x0 and x1 <= ax1 and ay0 <= lo and hi <= ay1:
+            return True
+        step = 1.0 / 1440  # 1分
+        self.ax.set_xlim(x0, max(x0 + self.window * step, x1) + self.window * X_PAD * step)
+        pad = max(hi - lo, 1e-6) * Y_PAD
+        self.ax.set_ylim(lo - pad, hi + pad)
+        return False
+
+    def render(self) -> None:
+        canvas = self.fig.canvas
+        ok = self._limits_ok()
+        if self.bg is None or not ok:
+            # 軸が変わる時だけ全体を描く（draw_event で背景を取り直す）
+            self.full_redraws += 1
+            canvas.draw()
+        else:
+            self.blits += 1
+            canvas.restore_region(self.bg)
+            self._draw_artists()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def run(self) -> None:
+        """メインスレッドで。ウィンドウを閉じるまで最大 FPS 回/秒"""
+        plt.show(block=False)
+        self.fig.canvas.draw()
+        while plt.fignum_exists(self.fig.number):
+            t0 = time.perf_counter()
+            if self.poll():
+                self.render()
+            # 描き直さずにイベント（ウィンドウ操作）だけ回す
+            self.fig.canvas.start_event_loop(max(self.interval - (time.perf_counter() - t0), 0.01))
+
+if __name__ == "__main__":
+    # main.py と同じ処理を、メインスレッドでチャートを回しながら動かす（取得は1回/秒のまま）
+    import main
+    main.main(chart=True)
@@ -0,0 +1,153 @@
+# httpview.py
+# ローカル HTTP（JSON / server-sent events）でライブのスナップショットを配る
+#   GET /snapshot … 今のスナップショット（JSON）。ETag=版数なので If-None-Match で 304
+#   GET /events   … 版数が変わるたびに "id: 版数 / data: JSON" を送り続ける（SSE）
+#   GET /metrics  … instrument の計測値（Prometheus テキスト形式）。/metrics.json は dict で
+#   GET /healthz  … "ok"
+#   シリアライズは版数ごとに1回だけ（見張りスレッドが作ってキャッシュ）。クライアントが何人いても同じ bytes を送る
+import json, math, threading, time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import instrument
+
+HOST = "127.0.0.1"   # 外には出さない
+PORT = 8765
+POLL_SEC = 0.25      # 版数を見に行く間隔
+HEARTBEAT_SEC = 15   # SSE の生存確認コメント（プロキシに切られないように）
+
+def _clean(x):
+    # JSON にできる形へ（Timestamp → ISO 文字列、NaN → null、numpy → Python、dict のキー → 文字列）
+    if isinstance(x, dict):
+        return {str(k): _clean(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_clean(v) for v in x]
+    if isinstance(x, (float, np.floating)):
+        return None if math.isnan(x) or math.isinf(x) else float(x)
+    if isinstance(x, np.integer):
+        return int(x)
+    if isinstance(x, datetime):
+        return x.isoformat()
+    return x
+
+def snapshot_dict(version: int, panels) -> dict:
+    """main.view_source() の戻り値 → JSON 用の dict"""
+    pairs = []
+    for pair, px, ma_snap, signal in panels:
+        d = {"pair": pair, "ts": None, "price": None}
+        if px:
+            d.update({"ts": px.ts, "price": px.price, "fetched_at": px.fetched_at, "seq": px.seq})
+        if ma_snap:
+            ts_ma, _, ma, bb, rsi, ml, tick = ma_snap
+            d.update({"bar_ts": ts_ma, "bar_seq": tick.seq, "ma": ma, "bb": bb, "rsi": rsi, "ml": ml})
+        if signal:
+            d.update({"ret": signal["ret"], "metrics": signal.get("metrics", {}), "trace": signal.get("trace")})
+        pairs.append(d)
+    return _clean({"version": version, "pairs": pairs})
+
+class SnapshotCache:
+    """
+    source() … (版数, panels) を返す関数（main.view_source）
+    見張りスレッドが版数の変化を見つけたら1回だけ JSON にして、待っている /events に知らせる
+    """
+    def __init__(self, source, poll_sec: float = POLL_SEC):
+        self.source = source
+        self.poll_sec = poll_sec
+        self.version = None
+        self.payload = b"{}"
+        self.encodes = 0
+        self.cond = threading.Condition()
+
+    def refresh(self) -> bool:
+        version, panels = self.source()
+        if version == self.version:
+            return False
+        body = json.dumps(snapshot_dict(version, panels), ensure_ascii=False, separators=(",", ":")).encode()
+        with self.cond:
+            self.version, self.payload = version, body
+            self.encodes += 1
+            self.cond.notify_all()
+        return True
+
+    def get(self):
+        with self.cond:
+            return self.version, self.payload
+
+    def wait_newer(self, version, timeout: float):
+        """version より新しい版が出るまで待つ（timeout で諦めて今の版を返す）"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != version, timeout)
+            return self.version, self.payload
+
+    def run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] httpview: スナップショット作成失敗: {e}")
+            time.sleep(self.poll_sec)
+
+class _Handler(BaseHTTPRequestHandler):
+    cache: SnapshotCache = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass  # アクセスログは出さない（表示を汚さない）
+
+    def _send(self, code, body=b"", ctype="application/json", headers=None):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/snapshot":
+            version, body = self.cache.get()
+            etag = f'"{version}"'
+            if self.headers.get("If-None-Match") == etag:
+                return self._send(304, headers={"ETag": etag})
+            return self._send(200, body, headers={"ETag": etag})
+        if path == "/events":
+            return self._events()
+        if path == "/metrics":
+            return self._send(200, instrument.render().encode(), "text/plain; version=0.0.4")
+        if path == "/metrics.json":
+            return self._send(200, json.dumps(_clean(instrument.snapshot())).encode())
+        if path == "/healthz":
+            return self._send(200, b"ok", "text/plain")
+        self._send(404, b'{"error":"not found"}')
+
+    def _events(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        sent = None
+        try:
+            while True:
+                version, body = self.cache.wait_newer(sent, HEARTBEAT_SEC)
+                if version == sent or version is None:
+                    self.wfile.write(b": ping\n\n")
+                else:
+                    self.wfile.write(b"id: %d\ndata: %s\n\n" % (version, body))
+                    sent = version
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # クライアントが切った
+
+def serve(source, host: str = HOST, port: int = PORT, poll_sec: float = POLL_SEC):
+    """見張りスレッドと HTTP サーバ（接続ごとにスレッド）を daemon で立てる。(server, cache) を返す"""
+    cache = SnapshotCache(source, poll_sec)
+    handler = type("SnapshotHandler", (_Handler,), {"cache": cache})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=cache.run, daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cache
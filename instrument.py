@@ -0,0 +1,169 @@
+# instrument.py
+# 計測（ヒストグラム / カウンタ / ゲージ）。print しないので常時ONでも軽い
+#   - Histogram … 固定バケット（秒）。observe は bisect 1回＋足し算だけ
+#   - Counter   … inc()
+#   - Gauge     … set() か、読む時に呼ぶ関数（set_fn）
+#   snapshot() で dict（API / HTTP の /metrics 用）、render() で Prometheus のテキスト形式
+#   start_exporter() で METRICS_PATH へ定期的に書き出す（node_exporter の textfile collector で拾える）
+#   1つのメトリクスに書くのは基本1スレッド（各タスク）なのでロックは取らない
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from statelog import atomic_write_text
+
+PREFIX = "fx_"
+METRICS_PATH = "metrics.prom"
+EXPORT_SEC = 15.0
+# 10µs 〜 10s（1-2.5-5 刻み）。fetch は数百ms、indicators は数十µs なので両方に足りる幅
+BUCKETS = tuple(m * 10.0 ** e for e in range(-5, 1) for m in (1, 2.5, 5)) + (10.0,)
+
+class Histogram:
+    def __init__(self, name: str, help: str = "", buckets=BUCKETS):
+        self.name, self.help = name, help
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, sec: float) -> None:
+        self.counts[bisect_left(self.bounds, sec)] += 1
+        self.sum += sec
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0)
+
+    def quantile(self, q: float):
+        """バケット内は線形とみなした推定値（秒）。件数0なら None"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            if c and acc + c >= rank:
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lo + (hi - lo) * (rank - acc) / c
+            acc += c
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": self.sum,
+                "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99)}
+
+    def render(self) -> list:
+        out = [f"# HELP {PREFIX}{self.name}_seconds {self.help}", f"# TYPE {PREFIX}{self.name}_seconds histogram"]
+        acc = 0
+        for b, c in zip(self.bounds, self.counts):
+            acc += c
+            out.append(f'{PREFIX}{self.name}_seconds_bucket{{le="{b:g}"}} {acc}')
+        out.append(f'{PREFIX}{self.name}_seconds_bucket{{le="+Inf"}} {self.count}')
+        out.append(f"{PREFIX}{self.name}_seconds_sum {self.sum:.9g}")
+        out.append(f"{PREFIX}{self.name}_seconds_count {self.count}")
+        return out
+
+class Counter:
+    def __init__(self, name: str, help: str = ""):
+        self.name, self.help = name, help
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+    def snapshot(self):
+        return self.value
+
+    def render(self) -> list:
+        return [f"# HELP {PREFIX}{self.name}_total {self.help}", f"# TYPE {PREFIX}{self.name}_total counter",
+                f"{PREFIX}{self.name}_total {self.value}"]
+
+class Gauge:
+    def __init__(self, name: str, help: str = ""):
+        self.name, self.help = name, help
+        self.value = float("nan")
+        self.fn = None
+
+    def set(self, v: float) -> None:
+        self.value = v
+
+    def set_fn(self, fn) -> "Gauge":
+        # 読む時（snapshot / render）に呼ぶ。書き手の負担ゼロで済むもの（キュー長・経過秒など）
+        self.fn = fn
+        return self
+
+    def get(self) -> float:
+        if self.fn is None:
+            return self.value
+        try:
+            v = self.fn()
+            return float("nan") if v is None else float(v)
+        except Exception:
+            return float("nan")
+
+    def snapshot(self):
+        v = self.get()
+        return None if v != v else v
+
+    def render(self) -> list:
+        return [f"# HELP {PREFIX}{self.name} {self.help}", f"# TYPE {PREFIX}{self.name} gauge",
+                f"{PREFIX}{self.name} {self.get():.9g}"]
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics: dict = {}
+
+    def _get(self, cls, name, help, **kw):
+        m = self.metrics.get(name)
+        if m is None:
+            with self._lock:
+                m = self.metrics.setdefault(name, cls(name, help, **kw))
+        return m
+
+    def histogram(self, name: str, help: str = "", **kw) -> Histogram:
+        return self._get(Histogram, name, help, **kw)
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def snapshot(self) -> dict:
+        return {n: m.snapshot() for n, m in list(self.metrics.items())}
+
+    def render(self) -> str:
+        lines = []
+        for m in list(self.metrics.values()):
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str = METRICS_PATH) -> None:
+        atomic_write_text(path, self.render())
+
+    def start_exporter(self, path: str = METRICS_PATH, every_sec: float = EXPORT_SEC) -> threading.Thread:
+        def loop():
+            while True:
+                time.sleep(every_sec)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"[WARN] metrics 書き出し失敗: {path} ({e})")
+        t = threading.Thread(target=loop, daemon=True)
+        t.start()
+        return t
+
+# プロセスで1つの既定レジストリ（モジュール関数はここへ）
+REGISTRY = Registry()
+histogram = REGISTRY.histogram
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+snapshot = REGISTRY.snapshot
+render = REGISTRY.render
+start_exporter = REGISTRY.start_exporter
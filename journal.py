@@ -0,0 +1,125 @@
+# journal.py
+import os, struct, threading, queue
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+# 種別
+ENTRY = 1  # 新規
+SCALE = 2  # 買い増し/売り増し
+EXIT  = 3  # 決済
+
+JST = timezone(timedelta(hours=9))
+TIME_FMT = "%Y-%m-%d %H:%M:%S"
+
+# 固定長レコード（36byte）
+#   ts_ns:int64 / sid:uint8 / kind:uint8 / side:uint8 / pad / qty:int32 / pos:int32 / price:f64 / pnl:f64
+MAGIC = b"TJRNL01\n"
+REC = struct.Struct("<qBBBxiidd")
+
+def record_dtype():
+    """numpy で読むときの dtype（REC と同じ並び）"""
+    import numpy as np
+    return np.dtype([("ts", "<i8"), ("sid", "u1"), ("kind", "u1"), ("side", "u1"), ("_pad", "u1"),
+                     ("qty", "<i4"), ("pos", "<i4"), ("price", "<f8"), ("pnl", "<f8")])
+
+class TradeJournal:
+    """
+    約定ジャーナル（追記専用）
+      - record() … 戦略スレッドから呼ぶ。キューに積むだけなのでディスク待ちしない
+      - 書き込みは専用スレッドがまとめて（バッチで）バイナリファイルへ追記
+      - close()  … 残りを書き切ってスレッド終了
+    """
+    def __init__(self, path: str = "trades_journal.bin", flush_sec: float = 1.0, batch: int = 256, tz=JST):
+        self.path = path
+        self.flush_sec = flush_sec
+        self.batch = batch
+        self.tz = tz
+        self._q: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+
+    def start(self) -> "TradeJournal":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+            self._thread.start()
+        return self
+
+    # ---- 戦略スレッド側：積むだけ ---------------------------------------------
+    def record(self, time: str, sid: int, kind: int, side: int, qty: int, pos: int, price: float, pnl: float = 0.0) -> None:
+        self._q.put((time, sid, kind, side, qty, pos, price, pnl))
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is None:
+            return
+        self._q.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---- 書き込みスレッド -----------------------------------------------------
+    def _pack(self, item) -> bytes:
+        time, sid, kind, side, qty, pos, price, pnl = item
+        dt = datetime.strptime(time, TIME_FMT).replace(tzinfo=self.tz)
+        ts_ns = int(dt.timestamp()) * 1_000_000_000
+        return REC.pack(ts_ns, sid, kind, side, int(qty), int(pos), float(price), float(pnl))
+
+    def _run(self):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "ab") as f:
+            if new_file:
+                f.write(MAGIC); f.flush()
+            stop = False
+            while not stop:
+                try:
+                    item = self._q.get(timeout=self.flush_sec)
+                except queue.Empty:
+                    continue
+                buf = []
+                while True:
+                    if item is None:
+                        stop = True
+                        break
+                    try:
+                        buf.append(self._pack(item))
+                    except Exception as e:
+                        print(f"[WARN] ジャーナル変換に失敗: {e}")
+                    if len(buf) >= self.batch:
+                        break
+                    try:
+                        item = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                if buf:
+                    f.write(b"".join(buf)); f.flush()
+                    self.written += len(buf)
+
+# ---------- 読み出し（分析用） ----------
+def read_journal(path: str = "trades_journal.bin", mmap: bool = False):
+    """
+    numpy の構造化配列で返す（ゼロコピーに近い読み込み）
+    mmap=True ならメモリに載せずに np.memmap（何か月分あってもスライスして少しずつ読める）
+    """
+    import numpy as np
+    dt = record_dtype()
+    if not os.path.exists(path) or os.path.getsize(path) < len(MAGIC):
+        return np.empty(0, dtype=dt)
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"ジャーナル形式が違います: {path}")
+    n = (os.path.getsize(path) - len(MAGIC)) // dt.itemsize  # 書きかけの端数は無視
+    if n == 0:
+        return np.empty(0, dtype=dt)
+    if mmap:
+        return np.memmap(path, dtype=dt, mode="r", offset=len(MAGIC), shape=(n,))
+    return np.fromfile(path, dtype=dt, count=n, offset=len(MAGIC))
+
+def load_journal(path: str = "trades_journal.bin"):
+    """pandas.DataFrame で返す（datetime は UTC、jst 列付き）"""
+    import pandas as pd
+    arr = read_journal(path)
+    df = pd.DataFrame({k: arr[k] for k in ("sid", "kind", "side", "qty", "pos", "price", "pnl")})
+    df.insert(0, "datetime", pd.to_datetime(arr["ts"], utc=True))
+    df["jst"] = df["datetime"].dt.tz_convert("Asia/Tokyo")
+    return df
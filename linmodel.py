@@ -0,0 +1,139 @@
+# linmodel.py
+# 推論専用の軽量モデル（numpy だけで動く。pandas / sklearn は不要）
+#   学習済みモデル（ai_meta.pkl の中身）の標準化を線形重みに畳み込み、
+#   z = x·w + b → sigmoid の1回の内積で p_up を出す
+#   ★複数ホライズン：W (H, F) の行列1回で全ホライズンの p_up をまとめて出す（行0が主ヘッド）
+import os, math
+import numpy as np
+
+MODEL_NPZ = "ai_meta.npz"
+# 予測の決まりごと（学習・ライブ・main.py の ML枠・採点・検証で共通。値はここだけで持つ）
+HORIZON = 5                 # 主ヘッドのホライズン（分）。何分先で上がったか
+BUY_TH = 0.58               # p_up がこれ以上で BUY、1 - BUY_TH 以下で SELL
+ROUND_TRIP_COST_PIPS = 0.6  # 往復コスト（ざっくり）。JPYペアの1pip=0.01
+
+def decide(p_up: float, buy_th: float = BUY_TH) -> str:
+    # p_up → BUY / SELL / HOLD
+    return "BUY" if p_up >= buy_th else ("SELL" if p_up <= 1 - buy_th else "HOLD")
+
+def fold_meta(model):
+    """
+    {"mu","sd","cols", "type", "clf"/"w"} → (cols, w, b)
+    ((x-mu)/sd)·coef + b0 = x·(coef/sd) + (b0 - Σ coef*mu/sd)
+    """
+    cols = list(model["cols"])
+    mu = np.asarray(model["mu"][cols], dtype="float64")
+    sd = np.asarray(model["sd"][cols], dtype="float64")
+    if model["type"] == "sk":
+        coef = np.asarray(model["clf"].coef_, dtype="float64").ravel()
+        b0 = float(np.asarray(model["clf"].intercept_).ravel()[0])
+    else:
+        coef = np.asarray(model["w"], dtype="float64")
+        b0 = 0.0
+    w = coef / sd
+    b = b0 - float(np.sum(coef * mu / sd))
+    return cols, w, b
+
+def fold_heads(model):
+    """
+    主ヘッド＋ model["heads"]（{horizon: 学習済み dict}）→ (cols, W, B, horizons)
+    行0が主ヘッド（model["horizon"]）、残りはホライズン順。古い pkl（heads 無し）は1行だけ
+    """
+    cols, w, b = fold_meta(model)
+    W, B, hs = [w], [b], [int(model.get("horizon", 0))]
+    for h, sub in sorted((model.get("heads") or {}).items()):
+        m = LinearModel(*fold_meta(sub)).reorder(cols)
+        W.append(m.w); B.append(m.b); hs.append(int(h))
+    return cols, np.vstack(W), np.array(B), hs
+
+def export_npz(model, path: str = MODEL_NPZ) -> str:
+    """学習済み dict を .npz に書き出す（一時ファイル → rename）"""
+    return LinearModel.from_meta(model).save(path)
+
+class LinearModel:
+    """
+    p_up = 1 / (1 + exp(-(x·w + b)))
+    x は cols の順（features.FEATURE_COLS と同じ並び）の float 配列
+    W (H, F), B (H,) … ホライズンごとのヘッド。w, b は主ヘッド（行0）
+    horizons … 各行のホライズン（分）。不明なら 0
+    """
+    __slots__ = ("cols", "W", "B", "horizons")
+
+    def __init__(self, cols, w, b, horizons=None):
+        self.cols = list(cols)
+        self.W = np.ascontiguousarray(np.atleast_2d(np.asarray(w, dtype="float64")))
+        self.B = np.atleast_1d(np.asarray(b, dtype="float64")).copy()
+        if horizons is None:
+            horizons = [0] * len(self.B)
+        self.horizons = tuple(int(h) for h in horizons)
+        if self.W.shape[0] != len(self.B) or len(self.horizons) != len(self.B):
+            raise ValueError(f"ヘッド数が合いません: W={self.W.shape} B={self.B.shape} horizons={self.horizons}")
+
+    @property
+    def w(self):
+        return self.W[0]
+
+    @property
+    def b(self) -> float:
+        return float(self.B[0])
+
+    @classmethod
+    def load(cls, path: str = MODEL_NPZ, cols=None) -> "LinearModel":
+        with np.load(path, allow_pickle=False) as z:
+            hs = z["horizons"] if "horizons" in z.files else None  # 古い .npz は1ヘッドだけ
+            m = cls([str(c) for c in z["cols"]], z["w"], z["b"], hs)
+        return m.reorder(cols) if cols is not None else m
+
+    @classmethod
+    def from_meta(cls, model, cols=None) -> "LinearModel":
+        m = cls(*fold_heads(model))
+        return m.reorder(cols) if cols is not None else m
+
+    def save(self, path: str = MODEL_NPZ) -> str:
+        """.npz に書き出す（一時ファイル → rename）"""
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, cols=np.array(self.cols), w=self.W, b=self.B,
+                 horizons=np.array(self.horizons, dtype="int64"))
+        os.replace(tmp, path)
+        return path
+
+    def with_primary(self, m: "LinearModel") -> "LinearModel":
+        """主ヘッドだけ m（1ヘッド）に差し替えたコピー（オンライン学習の保存用）"""
+        m = m.reorder(self.cols)
+        W = self.W.copy(); B = self.B.copy()
+        W[0] = m.w; B[0] = m.b
+        return LinearModel(self.cols, W, B, self.horizons)
+
+    def reorder(self, cols) -> "LinearModel":
+        """特徴量の並びを cols に合わせる（列の集合が違えば KeyError。余った列を黙って捨てると予測が変わる）"""
+        cols = list(cols)
+        if cols == self.cols:
+            return self
+        pos = {c: i for i, c in enumerate(self.cols)}
+        if set(cols) != set(self.cols) or len(cols) != len(self.cols):
+            missing = [c for c in cols if c not in pos]
+            extra = [c for c in self.cols if c not in set(cols)]
+            raise KeyError(f"特徴量が合いません: モデルに無い={missing} 入力に無い={extra}")
+        return LinearModel(cols, self.W[:, [pos[c] for c in cols]], self.B, self.horizons)
+
+    def predict_proba(self, x) -> float:
+        z = float(np.dot(self.w, np.asarray(x, dtype="float64"))) + self.b
+        # exp のオーバーフロー回避
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def predict_proba_batch(self, X):
+        z = np.asarray(X, dtype="float64") @ self.w + self.b
+        return 0.5 * (1.0 + np.tanh(0.5 * z))  # = sigmoid(z)、オーバーフローしない
+
+    def predict_all(self, x):
+        """全ヘッドの p_up（horizons の順）。行列1回"""
+        z = self.W @ np.asarray(x, dtype="float64") + self.B
+        return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+    def predict_all_batch(self, X):
+        """(n, F) → (n, H)"""
+        z = np.asarray(X, dtype="float64") @ self.W.T + self.B
+        return 0.5 * (1.0 + np.tanh(0.5 * z))
@@ -0,0 +1,145 @@
+# live_metrics.py
+# ライブ用の成績メーター（1件ごとに O(1) 更新、ログの読み直しなし）
+#   - RollingStats       … 直近N件の勝率 / 平均 / 標準偏差 / Sharpe風、通算の資産曲線とドローダウン
+#   - RollingCalibration … 直近N件の proba_up をビンに分けた実際の上昇率、logloss / Brier
+#   - PredictionTracker  … 予測を HORIZON 分ためておき、答えが出たら上の2つへ流す（ai_yf_live 用）
+import math
+from bisect import bisect_left
+from collections import deque
+from fill import PIP
+
+class RollingStats:
+    """
+    push(x) … 決済1回ぶんの損益（金額でもリターンでもよい）
+    窓から落ちる値を引き、入る値を足すだけなので1件 O(1)
+    """
+    def __init__(self, window: int = 100):
+        self.window = window
+        self.buf: deque = deque()
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.wins = 0
+        self.total = 0        # 通算件数
+        self.equity = 0.0     # 通算の累積
+        self.peak = 0.0
+        self.max_dd = 0.0
+
+    def push(self, x: float) -> None:
+        x = float(x)
+        if len(self.buf) == self.window:
+            old = self.buf.popleft()
+            self.sum -= old
+            self.sumsq -= old * old
+            self.wins -= old > 0
+        self.buf.append(x)
+        self.sum += x
+        self.sumsq += x * x
+        self.wins += x > 0
+        self.total += 1
+        self.equity += x
+        self.peak = max(self.peak, self.equity)
+        self.max_dd = max(self.max_dd, self.peak - self.equity)
+
+    def snapshot(self) -> dict:
+        n = len(self.buf)
+        mean = self.sum / n if n else None
+        std = None
+        if n > 1:
+            var = max(self.sumsq - n * mean * mean, 0.0) / (n - 1)
+            std = math.sqrt(var)
+        return {
+            "n": n,
+            "total": self.total,
+            "win_rate": self.wins / n if n else None,
+            "mean": mean,
+            "std": std,
+            "sharpe_like": mean / std * math.sqrt(60) if std else None,  # analyze_live_pred.py と同じ近似
+            "equity": self.equity,
+            "drawdown": self.peak - self.equity,
+            "max_drawdown": self.max_dd,
+        }
+
+class RollingCalibration:
+    """
+    push(p, y) … 予測確率 p と答え y（1=上がった / 0=下がった）
+    ビンは analyze_live_pred.py の calibration.csv と同じ10等分（右閉じ）
+    """
+    def __init__(self, window: int = 1440, bins: int = 10):
+        self.window = window
+        self.bins = bins
+        self.edges = [k / bins for k in range(bins + 1)]
+        self.buf: deque = deque()
+        self.n = [0] * bins
+        self.sum_p = [0.0] * bins
+        self.sum_y = [0.0] * bins
+        self.ll = 0.0
+        self.brier = 0.0
+
+    def _bin(self, p: float) -> int:
+        return min(max(bisect_left(self.edges, p) - 1, 0), self.bins - 1)
+
+    @staticmethod
+    def _loss(p: float, y: float):
+        pc = min(max(p, 1e-12), 1 - 1e-12)
+        return -(y * math.log(pc) + (1 - y) * math.log(1 - pc)), (p - y) ** 2
+
+    def push(self, p: float, y: float) -> None:
+        if len(self.buf) == self.window:
+            k, op, oy, oll, obr = self.buf.popleft()
+            self.n[k] -= 1; self.sum_p[k] -= op; self.sum_y[k] -= oy
+            self.ll -= oll; self.brier -= obr
+        k = self._bin(p)
+        ll, br = self._loss(p, y)
+        self.buf.append((k, p, y, ll, br))
+        self.n[k] += 1; self.sum_p[k] += p; self.sum_y[k] += y
+        self.ll += ll; self.brier += br
+
+    def snapshot(self) -> dict:
+        m = len(self.buf)
+        return {
+            "n": m,
+            "logloss": self.ll / m if m else None,
+            "brier": self.brier / m if m else None,
+            "bins": [{"lo": k / self.bins, "hi": (k + 1) / self.bins, "n": self.n[k],
+                      "mean_p": self.sum_p[k] / self.n[k] if self.n[k] else None,
+                      "rate_up": self.sum_y[k] / self.n[k] if self.n[k] else None}
+                     for k in range(self.bins)],
+        }
+
+class PredictionTracker:
+    """
+    predict(ts_ns, close, p_up, signal) … 出した予測を積む
+    bar(ts_ns, close)                    … 確定足1本。HORIZON 分たった予測を答え合わせして成績へ
+      同値（上がりも下がりもしない）は analyze_live_pred.py と同じく校正からは外し、トレードは外れ扱い
+    """
+    def __init__(self, horizon_min: int = 5, cost_pips: float = 0.0, window: int = 100, cal_window: int = 1440):
+        self.horizon_ns = int(horizon_min) * 60_000_000_000
+        self.cost = cost_pips * PIP
+        self.pending: deque = deque()
+        self.trades = RollingStats(window)
+        self.calib = RollingCalibration(cal_window)
+        self.hits = RollingStats(window)  # 1=命中 / 0=外れ の平均で命中率
+
+    def predict(self, ts_ns: int, close: float, p_up: float, signal: str) -> None:
+        if self.pending and ts_ns <= self.pending[-1][0]:
+            return
+        self.pending.append((int(ts_ns), float(close), float(p_up), signal))
+
+    def bar(self, ts_ns: int, close: float) -> int:
+        done = 0
+        while self.pending and self.pending[0][0] + self.horizon_ns <= ts_ns:
+            t0, c0, p, sig = self.pending.popleft()
+            if close != c0:
+                self.calib.push(p, 1.0 if close > c0 else 0.0)
+            if sig in ("BUY", "SELL"):
+                d = 1.0 if sig == "BUY" else -1.0
+                # BUY は高く・SELL は安く約定（往復でスプレッド1回分）
+                self.trades.push(d * (close - c0) / c0 - self.cost / c0)
+                self.hits.push(1.0 if d * (close - c0) > 0 else 0.0)
+            done += 1
+        return done
+
+    def snapshot(self) -> dict:
+        t = self.trades.snapshot()
+        t["hit_rate"] = self.hits.snapshot()["mean"]
+        return {"pending": len(self.pending), "trades": t, "calibration": self.calib.snapshot()}
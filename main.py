@@ -1,67 +1,142 @@
 import threading
 import time
 import os
+import multiprocessing as mp
 from datetime import datetime
-from fetcher import PriceFetcher
+import numpy as np
+import pandas as pd
+from fetcher import PriceFetcher, Tick
 from average import MovingAverage
 from strategy import Strategy
-from decimal import Decimal, ROUND_DOWN
 from bb import BollingerBands
 from rsi import RSI
+from journal import TradeJournal
+from statelog import StateLog
+from features import IndicatorFeatures, FEATURE_COLS
+from linmodel import LinearModel, HORIZON, decide
+from dashboard import Dashboard
+import bus as busmod
+import httpview
+import instrument as ins
+import profhooks
+from shmring import ShmRing, TICK_DTYPE, ML_DTYPE, MAX_HEADS, HIST, LIVE
 
 # === 設定 ===
 WINDOWS = [25, 75, 200]
 PAIR = "USDJPY=X"
 INTERVAL = "1m"
 HISTORY_PERIOD = "7d"
-DEBUG = False # パフォーマンステスト用
+METRICS_PATH = "metrics.prom"        # 計測値（Prometheus テキスト形式）。None で書き出さない
+METRICS_EVERY_SEC = 15               # その書き出し間隔
+MULTIPROC = False                    # True: 価格取得と ML 推論を別プロセスに（共有メモリのリングで受け渡し、GIL を取り合わない）
+RING_CAP = 1 << 15                   # 価格リングの件数（起動時の履歴 7日≒1万本＋ライブ分）
+PROF_PORT = 8766                     # 計測の受け付け（python profhooks.py profile 30 --port 8766）。None でソケットなし
+JOURNAL_PATH = "trades_journal.bin"  # 約定ジャーナル（追記専用）
+STATE_PATH = "strategy_state.json"   # 状態スナップショット
+WAL_PATH = "strategy_state.wal"      # 状態の先行書き込みログ
+ML_MODEL = "ai_meta.npz"   # ai_yf_live.py が書く推論用モデル（無ければ ML枠=ret3 はお休み）
+CHART = False              # True でメインスレッドにライブチャート（gui.LiveChart）を出す
+HTTP_PORT = 8765           # スナップショットの HTTP/SSE（127.0.0.1 のみ）。None で立てない
+VIEW_FPS = 2               # 表示の最大フレーム数/秒（変化が無ければ描かない）
+
+ONE_MIN = pd.Timedelta(minutes=1)
 
 # === 共有 ===
-latest_price = None          # (ts, price)
-latest_ma_snap = None        # (ts, price, {w: ma})
-latest_signal = None         # dict
+latest_price = None          # Tick(ts, price, fetched_at, seq)
+latest_ma_snap = None        # (ts, price, {w: ma}, bb, rsi, ml, tick)  ml は ML枠の予測（無ければ None）、tick はこの足を作った Tick
+latest_ml = None             # ML枠の最新の予測 dict（スレッド版は run_ma_task、MULTIPROC は ML プロセスから）
+latest_signal = None         # dict（Strategy.generate の戻り値＋"trace"：どの Tick から作ったか）
+snap_version = 0             # 上の3つのどれかを書き換えるたびに +1（表示側はこれで変化を知る）
 lock = threading.Lock()
+bus = busmod.Bus()           # 価格 / 確定足 / 約定の配信（チャートなどが購読）
+
+# === 計測（常時ON。print はしない。metrics.prom / http の /metrics で見る） ===
+H_FETCH = ins.histogram("fetch", "価格取得 fetcher.update() の所要秒")
+H_INDICATORS = ins.histogram("indicator_update", "MA/BB/RSI/特徴量の更新（分の切り替わり時）")
+H_ML = ins.histogram("ml_inference", "ML枠の全ホライズン推論")
+H_STRATEGY = ins.histogram("strategy_generate", "Strategy.generate()")
+H_RENDER = ins.histogram("render", "ダッシュボード1フレーム（描いた時だけ）")
+# tick → signal の区間ごとの遅れ（秒）。どこで時間を食っているかを見る
+H_BAR_TO_FETCH = ins.histogram("hop_bar_to_fetch", "足の時刻 → 取得完了（1分足なので最大60秒＋取得遅れ）")
+H_FETCH_TO_IND = ins.histogram("hop_fetch_to_indicator", "取得完了 → インジケータ更新完了")
+H_FETCH_TO_SIG = ins.histogram("hop_fetch_to_signal", "取得完了 → シグナル確定")
+H_SIG_TO_RENDER = ins.histogram("hop_signal_to_render", "シグナル確定 → 画面に出た")
+H_TICK_TO_SIG = ins.histogram("tick_to_signal", "足の時刻 → シグナル確定（合計）")
+C_FETCH_FAIL = ins.counter("fetch_failures", "価格取得の失敗回数")
+C_SKIPPED_MIN = ins.counter("skipped_minutes", "インジケータ更新で飛んだ分の数")
 
 # === タスク1: 価格取得（毎秒） ===
 def run_price_task(fetcher: PriceFetcher, sleep_sec=1):
-    global latest_price
+    global latest_price, snap_version
+    seq = 0
     while True:
-        if DEBUG:
-            start = time.perf_counter()   # ← 計測開始
-
-        ts, price = fetcher.update()
+        try:
+            with H_FETCH.time():
+                ts, price = fetcher.update()
+        except Exception:
+            # 取れなかった秒は飛ばす（スレッドは止めない）
+            C_FETCH_FAIL.inc()
+            time.sleep(sleep_sec); continue
+        seq += 1
+        tick = Tick(ts, price, time.time(), seq)
+        H_BAR_TO_FETCH.observe(tick.fetched_at - ts.timestamp())
         with lock:
-            latest_price = (ts, price)
+            # Tick は毎回差し替え（取得時刻を新しく）。表示の版数は値が変わった時だけ
+            changed = latest_price is None or latest_price[:2] != (ts, price)
+            latest_price = tick
+            if changed:
+                snap_version += 1
+        bus.publish(busmod.PRICE, (ts, price))
         # print(f"[価格] {ts}  {price:.3f}")
-
-        if DEBUG:
-            end = time.perf_counter()   # ← 計測終了
-            print(f"[task1] 計算時間: {(end - start)*1000:.3f} ms")
-
         time.sleep(sleep_sec)
 
 # === タスク2:インジケータ（分が切り替わったらだけ更新） ===
-def run_ma_task(mas: dict[int, MovingAverage], bb: BollingerBands, rsi: RSI, poll_sec=1):
-    global latest_price, latest_ma_snap
+def ml_snapshot(cur_min, probs, horizons) -> dict:
+    # ML枠（ret3）に渡す形。probs は horizons の順で先頭が主ヘッド（スレッド版・プロセス版で共通）
+    p_up = float(probs[0])
+    return {
+        "minute": cur_min.strftime("%Y-%m-%d %H:%M"),
+        "p_up": p_up,
+        "signal": decide(p_up),
+        "hold_min": horizons[0] or HORIZON,  # ホライズンの入っていない古い .npz は主ヘッド扱い
+        "probs": {h: float(p) for h, p in zip(horizons, probs) if h},
+    }
+
+def run_ma_task(mas: dict[int, MovingAverage], bb: BollingerBands, rsi: RSI,
+                feats: IndicatorFeatures = None, model: LinearModel = None, poll_sec=1):
+    global latest_price, latest_ma_snap, latest_ml, snap_version
     last_min = None
     while True:
-        if DEBUG:
-            start = time.perf_counter()   # ← 計測開始
-
         with lock:
             data = latest_price
         if data is None:
             time.sleep(poll_sec); continue
 
-        ts, price = data
+        ts, price = data.ts, data.price
         cur_min = ts.replace(second=0, microsecond=0)
         if cur_min != last_min:
+            if last_min is not None and cur_min - last_min > ONE_MIN:
+                C_SKIPPED_MIN.inc(int((cur_min - last_min) / ONE_MIN) - 1)
+            t0 = time.perf_counter()
             ma_vals = {w: ma.update(price) for w, ma in mas.items()}
             bb_vals = bb.update(price)
             rsi_val = rsi.update(price)
-
+            row = feats.update(ts, price) if feats is not None else None
+            H_INDICATORS.observe(time.perf_counter() - t0)
+
+            # ★ML枠：同じ足で特徴量を作って、全ホライズンを1回で推論
+            if model is not None and row is not None:
+                with H_ML.time():
+                    probs = model.predict_all(row)
+                ml = ml_snapshot(cur_min, probs, model.horizons)
+                with lock:
+                    latest_ml = ml
+
+            H_FETCH_TO_IND.observe(time.time() - data.fetched_at)
             with lock:
-                latest_ma_snap = (ts, price, ma_vals,bb_vals,rsi_val)
+                latest_ma_snap = (ts, price, ma_vals,bb_vals,rsi_val,latest_ml,data)
+                snap_version += 1
+            bus.publish(busmod.BAR, (ts, price, ma_vals, bb_vals, rsi_val))
             # ログ
             parts = []
             for w in sorted(mas.keys()):
@@ -69,34 +144,146 @@ def run_ma_task(mas: dict[int, MovingAverage], bb: BollingerBands, rsi: RSI, pol
                 parts.append(f"MA({w})={v:.3f}" if v is not None else f"MA({w})=nan")
             # print(f"[移動平均] {ts}  " + "  ".join(parts))
             last_min = cur_min
+        time.sleep(poll_sec)
 
-        if DEBUG:
-            end = time.perf_counter()   # ← 計測終了
-            print(f"[task2] 計算時間: {(end - start)*1000:.3f} ms")
+# === MULTIPROC：別プロセスの価格取得 / ML 推論と、それを読むスレッド ===
+def _jst(ts_ns):
+    return pd.Timestamp(int(ts_ns), unit="ns", tz="UTC").tz_convert("Asia/Tokyo")
+
+def run_fetch_process(ring_name, pair, interval, period, sleep_sec=1):
+    """子プロセス：履歴 → リング（kind=HIST）、以後は毎秒の価格を書き続ける"""
+    ring = ShmRing.attach(ring_name, TICK_DTYPE)
+    fetcher = PriceFetcher(pair=pair, interval=interval)
+    prices = fetcher.get_initial_prices(period=period)
+    for t, p in zip(fetcher.df.index, prices):
+        ring.write(t.value, p, time.time(), HIST, np.nan)
+    ring.set_ready(len(prices))
+    while True:
+        t0 = time.perf_counter()
+        try:
+            ts, price = fetcher.update()
+        except Exception:
+            # 取れなかった秒は飛ばす。回数はヘッダで main に渡す（fetch_failures）
+            ring.add_error()
+            time.sleep(sleep_sec); continue
+        ring.write(ts.value, price, time.time(), LIVE, time.perf_counter() - t0)
+        time.sleep(sleep_sec)
+
+def run_ml_process(tick_ring, ml_ring, model_path, poll_sec=0.2):
+    """子プロセス：価格リングを読んで分ごとに特徴量 → 全ヘッド推論 → ML リングへ"""
+    ticks = ShmRing.attach(tick_ring, TICK_DTYPE)
+    out = ShmRing.attach(ml_ring, ML_DTYPE)
+    model = LinearModel.load(model_path, cols=FEATURE_COLS)
+    hs = np.full(MAX_HEADS, -1); hs[:len(model.horizons)] = model.horizons
+    hist = ticks.history()
+    prices = hist["price"].tolist()
+    feats = IndicatorFeatures()
+    feats.init_prices(prices)
+    out.set_ready()
+    since, last_min = len(hist), None
+    while True:
+        recs, since, _ = ticks.read(since)
+        if len(recs):
+            r = recs[-1]  # main の run_ma_task と同じく、分が変わって最初に見えた価格で1回
+            ts = _jst(r["ts"])
+            cur_min = ts.replace(second=0, microsecond=0)
+            if cur_min != last_min:
+                row = feats.update(ts, float(r["price"]))
+                if row is not None:
+                    p = np.full(MAX_HEADS, np.nan); p[:len(model.horizons)] = model.predict_all(row)
+                    out.write(cur_min.value, p, hs)
+                last_min = cur_min
         time.sleep(poll_sec)
 
+def run_ring_price_task(ring: ShmRing, since: int, stop: threading.Event, poll_sec=0.1):
+    """
+    価格リング → latest_price（run_price_task の代わり）。stop が立ったら抜ける（リングを閉じる前に join）
+    取得の所要時間（fetch_sec）と失敗回数（ヘッダの errors）は fx-fetch から受け取って H_FETCH / C_FETCH_FAIL へ
+    """
+    global latest_price, snap_version
+    errors = ring.errors
+    C_FETCH_FAIL.inc(errors)
+    while not stop.is_set():
+        recs, since, _ = ring.read(since)
+        n = ring.errors
+        if n != errors:
+            C_FETCH_FAIL.inc(n - errors)
+            errors = n
+        for r in recs:
+            H_FETCH.observe(float(r["fetch_sec"]))
+            tick = Tick(_jst(r["ts"]), float(r["price"]), float(r["fetched_at"]), int(r["seq"]))
+            H_BAR_TO_FETCH.observe(tick.fetched_at - tick.ts.timestamp())
+            with lock:
+                changed = latest_price is None or latest_price[:2] != tick[:2]
+                latest_price = tick
+                if changed:
+                    snap_version += 1
+            bus.publish(busmod.PRICE, tick[:2])
+        stop.wait(poll_sec)
+
+def run_ring_ml_task(ring: ShmRing, stop: threading.Event, poll_sec=0.1):
+    """ML リング → latest_ml。今の足のスナップショットにも差し込む（ret3 は minute で重複を弾く）"""
+    global latest_ma_snap, latest_ml, snap_version
+    since = 0  # 履歴は無い（書かれた分だけ読む）ので ready は待たない
+    while not stop.is_set():
+        recs, since, _ = ring.read(since)
+        if len(recs):
+            r = recs[-1]
+            k = r["h"] >= 0
+            ml = ml_snapshot(_jst(r["ts"]), r["p"][k], tuple(int(h) for h in r["h"][k]))
+            with lock:
+                latest_ml = ml
+                if latest_ma_snap is not None:
+                    latest_ma_snap = latest_ma_snap[:5] + (ml,) + latest_ma_snap[6:]
+                snap_version += 1
+        stop.wait(poll_sec)
+
+def stop_multiproc(procs, rings, readers, stop: threading.Event):
+    # 読み手スレッドを止めて join → 子プロセス停止 → リングを閉じる（読んでいる最中に unmap しない）
+    stop.set()
+    for t in readers:
+        t.join(timeout=5)
+    for p in procs:
+        p.terminate()
+        p.join(timeout=5)
+    for r in rings:
+        if any(t.is_alive() for t in readers):
+            r.unlink()  # まだ読んでいるスレッドがいたら unmap はせず、名前だけ消す（/dev/shm に残さない）
+        else:
+            r.close()
+
 # === タスク3: 売買シグナル判定（最新スナップショットで随時） ===
 def run_strategy_task(strategy: Strategy, sleep_sec=1):
-    global latest_price, latest_ma_snap, latest_signal
+    global latest_price, latest_ma_snap, latest_signal, snap_version
+    last_seq = None
     while True:
-        if DEBUG:
-            start = time.perf_counter()   # ← 計測開始
-
         with lock:
             px = latest_price
             ma_snap = latest_ma_snap
         if not px or not ma_snap:
             time.sleep(0.1); continue
 
-        ts_px, price = px
-        ts_ma, _, ma_dict, bb_vals, rsi_val = ma_snap   # ma_snap = (ts, price, {w:ma})
+        ts_px, price = px.ts, px.price
+        ts_ma, _, ma_dict, bb_vals, rsi_val, ml, ma_tick = ma_snap   # ma_snap = (ts, price, {w:ma}, bb, rsi, ml, tick)
         datetime = ts_px.strftime("%Y-%m-%d %H:%M:%S")
 
         # ここでは“分確定のMAに対して”現時点の価格で判定
-        res = strategy.generate(price,datetime, ma_dict, bb_vals, rsi_val)
+        with H_STRATEGY.time():
+            res = strategy.generate(price,datetime, ma_dict, bb_vals, rsi_val, ml)
+        signal_at = time.time()
+        # どの価格（seq）とどの足（bar_seq）から出たシグナルか
+        res["trace"] = {"seq": px.seq, "bar_ts": ts_px, "fetched_at": px.fetched_at,
+                        "bar_seq": ma_tick.seq, "signal_at": signal_at}
+        if px.seq != last_seq:  # 同じ価格で判定し直した分は数えない
+            H_FETCH_TO_SIG.observe(signal_at - px.fetched_at)
+            H_TICK_TO_SIG.observe(signal_at - ts_px.timestamp())
+            last_seq = px.seq
 
         with lock:
+            changed = latest_signal is None or any(res[k] != latest_signal[k] for k in ("ret", "metrics"))
             latest_signal = res
+            if changed:
+                snap_version += 1
 
         def fmt(x): return f"{x:.3f}" if x is not None else "nan"
         # print(
@@ -104,91 +291,62 @@ def run_strategy_task(strategy: Strategy, sleep_sec=1):
         #     f"MA25={fmt(ma_dict.get(25))}  MA75={fmt(ma_dict.get(75))}  MA200={fmt(ma_dict.get(200))}  "
         #     f"→ Signal={res['signal']}"
         # )
-
-        if DEBUG:
-            end = time.perf_counter()   # ← 計測終了
-            print(f"[task3] 計算時間: {(end - start)*1000:.3f} ms")
         time.sleep(sleep_sec)
         
 # === タスク4: 表示タスク ===
-def run_view_task(sleep_sec=1):
-    # global latest_price, latest_ma_snap, latest_signal
-    mod = 0
-    while True:
-        os.system("cls")
-        # if mod == 1:
-        #     os.system("cls")
-        #     mod = 0
-        # else:
-        #     mod = 1
-
-        if DEBUG:
-            start = time.perf_counter()   # ← 計測開始
-
-        with lock:
-            px = latest_price
-            ma_snap = latest_ma_snap
-        if not px or not ma_snap:
-            time.sleep(0.1); continue
-        
-        ts_px, price = px
-        ts_ma, _, ma_dict, bb_vals, rsi_val = ma_snap  # ma_snap = (ts, price, {w:ma})
-        date_part = ts_px.strftime("%Y-%m-%d")
-        time_part = ts_px.strftime("%H:%M:%S")
-        nowprice = Decimal(str(price)).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        ma25 = Decimal(str(ma_dict.get(25))).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        ma75 = Decimal(str(ma_dict.get(75))).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        ma200 = Decimal(str(ma_dict.get(200))).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        bb_upper_1 = Decimal(str(bb_vals['upper_1'])).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        bb_upper_2 = Decimal(str(bb_vals['upper_2'])).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        bb_lower_1 = Decimal(str(bb_vals['lower_1'])).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        bb_lower_2 = Decimal(str(bb_vals['lower_2'])).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        mid = Decimal(str(bb_vals['mid'])).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        rsi = Decimal(str(rsi_val)).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        print("-----------------------------------------------------------")
-        print("date:",date_part,"time:",time_part)
-        print("\033[31mnow price   :",nowprice,"\033[0m")
-
-        print("\033[33mma 25       :",ma25,"\033[0m")
-        print("\033[33mma 75       :",ma75,"\033[0m")
-        print("\033[33mma 200      :",ma200,"\033[0m")
-
-        ma200late = Decimal('0.0005')
-        ONE = Decimal('1')
-        ma200p = Decimal(ma200 * Decimal(ONE + ma200late)).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        ma200m = Decimal(ma200 * Decimal(ONE - ma200late)).quantize(Decimal("0.000"), rounding=ROUND_DOWN)
-        print("\033[33mspl ma 200 +:",ma200p,"\033[0m")
-        print("\033[33mspl ma 200  :",ma200,"\033[0m")
-        print("\033[33mspl ma 200 -:",ma200m,"\033[0m")
-
-        print("\033[32mbb +2σ      :",bb_upper_2,"\033[0m")
-        print("\033[32mbb +1σ      :",bb_upper_1,"\033[0m")
-        print("\033[32mbb mid      :",mid,"\033[0m")
-        print("\033[32mbb -1σ      :",bb_lower_1,"\033[0m")
-        print("\033[32mbb -2σ      :",bb_lower_2,"\033[0m")
-
-        print("\033[34mrsi         :",rsi,"\033[0m")
-        print()
-        print()
-        print()
-        print("-----------------------------------------------------------")
-        print("\033[32mresult      :",latest_signal["ret"][0],"\033[0m")
-        print("\033[32m            :",latest_signal["ret"][1],"\033[0m")
-        print("\033[32m            :",latest_signal["ret"][2],"\033[0m")
-        print("\033[32m            :",latest_signal["ret"][3],"\033[0m")
-        print("\033[32m            :",latest_signal["ret"][4],"\033[0m")
-        print("\033[32m            :",latest_signal["ret"][5],"\033[0m")
-
-        if DEBUG:
-            end = time.perf_counter()   # ← 計測終了
-            print(f"[task4] 計算時間: {(end - start)*1000:.3f} ms")
-        time.sleep(sleep_sec)
-
-def main():
-    fetcher = PriceFetcher(pair=PAIR, interval=INTERVAL)
-
-    print("[INFO] 過去データ取得中...")
-    initial_prices = fetcher.get_initial_prices(period=HISTORY_PERIOD)
+def view_source():
+    # Dashboard 用：(版数, [(ペア, 価格, 指標, シグナル)])。ペアを増やしたらここに並べる
+    with lock:
+        return snap_version, [(PAIR, latest_price, latest_ma_snap, latest_signal)]
+
+def run_view_task(dash: Dashboard):
+    # 変わった所だけ書き直す。スナップショットが変わらなければ何も出さない
+    # dash は main() が持つ（終了時に main から止めて端末を戻すため）
+    def on_frame(dash, sec):
+        H_RENDER.observe(sec)
+        sig = dash.panels[0][3] if dash.panels else None
+        if sig and "trace" in sig:
+            H_SIG_TO_RENDER.observe(time.time() - sig["trace"]["signal_at"])
+    dash.run(on_frame)
+
+def _age_sec(snap):
+    # スナップショットの時刻から今までの秒数（無ければ None）
+    return None if not snap else time.time() - snap[0].timestamp()
+
+def register_gauges(journal: TradeJournal):
+    ins.gauge("price_age_seconds", "最新価格の足の時刻からの経過秒").set_fn(lambda: _age_sec(latest_price))
+    ins.gauge("bar_age_seconds", "最新の確定足（インジケータ）からの経過秒").set_fn(lambda: _age_sec(latest_ma_snap))
+    ins.gauge("journal_pending", "約定ジャーナルの書き込み待ち件数").set_fn(journal.pending)
+    ins.gauge("snapshot_version", "スナップショットの版数").set_fn(lambda: snap_version)
+
+def main(chart=CHART, multiproc=MULTIPROC):
+    procs, rings, readers = [], [], []
+    ring_stop = threading.Event()
+    if multiproc:
+        # 価格取得・ML 推論は子プロセス（spawn）。ここはインジケータ・売買・表示だけ
+        ctx = mp.get_context("spawn")
+        ticks = ShmRing.create(f"fx_ticks_{os.getpid()}", TICK_DTYPE, RING_CAP, pid=os.getpid())
+        rings.append(ticks)
+        procs.append(ctx.Process(target=run_fetch_process, args=(ticks.name, PAIR, INTERVAL, HISTORY_PERIOD),
+                                 name="fx-fetch", daemon=True))
+        if os.path.exists(ML_MODEL):
+            ml_ring = ShmRing.create(f"fx_ml_{os.getpid()}", ML_DTYPE, 1024, pid=os.getpid())
+            rings.append(ml_ring)
+            procs.append(ctx.Process(target=run_ml_process, args=(ticks.name, ml_ring.name, ML_MODEL),
+                                     name="fx-ml", daemon=True))
+        for p in procs:
+            p.start()
+        print("[INFO] 過去データ取得中（fx-fetch プロセス）...")
+        try:
+            hist = ticks.history()
+        except BaseException:
+            stop_multiproc(procs, rings, readers, ring_stop)
+            raise
+        initial_prices = hist["price"].tolist()
+    else:
+        fetcher = PriceFetcher(pair=PAIR, interval=INTERVAL)
+        print("[INFO] 過去データ取得中...")
+        initial_prices = fetcher.get_initial_prices(period=HISTORY_PERIOD)
     print(f"[INFO] 過去データ取得完了: {len(initial_prices)}本")
 
     mas = {w: MovingAverage(window=w) for w in WINDOWS}
@@ -201,17 +359,55 @@ def main():
     bb.init_prices(initial_prices)
     rsi.init_prices(initial_prices)
 
-    strategy = Strategy()
-    STATE_PATH = "strategy_state.json"
+    # ML枠：推論用モデル（.npz）があれば、同じ指標から特徴量を作って毎分推論（MULTIPROC なら fx-ml プロセスが）
+    feats = model = None
+    if multiproc:
+        print(f"[INFO] ML枠: {'fx-ml プロセス' if len(rings) > 1 else f'モデルなし（お休み）: {ML_MODEL}'}")
+    else:
+        feats = IndicatorFeatures(window=bb.window)
+        feats.init_prices(initial_prices)
+        try:
+            model = LinearModel.load(ML_MODEL, cols=FEATURE_COLS)
+            print(f"[INFO] MLモデル読み込み完了: {ML_MODEL} horizons={model.horizons}")
+        except Exception as e:
+            print(f"[INFO] MLモデルなし（ML枠はお休み）: {ML_MODEL} ({e})")
+
+    journal = TradeJournal(JOURNAL_PATH).start()
+    statelog = StateLog(WAL_PATH, snapshot_path=STATE_PATH)
+    strategy = Strategy(journal=journal, statelog=statelog, bus=bus)
     if strategy.import_state(STATE_PATH):
         print(f"[INFO] 前回状態を復元しました: {STATE_PATH}")
     else:
         print(f"[INFO] 前回状態ファイルなし（新規開始）: {STATE_PATH}")
 
-    t1 = threading.Thread(target=run_price_task,   args=(fetcher,), daemon=True)
-    t2 = threading.Thread(target=run_ma_task,      args=(mas,bb,rsi),     daemon=True)
+    if multiproc:
+        t1 = threading.Thread(target=run_ring_price_task, args=(ticks, len(hist), ring_stop), daemon=True)
+        readers.append(t1)
+        if len(rings) > 1:
+            readers.append(threading.Thread(target=run_ring_ml_task, args=(ml_ring, ring_stop), daemon=True))
+            readers[-1].start()
+    else:
+        t1 = threading.Thread(target=run_price_task,   args=(fetcher,), daemon=True)
+    t2 = threading.Thread(target=run_ma_task,      args=(mas,bb,rsi,feats,model), daemon=True)
     t3 = threading.Thread(target=run_strategy_task,args=(strategy,),daemon=True)
-    t4 = threading.Thread(target=run_view_task, daemon=True)
+    dash = Dashboard(view_source, fps=VIEW_FPS)
+    t4 = threading.Thread(target=run_view_task, args=(dash,), daemon=True)
+
+    if HTTP_PORT is not None:
+        try:
+            httpview.serve(view_source, port=HTTP_PORT)
+            print(f"[INFO] スナップショット配信: http://127.0.0.1:{HTTP_PORT}/snapshot  /events")
+        except OSError as e:
+            print(f"[INFO] HTTP 配信なし（ポート {HTTP_PORT} が使えない）: {e}")
+
+    # 実行中の計測：SIGUSR1=スタック / SIGUSR2=プロファイル、ソケットでも（出力は prof/）
+    try:
+        profhooks.install(PROF_PORT)
+    except OSError as e:
+        print(f"[INFO] 計測ソケットなし（ポート {PROF_PORT} が使えない）: {e}")
+    register_gauges(journal)
+    if METRICS_PATH is not None:
+        ins.start_exporter(METRICS_PATH, METRICS_EVERY_SEC)
 
     t1.start()
     t2.start()
@@ -219,15 +415,27 @@ def main():
     t4.start()
 
     try:
-        while True:
-            time.sleep(1)
+        if chart:
+            # matplotlib はメインスレッドで。ウィンドウを閉じたら終了処理へ
+            from gui import LiveChart
+            LiveChart(bus, pair=PAIR).run()
+        else:
+            while True:
+                time.sleep(1)
     except KeyboardInterrupt:
+        pass
+    finally:
+        # 先に表示を止めてカーソルを戻す（daemon スレッドの finally は終了時に走らない）。ここから下の print はパネルの下に出る
+        dash.stop(t4)
         # 停止前に状態を保存
         try:
             strategy.export_state(STATE_PATH)
             print(f"\n[INFO] 状態を保存しました: {STATE_PATH} ")
+            journal.close()
+            statelog.close()
         finally:
-           print("\n[INFO] 手動停止しました")
+            stop_multiproc(procs, rings, readers, ring_stop)
+            print("\n[INFO] 手動停止しました")
 
 if __name__ == "__main__":
     main()
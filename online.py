@@ -0,0 +1,90 @@
+# online.py
+# オンライン学習：予測した特徴量行を HORIZON 本待ってラベルが確定したら1ステップだけ更新
+#   - 標準化は指数移動平均（EWMA）で平均/分散を追従
+#   - 重みは標準化後の空間で持ち、ロジスティック回帰の勾配1回分だけ動かす
+import math
+from collections import deque
+from typing import Optional
+import numpy as np
+from linmodel import LinearModel
+
+class OnlineLogit:
+    """
+    push(row, close) … 確定足の特徴量と終値を積む。HORIZON 本前の行のラベルが確定したら学習
+    predict_proba(x) … 現在の標準化と重みで p_up
+    to_linear()      … 標準化を畳み込んだ LinearModel（保存・差し替え用）
+    """
+    def __init__(self, cols, horizon: int = 5, lr: float = 0.01, l2: float = 1e-4, halflife: float = 1440.0):
+        self.cols = list(cols)
+        self.horizon = horizon
+        self.lr = lr
+        self.l2 = l2
+        self.alpha = 1.0 - 0.5 ** (1.0 / halflife)  # EWMA の重み
+        n = len(self.cols)
+        self.mu = np.zeros(n)
+        self.var = np.ones(n)
+        self.w = np.zeros(n)
+        self.b = 0.0
+        self.pending: deque = deque()
+        self.updates = 0
+
+    # ---- 初期化 ---------------------------------------------------------------
+    def seed(self, rows) -> None:
+        """手元の特徴量行（履歴）で平均/分散の初期値を作る"""
+        X = np.asarray(rows, dtype="float64")
+        if len(X) < 2:
+            return
+        self.mu = X.mean(axis=0)
+        self.var = X.var(axis=0, ddof=1)
+
+    def load_linear(self, m: LinearModel) -> None:
+        """
+        LinearModel（x·w+b）を今の標準化のもとでの重みに変換して引き継ぐ
+        x·w + b = ((x-mu)/sd)·(w*sd) + (b + mu·w)
+        """
+        m = m.reorder(self.cols)
+        sd = self._sd()
+        self.w = m.w * sd
+        self.b = m.b + float(np.dot(self.mu, m.w))
+
+    def _sd(self):
+        sd = np.sqrt(self.var)
+        return np.where(sd > 0, sd, 1.0)
+
+    # ---- 推論 -----------------------------------------------------------------
+    def predict_proba(self, x) -> float:
+        xn = (np.asarray(x, dtype="float64") - self.mu) / self._sd()
+        z = float(np.dot(self.w, xn)) + self.b
+        if z >= 0:
+            return 1.0 / (1.0 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1.0 + e)
+
+    def to_linear(self) -> LinearModel:
+        sd = self._sd()
+        return LinearModel(self.cols, self.w / sd, self.b - float(np.sum(self.w * self.mu / sd)))
+
+    # ---- 学習 -----------------------------------------------------------------
+    def push(self, row, close: float) -> Optional[float]:
+        """
+        確定足1本ぶん。標準化を更新し、HORIZON 本前の行が熟したら勾配1ステップ
+        戻り値は学習した行の（更新前の）予測確率。学習しなかった時は None
+        """
+        x = np.asarray(row, dtype="float64")
+        a = self.alpha
+        d = x - self.mu
+        self.mu = self.mu + a * d
+        self.var = (1.0 - a) * (self.var + a * d * d)
+
+        self.pending.append((x, float(close)))
+        if len(self.pending) <= self.horizon:
+            return None
+        x0, c0 = self.pending.popleft()
+        y = 1.0 if close > c0 else 0.0  # build_dataset と同じ：HORIZON 本後の終値が高ければ1
+        p = self.predict_proba(x0)
+        xn = (x0 - self.mu) / self._sd()
+        g = p - y
+        self.w -= self.lr * (g * xn + self.l2 * self.w)
+        self.b -= self.lr * g
+        self.updates += 1
+        return p
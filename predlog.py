@@ -0,0 +1,200 @@
+# predlog.py
+# 予測ログ（列ごとのバイナリ・日別ローテーション・時刻インデックス付き）
+#   pred_log/
+#     index.json          … 列の型 / 日ごとの [最初, 最後] の時刻と行数
+#     20250902/ts.bin     … int64 ns (UTC)
+#     20250902/close.bin  … float64
+#     20250902/proba_up.bin, signal.bin(int8), proba_up_h1.bin ...
+#   - 書き込みはバッファに貯めて、N行 or T秒ごとにまとめて追記
+#   - 読み出しは index で該当日だけ開き、np.memmap → searchsorted で範囲を切り出す（文字列パースなし）
+import os, json, time
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+import numpy as np
+from statelog import atomic_write_json
+
+PRED_LOG = "pred_log"
+INDEX = "index.json"
+JST = timezone(timedelta(hours=9))
+SIGNALS = np.array(["HOLD", "BUY", "SELL"])  # signal 列の値 0/1/2（fill.BUY/SELL と同じ番号）
+SIGNAL_CODE = {s: i for i, s in enumerate(SIGNALS)}
+
+def schema(horizons=()) -> dict:
+    cols = {"ts": "<i8", "close": "<f8", "proba_up": "<f8", "signal": "i1"}
+    for h in horizons:
+        cols[f"proba_up_h{h}"] = "<f8"
+    return cols
+
+def _ns(ts) -> int:
+    # pandas.Timestamp / datetime（tz付き）/ int(ns) → int64(ns, UTC)
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+    if hasattr(ts, "value"):
+        return int(ts.value)
+    return int(round(ts.timestamp() * 1e9))
+
+def _day(ns: int) -> str:
+    # 日の区切りは JST
+    return datetime.fromtimestamp(ns / 1e9, JST).strftime("%Y%m%d")
+
+class PredLog:
+    """
+    write(ts, close, p_up, signal, probs) … 1分ぶん。バッファに積むだけ
+    flush()                              … バッファを日ごとのファイルへ追記して index.json を更新
+    close()                              … 残りを書き切る
+    """
+    def __init__(self, root: str = PRED_LOG, horizons=(), flush_rows: int = 30, flush_sec: float = 600.0):
+        self.root = root
+        self.horizons = tuple(int(h) for h in horizons)
+        self.schema = schema(self.horizons)
+        self.flush_rows = flush_rows
+        self.flush_sec = flush_sec
+        os.makedirs(root, exist_ok=True)
+        self.index = read_index(root)
+        if self.index.get("schema", self.schema) != self.schema:
+            raise ValueError(f"予測ログの列が違います: {self.index.get('schema')} != {self.schema}")
+        self.index["schema"] = self.schema
+        self.index.setdefault("days", {})
+        self.last_ts: Optional[int] = max((d["end"] for d in self.index["days"].values()), default=None)
+        self._buf = {c: [] for c in self.schema}
+        self._last_flush = time.time()
+
+    def __len__(self) -> int:
+        return sum(d["rows"] for d in self.index["days"].values()) + len(self._buf["ts"])
+
+    def write(self, ts, close: float, p_up: float, signal: str, probs: Optional[dict] = None) -> bool:
+        t = _ns(ts)
+        if self.last_ts is not None and t <= self.last_ts:
+            return False  # 時刻順を崩さない（同じ分の二重書き込みも捨てる）
+        b = self._buf
+        b["ts"].append(t)
+        b["close"].append(float(close))
+        b["proba_up"].append(float(p_up))
+        b["signal"].append(SIGNAL_CODE.get(signal, 0))
+        for h in self.horizons:
+            b[f"proba_up_h{h}"].append(float(probs.get(h, np.nan)) if probs else np.nan)
+        self.last_ts = t
+        if len(b["ts"]) >= self.flush_rows or time.time() - self._last_flush >= self.flush_sec:
+            self.flush()
+        return True
+
+    def write_frame(self, df) -> int:
+        """
+        live_pred.csv を読んだ形の DataFrame（datetime, close, proba_up, signal, proba_up_h*）をまとめて追記
+        既にある時刻以前の行は捨てる。戻り値は追記した行数
+        """
+        from fill import ts_ns
+        t = ts_ns(df["datetime"])
+        keep = t > self.last_ts if self.last_ts is not None else np.ones(len(t), dtype=bool)
+        keep &= np.concatenate([[True], np.diff(t) > 0])  # 時刻順・重複なしだけ
+        if not keep.any():
+            return 0
+        b = self._buf
+        b["ts"].extend(t[keep].tolist())
+        b["close"].extend(df["close"].to_numpy(dtype="float64")[keep].tolist())
+        b["proba_up"].extend(df["proba_up"].to_numpy(dtype="float64")[keep].tolist())
+        b["signal"].extend(df["signal"].map(SIGNAL_CODE).fillna(0).to_numpy(dtype="int64")[keep].tolist())
+        for h in self.horizons:
+            col = f"proba_up_h{h}"
+            v = df[col].to_numpy(dtype="float64") if col in df else np.full(len(df), np.nan)
+            b[col].extend(v[keep].tolist())
+        self.last_ts = int(t[keep][-1])
+        self.flush()
+        return int(keep.sum())
+
+    def flush(self) -> None:
+        self._last_flush = time.time()
+        n = len(self._buf["ts"])
+        if n == 0:
+            return
+        cols = {c: np.asarray(v, dtype=self.schema[c]) for c, v in self._buf.items()}
+        self._buf = {c: [] for c in self.schema}
+        days = np.array([_day(int(t)) for t in cols["ts"]])
+        for day in dict.fromkeys(days):  # 出てきた順（= 時刻順）
+            m = days == day
+            d = os.path.join(self.root, day)
+            os.makedirs(d, exist_ok=True)
+            info = self.index["days"].get(day, {"start": int(cols["ts"][m][0]), "end": 0, "rows": 0})
+            rows = info["rows"]
+            for c, arr in cols.items():
+                with open(os.path.join(d, f"{c}.bin"), "ab") as f:
+                    # 前回途中で落ちて index より長く書かれていたら、index の行数まで切り詰めてから追記
+                    f.truncate(rows * arr.dtype.itemsize)
+                    f.write(arr[m].tobytes())
+            info["rows"] = rows + int(m.sum())
+            info["end"] = int(cols["ts"][m][-1])
+            self.index["days"][day] = info
+        atomic_write_json(os.path.join(self.root, INDEX), self.index)
+
+    def close(self) -> None:
+        self.flush()
+
+# ---------- 読み出し ----------
+def read_index(root: str = PRED_LOG) -> dict:
+    try:
+        with open(os.path.join(root, INDEX), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def exists(root: str = PRED_LOG) -> bool:
+    return os.path.exists(os.path.join(root, INDEX))
+
+def load_range(root: str = PRED_LOG, start=None, end=None) -> dict:
+    """
+    時刻範囲 [start, end) の列（dict[str, np.ndarray]）。start/end は tz付き時刻か int64 ns、None で端まで
+    index.json に載っている行数までしか読まないので、書きかけの端数は見えない
+    """
+    idx = read_index(root)
+    sch = idx.get("schema", schema())
+    s = None if start is None else _ns(start)
+    e = None if end is None else _ns(end)
+    parts = {c: [] for c in sch}
+    for day in sorted(idx.get("days", {})):
+        info = idx["days"][day]
+        if info["rows"] == 0 or (s is not None and info["end"] < s) or (e is not None and info["start"] >= e):
+            continue
+        d = os.path.join(root, day)
+        ts = np.memmap(os.path.join(d, "ts.bin"), dtype=sch["ts"], mode="r", shape=(info["rows"],))
+        i0 = 0 if s is None else int(np.searchsorted(ts, s, side="left"))
+        i1 = info["rows"] if e is None else int(np.searchsorted(ts, e, side="left"))
+        if i1 <= i0:
+            continue
+        for c, dt in sch.items():
+            mm = ts if c == "ts" else np.memmap(os.path.join(d, f"{c}.bin"), dtype=dt, mode="r", shape=(info["rows"],))
+            parts[c].append(np.array(mm[i0:i1]))
+    return {c: (np.concatenate(v) if v else np.empty(0, dtype=sch[c])) for c, v in parts.items()}
+
+def load_frame(root: str = PRED_LOG, start=None, end=None):
+    """load_range → live_pred.csv を読んだ時と同じ列の DataFrame（datetime は UTC）"""
+    import pandas as pd
+    cols = load_range(root, start, end)
+    df = pd.DataFrame({c: v for c, v in cols.items() if c not in ("ts", "signal")})
+    df.insert(0, "datetime", pd.to_datetime(cols["ts"], utc=True))
+    df.insert(3, "signal", SIGNALS[cols["signal"].astype("int64")])
+    return df
+
+def import_csv(csv_path: str, root: str = PRED_LOG, chunksize: int = 100_000) -> int:
+    """live_pred.csv → 予測ログ（chunksize 行ずつ読むので、大きな CSV でもメモリは一定）"""
+    import pandas as pd
+    with open(csv_path, encoding="utf-8") as f:
+        head = f.readline().strip().split(",")
+    horizons = sorted(int(c[10:]) for c in head if c.startswith("proba_up_h") and c[10:].isdigit())
+    log = PredLog(root, horizons)
+    n = 0
+    for df in pd.read_csv(csv_path, chunksize=chunksize):
+        df["datetime"] = pd.to_datetime(df["datetime"], utc=True)
+        n += log.write_frame(df.sort_values("datetime"))
+    log.close()
+    return n
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="予測ログのユーティリティ")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("import", help="live_pred.csv を予測ログに取り込む")
+    p.add_argument("csv")
+    p.add_argument("--root", default=PRED_LOG)
+    a = ap.parse_args()
+    if a.cmd == "import":
+        print(f"imported {import_csv(a.csv, a.root)} rows -> {a.root}")
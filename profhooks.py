@@ -0,0 +1,193 @@
+# profhooks.py
+# 動いているプロセスをその場で調べるためのフック（再起動しない・止めない）
+#   - stacks        … 全スレッドのスタックをファイルへ
+#   - profile N     … N 秒間サンプリング（sys._current_frames を一定間隔で覗く）→ 関数ごとの集計と
+#                     flamegraph 用の folded 形式をファイルへ。全スレッドが対象
+#   - alloc N       … N 秒間 tracemalloc を有効にして、開始時との差分（増えた行の上位）をファイルへ
+#   - status        … いま動いている計測
+#   操作は2通り
+#     シグナル（Linux/mac）: SIGUSR1 → stacks、SIGUSR2 → profile PROFILE_SEC
+#     ローカルのコントロールソケット（127.0.0.1、1行1コマンド）: python profhooks.py profile 30 --port 8766
+#   出力は PROF_DIR（既定 prof/）に pid と時刻つきで。返事は書いたファイルのパス
+#   シグナルで受けた分の返事は PROF_DIR/commands.log に追記（端末には出さない。main.py のダッシュボードを崩すので）
+#   オフの間はスレッドもフックも無い（待ち受けスレッドが accept で寝ているだけ）
+import os, signal, socket, sys, threading, time, traceback
+from collections import Counter
+
+PROF_DIR = "prof"
+PROFILE_SEC = 30         # SIGUSR2 で測る秒数
+SAMPLE_SEC = 0.005       # サンプリング間隔（5ms）
+ALLOC_TOP = 50           # alloc で書き出す行数
+LOG_NAME = "commands.log"  # シグナルで受けたコマンドと返事（PROF_DIR の下）
+MAX_SEC = 600            # profile / alloc の上限（付けっぱなし防止）
+
+_busy = threading.Lock()     # profile / alloc は同時に1つだけ
+_state = {"running": None}
+
+def _path(kind: str, ext: str = "txt") -> str:
+    os.makedirs(PROF_DIR, exist_ok=True)
+    return os.path.join(PROF_DIR, f"{kind}_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.{ext}")
+
+def _names() -> dict:
+    return {t.ident: t.name for t in threading.enumerate()}
+
+# ---------- stacks ----------
+def dump_stacks() -> str:
+    names = _names()
+    path = _path("stacks")
+    with open(path, "w", encoding="utf-8") as f:
+        for tid, frame in sys._current_frames().items():
+            f.write(f"--- thread {names.get(tid, '?')} ({tid}) ---\n")
+            f.write("".join(traceback.format_stack(frame)))
+            f.write("\n")
+    return path
+
+# ---------- profile（サンプリング） ----------
+def _key(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+def profile(seconds: float = PROFILE_SEC, interval: float = SAMPLE_SEC) -> str:
+    """
+    seconds 秒サンプリングして書き出す（呼んだスレッドで待つ）
+    self = そのサンプルで一番上にいた関数、total = スタックのどこかにいた関数
+    """
+    seconds = min(float(seconds), MAX_SEC)
+    folded, self_c, total_c = Counter(), Counter(), Counter()
+    n = 0
+    t_end = time.perf_counter() + seconds
+    while time.perf_counter() < t_end:
+        names = _names()
+        for tid, frame in sys._current_frames().items():
+            if names.get(tid) == "profhooks":
+                continue  # 自分（受け付け・サンプリング）は数えない
+            stack = []
+            f = frame
+            while f is not None:
+                stack.append(_key(f))
+                f = f.f_back
+            self_c[stack[0]] += 1
+            for k in set(stack):
+                total_c[k] += 1
+            folded[";".join([names.get(tid, str(tid))] + stack[::-1])] += 1
+        n += 1
+        time.sleep(interval)
+    path = _path("profile")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {n} samples / {seconds:g}s / interval {interval * 1000:.1f}ms（寝ているスレッドも数える）\n")
+        f.write(f"{'self':>8} {'total':>8}  function\n")
+        for k, c in self_c.most_common(40):
+            f.write(f"{c:>8} {total_c[k]:>8}  {k}\n")
+        f.write(f"\n{'total':>8}  function（total 順）\n")
+        for k, c in total_c.most_common(40):
+            f.write(f"{c:>8}  {k}\n")
+    with open(path[:-4] + ".folded", "w", encoding="utf-8") as f:
+        for stack, c in folded.most_common():
+            f.write(f"{stack} {c}\n")  # flamegraph.pl / speedscope にそのまま渡せる
+    return path
+
+# ---------- alloc（tracemalloc） ----------
+def alloc(seconds: float = PROFILE_SEC, top: int = ALLOC_TOP) -> str:
+    import tracemalloc
+    seconds = min(float(seconds), MAX_SEC)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(10)
+    try:
+        before = tracemalloc.take_snapshot()
+        time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        cur, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()  # 終わったら外す（オフの間のコストはゼロ）
+    path = _path("alloc")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {seconds:g}s の間に増えたメモリ（行ごと）  traced={cur / 2**20:.1f}MB peak={peak / 2**20:.1f}MB\n")
+        for st in after.compare_to(before, "lineno")[:top]:
+            f.write(f"{st}\n")
+        f.write("\n# 終了時点で多い順（traceback）\n")
+        for st in after.statistics("traceback")[:10]:
+            f.write(f"{st.size / 2**10:.1f} KiB in {st.count} blocks\n")
+            f.write("".join(f"    {line}\n" for line in st.traceback.format()))
+    return path
+
+# ---------- 受け付け ----------
+def _exclusive(name, fn, *args):
+    if not _busy.acquire(blocking=False):
+        return f"busy: {_state['running']}"
+    _state["running"] = name
+    try:
+        return fn(*args)
+    finally:
+        _state["running"] = None
+        _busy.release()
+
+def command(line: str) -> str:
+    """1行のコマンド → 返事（書いたファイルのパスなど）"""
+    parts = line.split()
+    if not parts:
+        return "empty"
+    cmd, args = parts[0].lower(), parts[1:]
+    try:
+        if cmd == "stacks":
+            return dump_stacks()
+        if cmd == "profile":
+            return _exclusive(f"profile {args[0] if args else PROFILE_SEC}", profile, float(args[0]) if args else PROFILE_SEC)
+        if cmd == "alloc":
+            return _exclusive(f"alloc {args[0] if args else PROFILE_SEC}", alloc, float(args[0]) if args else PROFILE_SEC)
+        if cmd == "status":
+            return f"pid={os.getpid()} running={_state['running']} threads={threading.active_count()}"
+    except Exception as e:
+        return f"error: {e}"
+    return "unknown command (stacks / profile N / alloc N / status)"
+
+def _background(line: str) -> None:
+    # シグナルハンドラはメインスレッドで呼ばれるので、重い処理は別スレッドへ
+    def run():
+        res = command(line)
+        os.makedirs(PROF_DIR, exist_ok=True)
+        with open(os.path.join(PROF_DIR, LOG_NAME), "a", encoding="utf-8") as f:
+            f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} pid={os.getpid()} {line} -> {res}\n")
+    threading.Thread(target=run, name="profhooks", daemon=True).start()
+
+def _serve(sock: socket.socket) -> None:
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=_handle, args=(conn,), name="profhooks", daemon=True).start()
+
+def _handle(conn: socket.socket) -> None:
+    with conn, conn.makefile("rw", encoding="utf-8", newline="\n") as f:
+        for line in f:
+            f.write(command(line.strip()) + "\n")
+            f.flush()
+
+def install(port=None, signals: bool = True) -> None:
+    """
+    port を渡すと 127.0.0.1:port でコマンドを待ち受ける（None ならソケットなし）
+    signals=True なら SIGUSR1 / SIGUSR2 を登録（無い OS では何もしない。メインスレッドから呼ぶこと）
+    """
+    if signals and hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda s, f: _background("stacks"))
+        signal.signal(signal.SIGUSR2, lambda s, f: _background(f"profile {PROFILE_SEC}"))
+    if port is not None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", port))
+        sock.listen(4)
+        threading.Thread(target=_serve, args=(sock,), name="profhooks", daemon=True).start()
+
+def send(line: str, port: int, host: str = "127.0.0.1", timeout: float = MAX_SEC + 30) -> str:
+    """コントロールソケットへ1コマンド送って返事を待つ"""
+    with socket.create_connection((host, port), timeout=timeout) as s, s.makefile("rw", encoding="utf-8", newline="\n") as f:
+        f.write(line + "\n")
+        f.flush()
+        return f.readline().strip()
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="動いている main.py / ai_yf_live.py に計測を頼む")
+    ap.add_argument("cmd", nargs="+", help="stacks / profile 秒 / alloc 秒 / status")
+    ap.add_argument("--port", type=int, required=True, help="main.py の PROF_PORT など")
+    a = ap.parse_args()
+    print(send(" ".join(a.cmd), a.port))
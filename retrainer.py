@@ -0,0 +1,133 @@
+# retrainer.py
+# 再学習を別プロセスで回し、ホールドアウト検証に通った時だけライブ側のモデルを差し替える
+import os, time, math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np
+from linmodel import LinearModel, MODEL_NPZ
+
+HOLDOUT_FRAC = 0.2   # 直近2割を検証用に取っておく（現行モデルの学習範囲より後の行だけ）
+MIN_HOLDOUT = 120    # 検証に最低これだけの行（現行モデルが見ていない行がこれ未満なら次回へ）
+MAX_WORSE = 0.002    # 現行モデルより logloss がこれ以上悪ければ不採用
+MAX_LOGLOSS = 0.75   # ln2≒0.693（コイン投げ）から大きく外れる壊れたモデルは不採用
+CAND_PKL = "ai_meta.cand.pkl"
+CAND_NPZ = "ai_meta.cand.npz"
+
+def logloss(p, y) -> float:
+    p = np.clip(np.asarray(p, dtype="float64"), 1e-12, 1 - 1e-12)
+    y = np.asarray(y, dtype="float64")
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+def evaluate(fast: LinearModel, X, y) -> dict:
+    p = fast.predict_proba_batch(X)
+    y = np.asarray(y, dtype="float64")
+    return {"logloss": logloss(p, y), "acc": float(((p >= 0.5) == (y == 1)).mean()), "n": int(len(y))}
+
+def _job(pair, use_warmstart, holdout_frac, cur_npz, cand_pkl, cand_npz):
+    """ワーカープロセス側：取得 → 学習 → 検証 → 候補ファイル書き出し"""
+    import ai_yf_live as A
+    from features import FEATURE_COLS
+    t0 = time.time()
+    Xdf, Y = A.load_dataset(pair)
+    # ラベルが最大ホライズン本先を見るので、境目はその本数あけてリークを防ぐ
+    gap = max(Y.columns)
+    cut = int(len(Xdf) * (1 - holdout_frac))
+    # 現行モデルが学習に使った足（train_end）までは検証に使えない（現行が有利になり、warm-start で候補にも漏れる）
+    prev = A.load_meta()
+    train_end = (prev or {}).get("train_end")
+    if train_end is not None:
+        cut = max(cut, int(Xdf.index.searchsorted(train_end, side="right")) + gap)
+    elif prev is not None:
+        prev = None  # 学習範囲が分からない古いモデル：候補は一から学習し、現行との比較はしない
+    if not use_warmstart:
+        prev = None
+    tr_X, tr_Y = Xdf.iloc[:max(0, cut - gap)], Y.iloc[:max(0, cut - gap)]
+    ho_X, ho_y = Xdf.iloc[cut:], Y[A.HORIZON].iloc[cut:]  # 合否は主ヘッドで判定
+    if len(tr_X) == 0 or len(ho_X) < MIN_HOLDOUT:
+        return {"ok": False, "reason": f"データ不足 samples={len(Xdf)} holdout={len(ho_X)}"}
+
+    cand = A.fit_heads(tr_X, tr_Y, prev)
+    Xh = ho_X[FEATURE_COLS].to_numpy(dtype="float64")
+    m_cand = evaluate(LinearModel.from_meta(cand, cols=FEATURE_COLS), Xh, ho_y)
+    base = float(tr_Y[A.HORIZON].mean())
+    m_base = {"logloss": logloss(np.full(len(ho_y), base), ho_y)}  # 常に訓練の上昇率を出すだけのモデル
+    m_cur = None
+    if train_end is not None and os.path.exists(cur_npz):
+        m_cur = evaluate(LinearModel.load(cur_npz, cols=FEATURE_COLS), Xh, ho_y)
+
+    ok, reason = True, "pass"
+    if not math.isfinite(m_cand["logloss"]):
+        ok, reason = False, "logloss が有限でない"
+    elif m_cand["logloss"] > MAX_LOGLOSS:
+        ok, reason = False, f"logloss が大きすぎる (> {MAX_LOGLOSS})"
+    elif m_cur is not None and m_cand["logloss"] > m_cur["logloss"] + MAX_WORSE:
+        ok, reason = False, "現行モデルより悪い"
+
+    if ok:
+        # 検証に通ったら全期間で学び直して候補として保存（本番ファイルはまだ触らない）
+        final = A.fit_heads(Xdf, Y, cand)
+        A.save_model(final, cand_pkl, cand_npz)
+    return {"ok": ok, "reason": reason, "cand": m_cand, "cur": m_cur, "base": m_base,
+            "sec": round(time.time() - t0, 2)}
+
+class Retrainer:
+    """
+    ライブループから毎周 poll() を呼ぶだけ
+      - 前回から interval 秒たったらワーカーに再学習を投げる（ライブ側は止まらない）
+      - 終わっていれば結果を見て、合格なら候補ファイルを rename で本番に差し替え、新モデルを返す
+    """
+    def __init__(self, pair, interval: float, use_warmstart: bool = True,
+                 pkl_path: str = "ai_meta.pkl", npz_path: str = MODEL_NPZ, holdout_frac: float = HOLDOUT_FRAC):
+        self.pair = pair
+        self.interval = interval
+        self.use_warmstart = use_warmstart
+        self.pkl_path = pkl_path
+        self.npz_path = npz_path
+        self.holdout_frac = holdout_frac
+        self.last_start = time.time()
+        self.last_result: Optional[dict] = None
+        self._ex: Optional[ProcessPoolExecutor] = None
+        self._fut = None
+
+    def poll(self) -> Optional[LinearModel]:
+        if self._fut is None:
+            if time.time() - self.last_start >= self.interval:
+                self.submit()
+            return None
+        if not self._fut.done():
+            return None
+        fut, self._fut = self._fut, None
+        try:
+            res = fut.result()
+        except Exception as e:
+            print("[retrain] failed:", e)
+            return None
+        self.last_result = res
+        if not res.get("ok"):
+            print(f"[retrain] rejected: {res.get('reason')} cand={res.get('cand')} cur={res.get('cur')}")
+            return None
+        try:
+            os.replace(CAND_PKL, self.pkl_path)
+            os.replace(CAND_NPZ, self.npz_path)
+            from features import FEATURE_COLS
+            m = LinearModel.load(self.npz_path, cols=FEATURE_COLS)
+        except Exception as e:
+            print("[retrain] swap failed:", e)
+            return None
+        print(f"[retrain] swapped ({res['sec']}s) cand={res['cand']} cur={res['cur']}")
+        return m
+
+    def submit(self) -> None:
+        if self._fut is not None:
+            return
+        if self._ex is None:
+            self._ex = ProcessPoolExecutor(max_workers=1)
+        print("[retrain] start (worker)…")
+        self.last_start = time.time()
+        self._fut = self._ex.submit(_job, self.pair, self.use_warmstart, self.holdout_frac,
+                                    self.npz_path, CAND_PKL, CAND_NPZ)
+
+    def close(self) -> None:
+        if self._ex is not None:
+            self._ex.shutdown(wait=False, cancel_futures=True)
+            self._ex = None
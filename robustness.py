@@ -0,0 +1,265 @@
+# robustness.py
+# 戦術1（RSIドルコスト）/ 戦術2（MA200ブレイク）の頑健性チェック
+#   - bars  : 1分足リターンをブロック・ブートストラップして合成価格パスを大量に作り、ret1/ret2 を再実行
+#   - trades: 約定ジャーナルの決済損益の並びを再標本化
+# パス方向にベクトル化（NumPy）し、パス集合をプロセスプールに分散する
+import os, json, argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+CSV = "USDJPY_1m_7d.csv"
+INITIAL_SUM = 1000000.0  # SignalResult.sum の初期値
+WARMUP = 200             # 指標の初期化に使う本数（MA200 が埋まるまで）
+RSI_N = 14
+MA_N = 200
+PCTS = (5, 25, 50, 75, 95)
+
+def _trunc3(x):
+    # Strategy.to_decimal（小数3桁・切り捨て）のベクトル版
+    return np.floor(x * 1000.0 + 1e-6) / 1000.0
+
+# ---------- 合成パス ----------
+def block_bootstrap(close, n_paths, block=60, rng=None):
+    """
+    対数リターンをブロック単位で復元抽出して (n_paths, len(close)) の価格パスを作る
+    先頭価格は元データと同じ
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    close = np.asarray(close, dtype="float64")
+    r = np.diff(np.log(close))
+    n = len(r)
+    block = max(1, min(block, n))
+    n_blocks = -(-n // block)
+    starts = rng.integers(0, n - block + 1, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)[None, None, :]).reshape(n_paths, -1)[:, :n]
+    logp = np.log(close[0]) + np.concatenate([np.zeros((n_paths, 1)), np.cumsum(r[idx], axis=1)], axis=1)
+    return np.exp(logp)
+
+# ---------- 指標（rsi.py / average.py と同じ更新式をパス方向に） ----------
+def _rsi_paths(paths, warm=WARMUP, n=RSI_N):
+    P, T = paths.shape
+    out = np.full((P, T), np.nan)
+    pts = paths[:, warm - (n + 1):warm]
+    d = np.diff(pts, axis=1)
+    ag = np.where(d >= 0, d, 0.0).sum(axis=1) / n
+    al = np.where(d < 0, -d, 0.0).sum(axis=1) / n
+    # RSI.init_prices は最後に同じ価格で update を1回呼ぶ（変化0で1回平滑化）
+    ag = ag * (n - 1) / n
+    al = al * (n - 1) / n
+    prev = paths[:, warm - 1]
+    out[:, warm - 1] = np.where(al == 0, 100.0, 100.0 - 100.0 / (1.0 + ag / np.where(al == 0, 1.0, al)))
+    for t in range(warm, T):
+        ch = paths[:, t] - prev
+        ag = (ag * (n - 1) + np.where(ch > 0, ch, 0.0)) / n
+        al = (al * (n - 1) + np.where(ch < 0, -ch, 0.0)) / n
+        prev = paths[:, t]
+        out[:, t] = np.where(al == 0, 100.0, 100.0 - 100.0 / (1.0 + ag / np.where(al == 0, 1.0, al)))
+    return out
+
+def _ma_paths(paths, n=MA_N):
+    cs = np.cumsum(paths, axis=1)
+    ma = np.empty_like(paths)
+    k = min(n, paths.shape[1])
+    ma[:, :k] = cs[:, :k] / np.arange(1, k + 1)
+    ma[:, n:] = (cs[:, n:] - cs[:, :-n]) / n
+    return ma
+
+# ---------- 戦術の再実行（Strategy.generate の ret1/ret2 部分と同じ順序・条件） ----------
+class _Book:
+    """パスごとの SignalResult 相当（配列）"""
+    def __init__(self, P):
+        self.hold = np.zeros(P)
+        self.calc = np.zeros(P)
+        self.judge = np.zeros(P, dtype="int8")
+        self.sum = np.full(P, INITIAL_SUM)
+        self.win = np.zeros(P, dtype="int64")
+        self.los = np.zeros(P, dtype="int64")
+        self.cnt = np.zeros(P, dtype="int64")
+        self.peak = np.full(P, INITIAL_SUM)
+        self.mdd = np.zeros(P)
+        self.touched = np.zeros(P, dtype=bool)  # end_time_stamp == time 相当
+
+    def pnl(self, now):
+        return np.where(self.judge == 1, self.hold * now - self.calc, self.calc - self.hold * now)
+
+    def close(self, m, now):
+        if not m.any():
+            return
+        p = self.pnl(now)
+        self.win += m & (p > 0)
+        self.los += m & (p < 0)
+        self.cnt += m
+        self.sum = np.where(m, self.sum + p, self.sum)
+        self.hold[m] = 0; self.calc[m] = 0.0; self.judge[m] = 0
+        self.touched |= m
+        self.peak = np.maximum(self.peak, self.sum)
+        self.mdd = np.maximum(self.mdd, (self.peak - self.sum) / self.peak)
+
+def _step_ret1(b, now, price, rsi, rsi_old):
+    b.touched[:] = False
+    up = (rsi_old < 28) & (rsi >= 28)
+    dn = (rsi_old > 72) & (rsi <= 72)
+    for cond, side in ((up, 1), (dn, 2)):
+        m0 = cond & ~b.touched & (b.hold == 0)
+        m1 = cond & ~b.touched & ((b.hold == 10000) | (b.hold == 30000))
+        b.hold = np.where(m0, 10000.0, np.where(m1, b.hold * 3, b.hold))
+        m = m0 | m1
+        b.calc = np.where(m, b.calc + b.hold * price, b.calc)
+        b.judge[m] = side
+        b.touched |= m
+    # 決済条件（RSI）
+    b.close((b.hold != 0) & (b.judge == 1) & (rsi >= 72), now)
+    b.close((b.hold != 0) & (b.judge == 2) & (rsi <= 28), now)
+    # 利確 +1.6% / 損切 -1.3%
+    for j in (1, 2):
+        b.close((b.hold != 0) & (b.judge == j) & (b.sum * 0.016 <= b.pnl(now)), now)
+    for j in (1, 2):
+        b.close((b.hold != 0) & (b.judge == j) & (-b.sum * 0.013 >= b.pnl(now)), now)
+    # 4回目のシグナルで決済
+    b.close(~b.touched & (b.judge == 1) & up & (b.hold == 70000), now)
+    b.close(~b.touched & (b.judge == 2) & dn & (b.hold == 70000), now)
+
+def _step_ret2(b, now, price, ma200, prof):
+    ma200p = _trunc3(ma200 * 1.0005)
+    ma200m = _trunc3(ma200 * 0.9995)
+    flat = b.hold == 0
+    for m, side, line in ((flat & (ma200p <= price), 1, ma200p), (flat & (ma200m >= price), 2, ma200m)):
+        b.hold = np.where(m, b.hold + 30000, b.hold)
+        b.calc = np.where(m, b.calc + b.hold * price, b.calc)
+        b.judge[m] = side
+        prof[side - 1] = np.where(m, line + (line - ma200) * 1.2, prof[side - 1])
+    for j in (1, 2):
+        b.close((b.hold != 0) & (b.judge == j) & (-b.sum * 0.013 >= b.pnl(now)), now)
+    for j in (1, 2):
+        b.close((b.hold != 0) & (b.judge == j) & (b.sum * 0.016 <= b.pnl(now)), now)
+    b.close((b.hold != 0) & (b.judge == 1) & (prof[0] <= now), now)
+    b.close((b.hold != 0) & (b.judge == 2) & (prof[1] >= now), now)
+    b.close((b.hold != 0) & (b.judge == 1) & (price <= ma200), now)
+    b.close((b.hold != 0) & (b.judge == 2) & (price >= ma200), now)
+
+def simulate_paths(paths, warm=WARMUP):
+    """(P, T) の価格パスに ret1/ret2 を流して、パスごとの成績を返す"""
+    paths = np.atleast_2d(np.asarray(paths, dtype="float64"))
+    P, T = paths.shape
+    rsi = _trunc3(_rsi_paths(paths, warm))
+    ma = _trunc3(_ma_paths(paths))
+    b1, b2 = _Book(P), _Book(P)
+    prof = [np.full(P, np.nan), np.full(P, np.nan)]
+    rsi_old = rsi[:, warm]
+    for t in range(warm, T):
+        now = paths[:, t]
+        price = _trunc3(now)
+        _step_ret1(b1, now, price, rsi[:, t], rsi_old)
+        _step_ret2(b2, now, price, ma[:, t], prof)
+        rsi_old = rsi[:, t]
+    out = {}
+    for name, b in (("ret1", b1), ("ret2", b2)):
+        out[name] = {
+            "sum": b.sum,
+            "max_drawdown": b.mdd,
+            "win_rate": np.where(b.cnt > 0, b.win / np.maximum(b.cnt, 1), np.nan),
+            "cnt": b.cnt,
+        }
+    return out
+
+def _bars_job(args):
+    close, n_paths, block, seed = args
+    rng = np.random.default_rng(seed)
+    return simulate_paths(block_bootstrap(close, n_paths, block, rng))
+
+# ---------- 約定列の再標本化 ----------
+def resample_trades(pnl, n_paths, rng=None, initial=INITIAL_SUM):
+    """決済損益の並びを復元抽出し、最終資産/最大DD/勝率の分布を返す"""
+    rng = np.random.default_rng() if rng is None else rng
+    pnl = np.asarray(pnl, dtype="float64")
+    s = pnl[rng.integers(0, len(pnl), size=(n_paths, len(pnl)))]
+    eq = initial + np.cumsum(s, axis=1)
+    peak = np.maximum.accumulate(np.concatenate([np.full((n_paths, 1), initial), eq], axis=1), axis=1)[:, 1:]
+    return {
+        "sum": eq[:, -1],
+        "max_drawdown": ((peak - eq) / peak).max(axis=1),
+        "win_rate": (s > 0).mean(axis=1),
+        "cnt": np.full(n_paths, len(pnl)),
+    }
+
+# ---------- 集計 ----------
+def _merge(parts):
+    out = {}
+    for p in parts:
+        for name, d in p.items():
+            o = out.setdefault(name, {})
+            for k, v in d.items():
+                o[k] = np.concatenate([o[k], v]) if k in o else v
+    return out
+
+def _describe(d, actual=None):
+    rep = {}
+    for k in ("sum", "max_drawdown", "win_rate"):
+        v = d[k][~np.isnan(d[k])]
+        rep[k] = {f"p{q}": (float(np.percentile(v, q)) if len(v) else None) for q in PCTS}
+        rep[k]["mean"] = float(v.mean()) if len(v) else None
+        if actual is not None:
+            a = float(actual[k][0])
+            rep[k]["actual"] = None if np.isnan(a) else a
+            # 実現値より悪い合成パスの割合（小さいほど「運が良かった」寄り）
+            rep[k]["rank_of_actual"] = float((v < a).mean()) if len(v) and not np.isnan(a) else None
+    rep["p_profit"] = float((d["sum"] > INITIAL_SUM).mean())
+    rep["avg_trades"] = float(np.mean(d["cnt"]))
+    return rep
+
+def run_bars(close, n_paths=2000, block=60, workers=None, seed=0):
+    workers = workers or os.cpu_count() or 1
+    chunk = -(-n_paths // workers)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    jobs = [(close, min(chunk, n_paths - i * chunk), block, seeds[i]) for i in range(workers) if n_paths - i * chunk > 0]
+    if workers == 1:
+        parts = [_bars_job(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_bars_job, jobs))
+    sim = _merge(parts)
+    actual = simulate_paths(np.asarray(close, dtype="float64")[None, :])
+    return {name: _describe(sim[name], actual[name]) for name in sim}
+
+def run_trades(journal_path, n_paths=2000, seed=0):
+    from journal import read_journal, EXIT
+    j = read_journal(journal_path)
+    rng = np.random.default_rng(seed)
+    rep = {}
+    for sid in np.unique(j["sid"]):
+        pnl = j["pnl"][(j["sid"] == sid) & (j["kind"] == EXIT)]
+        if len(pnl) == 0:
+            continue
+        rep[f"ret{sid}"] = _describe(resample_trades(pnl, n_paths, rng))
+    return rep
+
+def main():
+    ap = argparse.ArgumentParser(description="戦略のブートストラップ頑健性チェック")
+    ap.add_argument("--mode", choices=["bars", "trades"], default="bars")
+    ap.add_argument("--csv", default=CSV)
+    ap.add_argument("--journal", default="trades_journal.bin")
+    ap.add_argument("--paths", type=int, default=2000)
+    ap.add_argument("--block", type=int, default=60, help="ブロック長（本）")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="robustness_summary.json")
+    a = ap.parse_args()
+
+    if a.mode == "bars":
+        import pandas as pd
+        close = pd.read_csv(a.csv)["Close"].dropna().to_numpy(dtype="float64")
+        rep = run_bars(close, a.paths, a.block, a.workers, a.seed)
+    else:
+        rep = run_trades(a.journal, a.paths, a.seed)
+
+    with open(a.out, "w", encoding="utf-8") as f:
+        json.dump(rep, f, ensure_ascii=False, indent=2)
+    for name, r in rep.items():
+        print(f"=== {name} ===")
+        for k in ("sum", "max_drawdown", "win_rate"):
+            print(f"{k}: " + "  ".join(f"{q}={v:.4f}" if isinstance(v, float) else f"{q}={v}" for q, v in r[k].items()))
+        print(f"p_profit: {r['p_profit']:.3f}  avg_trades: {r['avg_trades']:.1f}")
+    print(f"Saved: {a.out}")
+
+if __name__ == "__main__":
+    main()
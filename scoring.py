@@ -0,0 +1,209 @@
+# scoring.py
+# 予測の採点（全行まとめてベクトル計算）と、足し合わせできる集計 ScoreAggregate
+#   - future_close()  … t+HORIZON 分の終値を as-of 結合（時刻が飛んでいても・秒がずれていてもOK）
+#   - score()         … close_future / y_up / hit / ret を列で付ける
+#   - ScoreAggregate  … 命中数・リターンの平均/分散・校正ビンを持つ。add() で追加、merge() で合体
+#                       JSON にして保存すれば、次回は新しく熟した予測だけ足せばよい
+import json, math
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+import numpy as np
+import pandas as pd
+from fill import BUY, SELL, ts_ns
+
+NS_PER_MIN = 60_000_000_000
+TOLERANCE_SEC = 30   # 目標時刻より前の値はこの秒数以内なら採用（秒のずれだけ吸収。1本前の足＝別ホライズンの値は使わない）
+BINS = np.linspace(0, 1, 11)  # 校正ビン（pd.cut と同じ右閉じ）
+NBINS = len(BINS) - 1
+
+def future_close(ts, close, minutes: float, tolerance_sec: float = TOLERANCE_SEC):
+    """
+    as-of 結合：各行 t について「t+minutes 時点で最後に観測された close」
+    t より後の観測で、目標時刻から tolerance_sec 以内のものだけ。無ければ NaN
+    ts は昇順の int64(ns)
+    """
+    ts = np.asarray(ts, dtype="int64")
+    close = np.asarray(close, dtype="float64")
+    if len(ts) == 0:
+        return np.empty(0)
+    target = ts + int(minutes * NS_PER_MIN)
+    j = np.searchsorted(ts, target, side="right") - 1
+    jc = np.clip(j, 0, len(ts) - 1)
+    ok = (j >= 0) & (ts[jc] > ts) & (ts[jc] >= target - int(tolerance_sec * 1e9))
+    return np.where(ok, close[jc], np.nan)
+
+def label_up(c0, c1):
+    # 上がっていれば1、下がっていれば0、同値と未来値なしは NaN
+    return np.where(c1 > c0, 1.0, np.where(c1 < c0, 0.0, np.nan))
+
+def head_columns(df):
+    """proba_up_h1 など → [(horizon, 列名)]（ホライズン順）"""
+    return sorted((int(c[10:]), c) for c in df.columns if c.startswith("proba_up_h") and c[10:].isdigit())
+
+def score(df: pd.DataFrame, horizon_min: float, sim, tolerance_sec: float = TOLERANCE_SEC) -> pd.DataFrame:
+    """
+    df: datetime（UTC, 昇順・重複なし）, close, proba_up, signal（, proba_up_h*）
+    close_future, y_up, hit, ret（HOLD / 未来値なしは NaN）と、ヘッドごとの y_h* を付けて返す
+    """
+    df = df.copy()
+    t0 = ts_ns(df["datetime"])
+    c0 = df["close"].to_numpy(dtype="float64")
+    c1 = future_close(t0, c0, horizon_min, tolerance_sec)
+    y = label_up(c0, c1)
+    sig = df["signal"].to_numpy()
+    trade = ((sig == "BUY") | (sig == "SELL")) & ~np.isnan(c1)
+    side = np.where(sig == "BUY", BUY, SELL)
+    t1 = t0 + int(horizon_min * NS_PER_MIN)
+    # ログには終値しか無いので high/low は終値で代用
+    r = sim.round_trip_returns(side, (t0, c0, c0, c0), (t1, c1, c1, c1))
+    hit = np.where(sig == "BUY", y == 1.0, y == 0.0).astype("float64")  # 同値は外れ扱い
+    df["close_future"] = c1
+    df["y_up"] = y
+    df["hit"] = np.where(trade, hit, np.nan)
+    df["ret"] = np.where(trade, r, np.nan)
+    for h, col in head_columns(df):
+        df[f"y_h{h}"] = label_up(c0, future_close(t0, c0, h, tolerance_sec))
+    return df
+
+def matured(df: pd.DataFrame, max_horizon_min: float, tolerance_sec: float = TOLERANCE_SEC):
+    """ログの最後の時刻から見て、全ホライズンの答え合わせが済んでいる行（先頭から連続）"""
+    t = ts_ns(df["datetime"])
+    if len(t) == 0:
+        return np.zeros(0, dtype=bool)
+    return t + int(max_horizon_min * NS_PER_MIN) + int(tolerance_sec * 1e9) <= t[-1]
+
+def _zeros():
+    return [0.0] * NBINS
+
+@dataclass
+class ScoreAggregate:
+    """
+    採点の途中経過（足し算・マージできる形だけ持つ）
+      リターンは Welford の平均/二乗偏差和（チャンク同士も Chan の式でマージ）
+      校正は proba_up のビンごとの 件数 / p の和 / 上昇数
+      heads は {"1": [シグナル数, 命中数, logloss 和, logloss 件数], ...}
+    """
+    trades: int = 0
+    wins: int = 0
+    buy: int = 0
+    buy_wins: int = 0
+    sell: int = 0
+    sell_wins: int = 0
+    ret_n: int = 0
+    ret_mean: float = 0.0
+    ret_m2: float = 0.0
+    ret_sum: float = 0.0
+    cal_n: list = field(default_factory=_zeros)
+    cal_p: list = field(default_factory=_zeros)
+    cal_y: list = field(default_factory=_zeros)
+    heads: dict = field(default_factory=dict)
+    scored_until: Optional[int] = None  # この時刻(ns)までの予測は採点済み
+
+    # ---- 追加 / マージ --------------------------------------------------------
+    def add(self, df: pd.DataFrame, buy_th: float) -> "ScoreAggregate":
+        """score() 済みの行を足す"""
+        if len(df) == 0:
+            return self
+        part = ScoreAggregate()
+        sig = df["signal"].to_numpy()
+        hit = df["hit"].to_numpy()
+        t = ~np.isnan(hit)
+        part.trades = int(t.sum())
+        part.wins = int(np.nansum(hit))
+        b = t & (sig == "BUY"); s = t & (sig == "SELL")
+        part.buy, part.buy_wins = int(b.sum()), int(hit[b].sum())
+        part.sell, part.sell_wins = int(s.sum()), int(hit[s].sum())
+        r = df["ret"].to_numpy(dtype="float64")
+        r = r[~np.isnan(r)]
+        if len(r):
+            part.ret_n, part.ret_mean = len(r), float(r.mean())
+            part.ret_m2 = float(((r - part.ret_mean) ** 2).sum())
+            part.ret_sum = float(r.sum())
+        p = df["proba_up"].to_numpy(dtype="float64")
+        y = df["y_up"].to_numpy(dtype="float64")
+        m = ~np.isnan(y) & ~np.isnan(p)
+        k = np.clip(np.searchsorted(BINS, p[m], side="left") - 1, 0, NBINS - 1)
+        part.cal_n = np.bincount(k, minlength=NBINS).astype("float64").tolist()
+        part.cal_p = np.bincount(k, weights=p[m], minlength=NBINS).tolist()
+        part.cal_y = np.bincount(k, weights=y[m], minlength=NBINS).tolist()
+        for h, col in head_columns(df):
+            ph = df[col].to_numpy(dtype="float64")
+            yh = df[f"y_h{h}"].to_numpy(dtype="float64")
+            sh = np.where(ph >= buy_th, 1.0, np.where(ph <= 1 - buy_th, 0.0, np.nan))
+            ms = ~np.isnan(sh) & ~np.isnan(yh)
+            ok = ~np.isnan(ph) & ~np.isnan(yh)
+            pc = np.clip(ph[ok], 1e-12, 1 - 1e-12)
+            ll = -(yh[ok] * np.log(pc) + (1 - yh[ok]) * np.log(1 - pc))
+            part.heads[str(h)] = [int(ms.sum()), int((sh[ms] == yh[ms]).sum()), float(ll.sum()), int(ok.sum())]
+        part.scored_until = int(ts_ns(df["datetime"])[-1])
+        return self.merge(part)
+
+    def merge(self, o: "ScoreAggregate") -> "ScoreAggregate":
+        for k in ("trades", "wins", "buy", "buy_wins", "sell", "sell_wins", "ret_sum"):
+            setattr(self, k, getattr(self, k) + getattr(o, k))
+        n = self.ret_n + o.ret_n
+        if n:
+            d = o.ret_mean - self.ret_mean
+            self.ret_m2 = self.ret_m2 + o.ret_m2 + d * d * self.ret_n * o.ret_n / n
+            self.ret_mean = self.ret_mean + d * o.ret_n / n
+        self.ret_n = n
+        self.cal_n = [a + b for a, b in zip(self.cal_n, o.cal_n)]
+        self.cal_p = [a + b for a, b in zip(self.cal_p, o.cal_p)]
+        self.cal_y = [a + b for a, b in zip(self.cal_y, o.cal_y)]
+        for h, v in o.heads.items():
+            cur = self.heads.get(h, [0, 0, 0.0, 0])
+            self.heads[h] = [a + b for a, b in zip(cur, v)]
+        if o.scored_until is not None:
+            self.scored_until = max(self.scored_until or o.scored_until, o.scored_until)
+        return self
+
+    # ---- 出力 -----------------------------------------------------------------
+    def summary(self) -> dict:
+        """eval_summary.json と同じキー（horizon / 閾値 / コストは呼ぶ側で足す）"""
+        def r(x, d):
+            return round(x, d) if x is not None and not math.isnan(x) else None
+        std = math.sqrt(self.ret_m2 / (self.ret_n - 1)) if self.ret_n > 1 else float("nan")
+        avg = self.ret_mean if self.ret_n else float("nan")
+        sharpe = avg / std * math.sqrt(60) if std > 0 else float("nan")  # 60 trades≈時間基準の近似
+        return {
+            "trades": self.trades,
+            "win_rate_overall": r(self.wins / self.trades, 4) if self.trades else None,
+            "win_rate_buy": r(self.buy_wins / self.buy, 4) if self.buy else None,
+            "win_rate_sell": r(self.sell_wins / self.sell, 4) if self.sell else None,
+            "avg_return_per_trade": r(avg, 6),
+            "std_return": r(std, 6),
+            "sharpe_like": r(sharpe, 3),
+            "cumulative_return": r(self.ret_sum, 6),
+        }
+
+    def head_summary(self) -> dict:
+        return {int(h): {"signals": v[0],
+                         "win_rate": round(v[1] / v[0], 4) if v[0] else None,
+                         "logloss": round(v[2] / v[3], 4) if v[3] else None}
+                for h, v in sorted(self.heads.items(), key=lambda kv: int(kv[0]))}
+
+    def calibration(self) -> pd.DataFrame:
+        n = np.asarray(self.cal_n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.DataFrame({
+                "bin": [f"({a:.1f}, {b:.1f}]" for a, b in zip(BINS[:-1], BINS[1:])],
+                "mean_p": np.where(n > 0, np.asarray(self.cal_p) / n, np.nan),
+                "rate_up": np.where(n > 0, np.asarray(self.cal_y) / n, np.nan),
+                "n": n.astype("int64"),
+            })
+
+    # ---- 保存 -----------------------------------------------------------------
+    def to_json(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_json(cls, d: dict) -> "ScoreAggregate":
+        return cls(**{k: v for k, v in d.items() if k in cls.__dataclass_fields__})
+
+    @classmethod
+    def load(cls, path: str) -> "ScoreAggregate":
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls.from_json(json.load(f))
+        except FileNotFoundError:
+            return cls()
@@ -0,0 +1,141 @@
+# shmring.py
+# 共有メモリのリングバッファ（書き手1プロセス・読み手は何プロセスでも）
+#   [ヘッダ int64×8][レコード × capacity]
+#     ヘッダ: magic / capacity / head（次に書く通し番号＝書いた件数）/ ready / hist（最初の履歴の件数）/ itemsize / 書き手 pid
+#             / errors（書き手が数える失敗回数。レコードにならない失敗を読み手の計測へ渡す）
+#     レコード: 固定長の numpy 構造化配列。先頭の seq に通し番号
+#   書き手: seq=-1 → 中身 → seq=通し番号 → head を進める
+#   読み手: head まで読む。コピーの前後で seq が同じ＝書き換え途中でない、と確かめる（追い越された分は lost で数える）
+#   records は共有メモリそのものの ndarray（コピーなし）。read() は必要な件数だけコピーして返す
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+MAGIC = 0x46585249  # "FXRI"
+H_MAGIC, H_CAP, H_HEAD, H_READY, H_HIST, H_ITEMSIZE, H_PID, H_ERRORS = range(8)
+HEADER_BYTES = 8 * 8
+
+# main.py の価格（fetcher.Tick と同じ中身。kind 0=起動時の履歴, 1=ライブ。fetch_sec は取得にかかった秒、履歴は NaN）
+TICK_DTYPE = np.dtype([("seq", "<i8"), ("ts", "<i8"), ("price", "<f8"), ("fetched_at", "<f8"), ("kind", "<i8"),
+                       ("fetch_sec", "<f8")])
+HIST, LIVE = 0, 1
+# ML 推論の結果（足の時刻と、ヘッドごとの p_up / ホライズン。使わないヘッドは horizon=-1）
+MAX_HEADS = 8
+ML_DTYPE = np.dtype([("seq", "<i8"), ("ts", "<i8"), ("p", "<f8", MAX_HEADS), ("h", "<i8", MAX_HEADS)])
+
+class ShmRing:
+    def __init__(self, shm: shared_memory.SharedMemory, dtype, owner: bool):
+        self.shm = shm
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.header = np.ndarray((8,), dtype="<i8", buffer=shm.buf)
+        if self.header[H_MAGIC] != MAGIC or self.header[H_ITEMSIZE] != self.dtype.itemsize:
+            raise ValueError(f"リングの形式が違います: {shm.name}")
+        self.capacity = int(self.header[H_CAP])
+        self.records = np.ndarray((self.capacity,), dtype=self.dtype, buffer=shm.buf, offset=HEADER_BYTES)
+        self._seqs = self.records["seq"]  # seq 列だけのビュー（確認用）
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, name: str, dtype, capacity: int, pid: int = 0) -> "ShmRing":
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER_BYTES + dtype.itemsize * capacity)
+        h = np.ndarray((8,), dtype="<i8", buffer=shm.buf)
+        h[:] = 0
+        h[H_CAP], h[H_ITEMSIZE], h[H_PID] = capacity, dtype.itemsize, pid
+        np.ndarray((capacity,), dtype="<i8", buffer=shm.buf, offset=HEADER_BYTES,
+                   strides=(dtype.itemsize,))[:] = -1  # 全レコードの seq を「未書き込み」に
+        h[H_MAGIC] = MAGIC  # 最後に magic（ここまで来たら attach してよい）
+        return cls(shm, dtype, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, dtype) -> "ShmRing":
+        return cls(shared_memory.SharedMemory(name=name), dtype, owner=False)
+
+    # ---- 書き手 ----------------------------------------------------------------
+    def write(self, *fields) -> int:
+        """seq 以外の列をこの順で。戻り値は通し番号"""
+        s = int(self.header[H_HEAD])
+        i = s % self.capacity
+        self._seqs[i] = -1
+        rec = self.records[i]
+        for name, v in zip(self.dtype.names[1:], fields):
+            rec[name] = v
+        self._seqs[i] = s
+        self.header[H_HEAD] = s + 1
+        return s
+
+    def set_ready(self, hist: int = 0) -> None:
+        self.header[H_HIST] = hist
+        self.header[H_READY] = 1
+
+    def add_error(self, n: int = 1) -> None:
+        self.header[H_ERRORS] += n  # 書き手は1プロセスなので足すだけ
+
+    # ---- 読み手 ----------------------------------------------------------------
+    @property
+    def head(self) -> int:
+        return int(self.header[H_HEAD])
+
+    @property
+    def errors(self) -> int:
+        return int(self.header[H_ERRORS])
+
+    def wait_ready(self, timeout: float = 120.0, poll: float = 0.05) -> int:
+        """書き手が最初の履歴を書き終えるまで待つ。戻り値は履歴の件数"""
+        t_end = time.monotonic() + timeout
+        while not self.header[H_READY]:
+            if time.monotonic() > t_end:
+                raise TimeoutError(f"リングの準備ができません: {self.name}")
+            time.sleep(poll)
+        return int(self.header[H_HIST])
+
+    def read(self, since: int, limit: int = None):
+        """
+        通し番号 since 以降 → (レコード配列のコピー, 次に読む通し番号, 取りこぼした件数)
+        capacity より遅れていたら古い分は上書き済みなので飛ばす
+        """
+        head = self.head
+        start = max(since, head - self.capacity)
+        if limit is not None:
+            head = min(head, start + limit)
+        lost = start - since
+        if head <= start:
+            return self.records[:0].copy(), max(since, start), lost
+        idx = np.arange(start, head) % self.capacity
+        before = self._seqs[idx].copy()
+        out = self.records[idx]  # fancy index = ここで1回だけコピー
+        after = self._seqs[idx]
+        ok = (before == np.arange(start, head)) & (after == before)
+        if not ok.all():
+            lost += int((~ok).sum())  # 読んでいる間に追い越された
+            out = out[ok]
+        return out, head, lost
+
+    def history(self, timeout: float = 120.0):
+        """最初の履歴（kind=HIST）を待って全部返す"""
+        n = self.wait_ready(timeout)
+        recs, _, lost = self.read(0, limit=n)
+        if lost:
+            raise RuntimeError(f"履歴がリングから溢れています（capacity={self.capacity} < {n}）")
+        return recs
+
+    def close(self) -> None:
+        # ndarray のビューを先に外さないと close できない。close に失敗しても名前は消す（/dev/shm に残さない）
+        self.header = self.records = self._seqs = None
+        try:
+            self.shm.close()
+        finally:
+            self.unlink()
+
+    def unlink(self) -> None:
+        """作った側だけ名前を消す（2回呼んでもよい）。マップは残るので、読んでいる途中のスレッドがいても安全"""
+        if self.owner:
+            self.owner = False
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
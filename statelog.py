@@ -0,0 +1,98 @@
+# statelog.py
+import json, os, threading
+from typing import Optional
+
+def atomic_write_text(path: str, text: str) -> None:
+    """一時ファイルに書いて fsync → rename（途中で落ちても壊れたファイルを残さない）"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def atomic_write_json(path: str, obj) -> None:
+    atomic_write_text(path, json.dumps(obj, ensure_ascii=False))
+
+class StateLog:
+    """
+    戦略状態の先行書き込みログ（WAL）
+      - append()  … ポジションの新規/買い増し/決済のたびに、その枠(ret1等)の状態を1行追記して fsync
+      - compact() … スナップショット(JSON)をアトミックに書き出し、WAL を空にする
+      - recover() … スナップショット + WAL を再生して最新状態を返す
+    レコードは「枠の状態まるごと」なので、同じ行を2回再生しても結果は同じ
+    """
+    def __init__(self, wal_path: str = "strategy_state.wal",
+                 snapshot_path: str = "strategy_state.json", compact_every: int = 100):
+        self.wal_path = wal_path
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._f = None
+        self.seq = 0       # 通し番号
+        self.records = 0   # 直近の compaction 以降の行数
+
+    def _open(self):
+        if self._f is None:
+            self._f = open(self.wal_path, "a", encoding="utf-8")
+        return self._f
+
+    # ---- 追記 -----------------------------------------------------------------
+    def append(self, key: str, data: dict) -> None:
+        with self._lock:
+            self.seq += 1
+            f = self._open()
+            f.write(json.dumps({"seq": self.seq, "key": key, "state": data}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            self.records += 1
+
+    def needs_compaction(self) -> bool:
+        return self.records >= self.compact_every
+
+    # ---- スナップショット化 ------------------------------------------------------
+    def compact(self, state: dict) -> None:
+        with self._lock:
+            atomic_write_json(self.snapshot_path, state)
+            # スナップショットに全部入ったので WAL は捨ててよい
+            if self._f is not None:
+                self._f.close()
+            self._f = open(self.wal_path, "w", encoding="utf-8")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self.records = 0
+
+    # ---- 復元 -----------------------------------------------------------------
+    def recover(self) -> Optional[dict]:
+        """スナップショットに WAL を重ねた状態を返す（どちらも無ければ None）"""
+        state = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        if os.path.exists(self.wal_path):
+            good = 0  # 正常に読めた末尾のバイト位置
+            with open(self.wal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("torn line")
+                        rec = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        break  # 書きかけの最終行（クラッシュ直前）は捨てる
+                    if state is None:
+                        state = {}
+                    state.setdefault(rec["key"], {}).update(rec["state"])
+                    self.seq = max(self.seq, int(rec.get("seq", 0)))
+                    self.records += 1
+                    good += len(line)
+            if good < os.path.getsize(self.wal_path):
+                # 壊れた尻尾を切り落としておかないと次の追記が同じ行に繋がる
+                with open(self.wal_path, "r+b") as f:
+                    f.truncate(good)
+        return state
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
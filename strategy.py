@@ -3,7 +3,12 @@ import json, os, threading
 
 from typing import Optional, Dict
 from dataclasses import dataclass, asdict 
+from datetime import datetime
 from decimal import Decimal, ROUND_DOWN
+from journal import ENTRY, SCALE, EXIT
+from bus import TRADE
+from statelog import atomic_write_json
+from live_metrics import RollingStats
 
 #固有変数
 @dataclass
@@ -40,9 +45,49 @@ ret5 = SignalResult()
 ret6 = SignalResult()
 
 class Strategy:
-    def __init__(self):
+    def __init__(self, journal=None, statelog=None, bus=None):
         # ret1 などの読み書き競合を避けるためのロック
         self._lock = threading.RLock()
+        # 約定ジャーナル（TradeJournal / 任意）
+        self.journal = journal
+        # 状態のWAL（StateLog / 任意）
+        self.statelog = statelog
+        # 配信バス（bus.Bus / 任意）：約定をチャートなどへ流す
+        self.bus = bus
+        self._dirty: set = set()
+        # ML枠（ret3）：同じ分のシグナルで二重にエントリーしないための印
+        self._ml_seen = None
+        # 枠ごとの直近成績（決済ごとに O(1) 更新）
+        self.metrics: Dict[int, RollingStats] = {}
+
+    # --- 追加: 約定記録（エントリー/買い増し/決済ごとに呼ぶ） ---
+    def _trade(self, sid: int, kind: int, obj: SignalResult, qty: int, px: float, time: str, pnl: float = 0.0) -> None:
+        self._dirty.add(sid)
+        if kind == EXIT:
+            self.metrics.setdefault(sid, RollingStats()).push(pnl)
+        if self.bus is not None:
+            self.bus.publish(TRADE, {"time": time, "sid": sid, "kind": kind, "side": obj.holdjudge,
+                                     "price": px, "pnl": pnl})
+        if self.journal is None:
+            return
+        pos = 0 if kind == EXIT else obj.hold
+        self.journal.record(time, sid, kind, obj.holdjudge, qty, pos, px, pnl)
+
+    # --- 追加: 変化した枠だけ WAL へ（generate の最後で呼ぶ） ---
+    def _persist(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        if self.statelog is None:
+            return
+        try:
+            objs = {1: ret1, 2: ret2, 3: ret3, 4: ret4, 5: ret5, 6: ret6}
+            for sid in sorted(dirty):
+                self.statelog.append(f"ret{sid}", asdict(objs[sid]))
+            if self.statelog.needs_compaction():
+                self.statelog.compact(self.snapshot())
+        except Exception as e:
+            print(f"[WARN] WAL書き込みに失敗: {e}")
     # --- 追加: 状態のスナップショット/保存/復元 ---
     def snapshot(self) -> dict:
         with self._lock:
@@ -71,12 +116,25 @@ class Strategy:
         try:
             with self._lock:
                 state = self.snapshot()
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(state, f, ensure_ascii=False)
+            if self.statelog is not None and self.statelog.snapshot_path == path:
+                self.statelog.compact(state)  # スナップショット化してWALを空に
+            else:
+                atomic_write_json(path, state)
         except Exception as e:
             print(f"[WARN] 状態保存に失敗: {e}")
 
     def import_state(self, path: str) -> bool:
+        if self.statelog is not None and self.statelog.snapshot_path == path:
+            # スナップショット + WAL 再生（クラッシュ時もここまで戻せる）
+            try:
+                state = self.statelog.recover()
+                if state is None:
+                    return False
+                self.restore(state)
+                return True
+            except Exception as e:
+                print(f"[WARN] 状態復元に失敗: {e}")
+                return False
         if not os.path.exists(path):
             return False
         try:
@@ -88,6 +146,15 @@ class Strategy:
             print(f"[WARN] 状態復元に失敗: {e}")
             return False
 
+    @staticmethod
+    def _elapsed_min(start: str, end: str) -> float:
+        # "YYYY-mm-dd HH:MM:SS" 同士の差（分）。読めなければ期限切れ扱い
+        try:
+            fmt = "%Y-%m-%d %H:%M:%S"
+            return (datetime.strptime(end, fmt) - datetime.strptime(start, fmt)).total_seconds() / 60.0
+        except (TypeError, ValueError):
+            return float("inf")
+
     @staticmethod
     def to_decimal(val, digits=3, as_float=True):
         if val is None:
@@ -101,7 +168,8 @@ class Strategy:
             time:str,
             ma_dict: Dict[int, Optional[float]],
             bb_vals: dict,
-            rsi_val: float
+            rsi_val: float,
+            ml: Optional[dict] = None
         ) -> dict:
         global price,ma25,ma75,ma200,rsi,bb_up2,bb_up1,bb_mid,bb_dn1,bb_dn2
         global rsi_old,ret1,ret2,ret3,ret4,ret5,ret6
@@ -131,18 +199,21 @@ class Strategy:
 
                         ret1.holdjudge = 1
                         ret1.end_time_stamp = time
+                        self._trade(1, ENTRY, ret1, 10000, price, time)
                     elif ret1.hold == 10000:
                         ret1.hold += ret1.hold * 2 # ドルコスト
                         ret1.calc_sum += (ret1.hold * price)
 
                         ret1.holdjudge = 1
                         ret1.end_time_stamp = time
+                        self._trade(1, SCALE, ret1, 20000, price, time)
                     elif ret1.hold == 30000:
                         ret1.hold += ret1.hold * 2 # ドルコスト
                         ret1.calc_sum += (ret1.hold * price)
 
                         ret1.holdjudge = 1
                         ret1.end_time_stamp = time
+                        self._trade(1, SCALE, ret1, 60000, price, time)
             if rsi_old > 72:
                 if rsi <= 72:
                     if ret1.hold == 0:
@@ -151,18 +222,21 @@ class Strategy:
 
                         ret1.holdjudge = 2
                         ret1.end_time_stamp = time
+                        self._trade(1, ENTRY, ret1, 10000, price, time)
                     elif ret1.hold == 10000:
                         ret1.hold += ret1.hold * 2 # ドルコスト
                         ret1.calc_sum += (ret1.hold * price)
 
                         ret1.holdjudge = 2
                         ret1.end_time_stamp = time
+                        self._trade(1, SCALE, ret1, 20000, price, time)
                     elif ret1.hold == 30000:
                         ret1.hold += ret1.hold * 2 # ドルコスト
                         ret1.calc_sum += (ret1.hold * price)
 
                         ret1.holdjudge = 2
                         ret1.end_time_stamp = time
+                        self._trade(1, SCALE, ret1, 60000, price, time)
         #EXSIT
         #決済条件
         if ret1.hold != 0:# 保有している時
@@ -175,6 +249,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -189,6 +264,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -205,6 +281,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -220,6 +297,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -238,6 +316,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -253,6 +332,7 @@ class Strategy:
                         ret1.los += 1
                     ret1.cnt += 1
                     ret1.sum = ret1.sum + ProfitAndLoss
+                    self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                     ret1.hold = 0
                     ret1.calc_sum = 0.0
 
@@ -271,6 +351,7 @@ class Strategy:
                                 ret1.los += 1
                             ret1.cnt += 1
                             ret1.sum = ret1.sum + ProfitAndLoss
+                            self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                             ret1.hold = 0
                             ret1.calc_sum = 0.0
 
@@ -287,6 +368,7 @@ class Strategy:
                                 ret1.los += 1
                             ret1.cnt += 1
                             ret1.sum = ret1.sum + ProfitAndLoss
+                            self._trade(1, EXIT, ret1, ret1.hold, now_price, time, ProfitAndLoss)
                             ret1.hold = 0
                             ret1.calc_sum = 0.0
 
@@ -306,6 +388,7 @@ class Strategy:
                 ret2.calc_sum += (ret2.hold * price)
                 ret2.holdjudge = 1
                 ret2.end_time_stamp = time
+                self._trade(2, ENTRY, ret2, 30000, price, time)
                 ret2.ma200p_Profit = ma200p + ((ma200p - ma200)*1.2)
             if ma200m >= price:
                 ret2.hold += 30000
@@ -313,6 +396,7 @@ class Strategy:
 
                 ret2.holdjudge = 2
                 ret2.end_time_stamp = time
+                self._trade(2, ENTRY, ret2, 30000, price, time)
                 ret2.ma200m_Profit = ma200m + ((ma200m - ma200)*1.2)
 
         #EXSIT
@@ -328,6 +412,7 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
@@ -343,6 +428,7 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
@@ -360,6 +446,7 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
@@ -375,6 +462,7 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
@@ -390,6 +478,7 @@ class Strategy:
                             ret2.los += 1
                         ret2.cnt += 1
                         ret2.sum = ret2.sum + ProfitAndLoss
+                        self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                         ret2.hold = 0
                         ret2.calc_sum = 0.0
 
@@ -405,6 +494,7 @@ class Strategy:
                             ret2.los += 1
                         ret2.cnt += 1
                         ret2.sum = ret2.sum + ProfitAndLoss
+                        self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                         ret2.hold = 0
                         ret2.calc_sum = 0.0
 
@@ -420,6 +510,7 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
@@ -434,19 +525,52 @@ class Strategy:
                         ret2.los += 1
                     ret2.cnt += 1
                     ret2.sum = ret2.sum + ProfitAndLoss
+                    self._trade(2, EXIT, ret2, ret2.hold, now_price, time, ProfitAndLoss)
                     ret2.hold = 0
                     ret2.calc_sum = 0.0
 
                     ret2.holdjudge = 0
                     ret2.end_time_stamp = time
-        #戦術3
+        #戦術3（MLモデル：main.py が毎分出す p_up の BUY/SELL でエントリー → hold_min 分で決済）
+        #START
+        if ml is not None and ret3.hold == 0 and ml.get("minute") != self._ml_seen:
+            if ml.get("signal") in ("BUY", "SELL"):
+                self._ml_seen = ml.get("minute")
+                ret3.hold = 10000
+                ret3.calc_sum += (ret3.hold * price)
+
+                ret3.holdjudge = 1 if ml["signal"] == "BUY" else 2
+                ret3.end_time_stamp = time
+                self._trade(3, ENTRY, ret3, 10000, price, time)
+        #EXSIT
+        #決済条件（予測ホライズン分たったら手仕舞い。analyze_live_pred.py の採点と同じ）
+        hold_min = ml.get("hold_min", 5) if ml is not None else 5
+        if ret3.hold != 0 and self._elapsed_min(ret3.end_time_stamp, time) >= hold_min:
+            if ret3.holdjudge == 1:# 買いポジの時
+                ProfitAndLoss = ((ret3.hold * now_price) - ret3.calc_sum) #保有総数 - 現在価値
+            else:# 売りポジの時
+                ProfitAndLoss = (ret3.calc_sum - (ret3.hold * now_price)) #現在価値 - 保有総数
+            if ProfitAndLoss > 0:
+                ret3.win += 1
+            elif ProfitAndLoss < 0:
+                ret3.los += 1
+            ret3.cnt += 1
+            ret3.sum = ret3.sum + ProfitAndLoss
+            self._trade(3, EXIT, ret3, ret3.hold, now_price, time, ProfitAndLoss)
+            ret3.hold = 0
+            ret3.calc_sum = 0.0
+
+            ret3.holdjudge = 0
+            ret3.end_time_stamp = time
         #戦術4
         #戦術5
         #戦術6
 
         #前回値作成
         rsi_old = rsi
+        self._persist()
 
         ret = [asdict(ret1), asdict(ret2), asdict(ret3),
         asdict(ret4), asdict(ret5), asdict(ret6)]
-        return { "price": price, "ret": ret}
+        metrics = {sid: m.snapshot() for sid, m in self.metrics.items()}
+        return { "price": price, "ret": ret, "metrics": metrics}
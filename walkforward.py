@@ -0,0 +1,145 @@
+# walkforward.py
+# HORIZON / BUY_TH / 特徴量の組み合わせをウォークフォワードで総当たり評価
+#   学習窓（例: 2日）で学習 → 直後の検証窓（例: 1日）で採点 → 窓をずらして繰り返す
+#   (horizon, 特徴量セット, fold) ごとにプロセスプールへ分散し、閾値はその場で全部採点
+#   結果は1枚のランキング表（walkforward.csv）
+import argparse, itertools, math, os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from features import make_features, FEATURE_COLS
+from fill import cost_sensitivity, BUY, SELL
+from linmodel import ROUND_TRIP_COST_PIPS
+
+HORIZONS = [1, 3, 5, 10, 15]
+THRESHOLDS = [0.52, 0.55, 0.58, 0.60, 0.65]
+FEATURE_SETS = {
+    "all": FEATURE_COLS,
+    "no_hour": [c for c in FEATURE_COLS if c != "hour"],
+    "returns": ["ret1", "ret5"],
+    "bands": ["z20", "bb_w", "rsi14"],
+}
+BARS_PER_DAY = 1440
+MIN_TRADES = 30  # これ未満の組み合わせはたまたま当たっただけかもしれないので順位を下げる
+
+# ---------- 学習（ai_yf_live.fit_model の自作ロジ回帰と同じ手順＋切片） ----------
+def fit_logit(Xn, y, lr=0.1, l2=1e-3, epochs=300):
+    w = np.zeros(Xn.shape[1]); b = 0.0
+    n = len(y)
+    for _ in range(epochs):
+        p = 0.5 * (1.0 + np.tanh(0.5 * (Xn @ w + b)))
+        g = p - y
+        w -= lr * ((Xn.T @ g) / n + l2 * w)
+        b -= lr * g.mean()
+    return w, b
+
+def folds(n, train, test, step=None):
+    """[a,b) で学習、[b,c) で検証 の (a, b, c) を並べる"""
+    step = step or test
+    a = 0
+    while a + train + test <= n:
+        yield a, a + train, a + train + test
+        a += step
+
+# ---------- ワーカー ----------
+_X = _C = None
+
+def _init(X, close):
+    global _X, _C
+    _X, _C = X, close
+
+def _job(args):
+    h, fname, cols, (a, b, c), thresholds, cost_pips = args
+    n = len(_C)
+    tr = np.arange(a, b - h)               # 学習ラベルが検証窓を覗かないよう末尾 h 本を落とす
+    te = np.arange(b, min(c, n - h))
+    out = []
+    if len(tr) < 10 or len(te) == 0:
+        return out
+    X = _X[:, cols]
+    y_tr = (_C[tr + h] > _C[tr]).astype("float64")
+    mu = X[tr].mean(axis=0); sd = X[tr].std(axis=0, ddof=1); sd[sd == 0] = 1.0
+    w, bias = fit_logit((X[tr] - mu) / sd, y_tr)
+    p = 0.5 * (1.0 + np.tanh(0.5 * (((X[te] - mu) / sd) @ w + bias)))
+    c0, c1 = _C[te], _C[te + h]
+    y_te = (c1 > c0).astype("float64")
+    pc = np.clip(p, 1e-12, 1 - 1e-12)
+    ll = float(-np.mean(y_te * np.log(pc) + (1 - y_te) * np.log(1 - pc)))
+    for th in thresholds:
+        buy = p >= th
+        sell = p <= 1 - th
+        m = buy | sell
+        side = np.where(buy, BUY, SELL)[m]
+        r = cost_sensitivity(side, c0[m], c1[m], cost_pips)[0] if m.any() else np.empty(0)
+        hit = np.where(buy[m], c1[m] > c0[m], c1[m] < c0[m])
+        out.append({"horizon": h, "features": fname, "buy_th": th, "fold": a,
+                    "n": len(te), "trades": int(m.sum()), "hits": int(hit.sum()),
+                    "ret_sum": float(r.sum()), "ret_sq": float((r * r).sum()), "logloss": ll})
+    return out
+
+# ---------- 本体 ----------
+def prepare(df):
+    feats = make_features(df).dropna()
+    X = feats[FEATURE_COLS].to_numpy(dtype="float64")
+    close = df["Close"].reindex(feats.index).to_numpy(dtype="float64")
+    return X, close
+
+def run(X, close, horizons=HORIZONS, thresholds=THRESHOLDS, feature_sets=FEATURE_SETS,
+        train_bars=2 * BARS_PER_DAY, test_bars=BARS_PER_DAY, cost_pips=ROUND_TRIP_COST_PIPS, workers=None):
+    pos = {c: i for i, c in enumerate(FEATURE_COLS)}
+    fl = list(folds(len(close), train_bars, test_bars))
+    if not fl:
+        raise SystemExit(f"データが足りません: bars={len(close)} 必要={train_bars + test_bars}")
+    jobs = [(h, fname, [pos[c] for c in cols], f, list(thresholds), cost_pips)
+            for h, (fname, cols), f in itertools.product(horizons, feature_sets.items(), fl)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init(X, close)
+        rows = [r for j in jobs for r in _job(j)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(X, close)) as ex:
+            rows = [r for part in ex.map(_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))) for r in part]
+    return rank(pd.DataFrame(rows)), len(fl)
+
+def rank(res: pd.DataFrame, min_trades=MIN_TRADES) -> pd.DataFrame:
+    g = res.groupby(["horizon", "features", "buy_th"])
+    t = g.agg(folds=("fold", "nunique"), trades=("trades", "sum"), hits=("hits", "sum"),
+              ret_sum=("ret_sum", "sum"), ret_sq=("ret_sq", "sum"), logloss=("logloss", "mean"),
+              pos_folds=("ret_sum", lambda s: float((s > 0).mean())))
+    t["hit_rate"] = t["hits"] / t["trades"].where(t["trades"] > 0)
+    t["avg_ret"] = t["ret_sum"] / t["trades"].where(t["trades"] > 0)
+    var = t["ret_sq"] / t["trades"].where(t["trades"] > 1) - t["avg_ret"] ** 2
+    t["std_ret"] = np.sqrt(var.clip(lower=0))
+    t["sharpe_like"] = t["avg_ret"] / t["std_ret"].where(t["std_ret"] > 0) * math.sqrt(60)
+    t["enough"] = t["trades"] >= min_trades
+    t = t.drop(columns=["ret_sq", "hits"]).reset_index()
+    return t.sort_values(["enough", "avg_ret", "trades"], ascending=[False, False, False],
+                         na_position="last").reset_index(drop=True)
+
+def main():
+    ap = argparse.ArgumentParser(description="HORIZON / BUY_TH / 特徴量のウォークフォワード評価")
+    ap.add_argument("--bars", default="USDJPY_1m_7d.csv")
+    ap.add_argument("--store", default=None, help="特徴量ストアのディレクトリ（指定時は --bars より優先）")
+    ap.add_argument("--pair", default="USDJPY=X")
+    ap.add_argument("--train-days", type=float, default=2)
+    ap.add_argument("--test-days", type=float, default=1)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default="walkforward.csv")
+    a = ap.parse_args()
+
+    if a.store:
+        from feature_store import FeatureStore
+        arr = FeatureStore(a.store, a.pair).all()
+        X, close = np.asarray(arr["x"]), np.asarray(arr["close"])
+    else:
+        from batch_predict import load_bars
+        X, close = prepare(load_bars(a.bars))
+    table, nf = run(X, close, train_bars=int(a.train_days * BARS_PER_DAY),
+                    test_bars=int(a.test_days * BARS_PER_DAY), workers=a.workers)
+    table.to_csv(a.out, index=False)
+    print(f"folds={nf} configs={len(table)}")
+    print(table.head(15).to_string(index=False))
+    print(f"Saved: {a.out}")
+
+if __name__ == "__main__":
+    main()